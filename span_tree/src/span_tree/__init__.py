@@ -1,6 +1,8 @@
 from span_tree.api import get_logger, getLogger, logger_log_extra, new_span
+from span_tree.extras import deferred
 
 __all__ = [
+    "deferred",
     "get_logger",
     "getLogger",
     "logger_log_extra",
@@ -1,13 +1,23 @@
 from __future__ import annotations
 
+import inspect
 import logging
+from dataclasses import dataclass, field
 from functools import partial, wraps
-from typing import Any, Callable, ContextManager, Protocol, TypeVar, cast
+from types import MappingProxyType
+from typing import Any, Callable, ContextManager, Mapping, Protocol, TypeVar, cast
 
-from zero_3rdparty.id_creator import uuid4_hex
 from zero_3rdparty.object_name import as_name
 
-from span_tree.constants import EXTRA_NAME, REF_DEST, REF_SRC
+from span_tree.call_location import CallLocation
+from span_tree.constants import (
+    BOUND_CONTEXT,
+    CALL_LOCATION,
+    EXTRA_NAME,
+    REF_DEST,
+    REF_SRC,
+)
+from span_tree.ids import next_id
 from span_tree.log_span import LogSpan
 from span_tree.log_trace import LogTrace, current_trace_or_none
 
@@ -41,14 +51,30 @@ def log_extra(
     ref_dest: str = "",
     **kwargs,
 ) -> str | None:
+    return _log_extra(logger, msg, level, ref_src, ref_dest, kwargs, None)
+
+
+def _log_extra(
+    logger: logging.Logger,
+    msg: str,
+    level: int,
+    ref_src: bool,
+    ref_dest: str,
+    kwargs: dict[str, Any],
+    context: dict[str, Any] | None,
+) -> str:
+    ref = next_id() if ref_src else ""
+    if not logger.isEnabledFor(level):
+        return ref
     extra: dict[str, Any] = {EXTRA_NAME: kwargs}
-    ref = ""
-    if ref_src:
-        ref = uuid4_hex()
+    if context:
+        extra[BOUND_CONTEXT] = context
+    if ref:
         extra[REF_SRC] = ref
     if ref_dest:
         extra[REF_DEST] = ref_dest
-    logger.log(level, msg, extra=extra, stacklevel=2)
+    # skip _log_extra and log_extra/SpanLogger.log_extra
+    logger.log(level, msg, extra=extra, stacklevel=3)
     return ref
 
 
@@ -58,6 +84,12 @@ def as_log_extra(logger: logging.Logger) -> LogExtra:
 
 def new_span(
     name: str, force_new_trace: bool = False, **kwargs
+) -> ContextManager[LogSpan]:
+    return _new_span(name, force_new_trace, kwargs)
+
+
+def _new_span(
+    name: str, force_new_trace: bool, kwargs: dict[str, Any]
 ) -> ContextManager[LogSpan]:
     if force_new_trace:
         return LogTrace(name, span_kwargs=kwargs)
@@ -66,6 +98,99 @@ def new_span(
     return LogTrace(name, span_kwargs=kwargs)
 
 
+@dataclass(frozen=True)
+class SpanTemplate:
+    """Static parts of a span, resolved once and opened on every call"""
+
+    name: str
+    force_new_trace: bool = False
+    span_kwargs: dict[str, Any] = field(default_factory=dict)
+
+    def as_tuple(self) -> tuple[str, bool, dict[str, Any]]:
+        return self.name, self.force_new_trace, self.span_kwargs
+
+
+def span_template(
+    f: Callable, name: str, force_new_trace: bool, log_kwargs: dict[str, Any]
+) -> SpanTemplate:
+    span_kwargs = dict(log_kwargs)
+    code = getattr(inspect.unwrap(f), "__code__", None)
+    if code is not None and CALL_LOCATION not in span_kwargs:
+        span_kwargs[CALL_LOCATION] = CallLocation(code, code.co_firstlineno)
+    return SpanTemplate(name, force_new_trace, span_kwargs)
+
+
+def _async_in_span(f: Callable, template: SpanTemplate) -> Callable:
+    name, force_new_trace, span_kwargs = template.as_tuple()
+
+    async def async_inner(*args, **kwargs):
+        with _new_span(name, force_new_trace, span_kwargs):
+            return await f(*args, **kwargs)
+
+    return async_inner
+
+
+def _async_gen_in_span(f: Callable, template: SpanTemplate) -> Callable:
+    name, force_new_trace, span_kwargs = template.as_tuple()
+
+    async def async_gen_inner(*args, **kwargs):
+        # `yield from` for async generators: asend/athrow are forwarded
+        with _new_span(name, force_new_trace, span_kwargs):
+            async_gen = f(*args, **kwargs)
+            next_item = async_gen.__anext__()
+            while True:
+                try:
+                    item = await next_item
+                except StopAsyncIteration:
+                    return
+                try:
+                    sent = yield item
+                except GeneratorExit:
+                    # closed before exhausted is not an error
+                    await async_gen.aclose()
+                    return
+                except BaseException as e:
+                    next_item = async_gen.athrow(e)
+                else:
+                    next_item = async_gen.asend(sent)
+
+    return async_gen_inner
+
+
+def _gen_in_span(f: Callable, template: SpanTemplate) -> Callable:
+    name, force_new_trace, span_kwargs = template.as_tuple()
+
+    def gen_inner(*args, **kwargs):
+        with _new_span(name, force_new_trace, span_kwargs):
+            try:
+                return (yield from f(*args, **kwargs))
+            except GeneratorExit:
+                # closed before exhausted is not an error
+                return None
+
+    return gen_inner
+
+
+def _sync_in_span(f: Callable, template: SpanTemplate) -> Callable:
+    name, force_new_trace, span_kwargs = template.as_tuple()
+
+    def inner(*args, **kwargs):
+        with _new_span(name, force_new_trace, span_kwargs):
+            return f(*args, **kwargs)
+
+    return inner
+
+
+def _wrap_in_span(f: Callable, template: SpanTemplate) -> Callable:
+    if inspect.iscoroutinefunction(f):
+        return _async_in_span(f, template)
+    if inspect.isasyncgenfunction(f):
+        return _async_gen_in_span(f, template)
+    if inspect.isgeneratorfunction(f):
+        return _gen_in_span(f, template)
+    return _sync_in_span(f, template)
+
+
 T = TypeVar("T")
 __DECORATED_CHECK = f"{__name__}_decorator"
 
@@ -73,6 +198,12 @@ __DECORATED_CHECK = f"{__name__}_decorator"
 def span(
     name: str | T = "", force_new_trace: bool = False, **log_kwargs
 ) -> Callable[[T], T] | T:
+    """
+    Supports functions, coroutine functions, generators and async generators.
+    Generators are in the span until they are exhausted or closed, send/throw and
+    asend/athrow are forwarded to the wrapped generator.
+    """
+
     def decorator(f: T):
         nonlocal name
         if hasattr(f, __DECORATED_CHECK):
@@ -81,13 +212,8 @@ def span(
         setattr(f, __DECORATED_CHECK, True)
         if name == "" or name is f:
             name = as_name(f)
-
-        @wraps(f)
-        def inner(*args, **kwargs):
-            with new_span(name, force_new_trace=force_new_trace, **log_kwargs):
-                return f(*args, **kwargs)
-
-        return inner
+        template = span_template(f, name, force_new_trace, log_kwargs)  # type: ignore
+        return wraps(f)(_wrap_in_span(f, template))
 
     if callable(name):
         return decorator(name)
@@ -95,6 +221,28 @@ def span(
 
 
 class SpanLogger(logging.LoggerAdapter):
+    def __init__(self, logger: logging.Logger, context: dict[str, Any] | None = None):
+        super().__init__(logger, None)
+        # never mutated, the handler adds it once per span using the identity
+        self._context = context or {}
+        self._record_extra = {BOUND_CONTEXT: context} if context else None
+
+    @property
+    def context(self) -> Mapping[str, Any]:
+        return MappingProxyType(self._context)
+
+    def bind(self, **fields) -> SpanLogger:
+        """Returns a logger that adds the fields to every span it logs in"""
+        return SpanLogger(self.logger, {**self._context, **fields})
+
+    def process(self, msg: Any, kwargs: Any) -> tuple[Any, Any]:
+        if record_extra := self._record_extra:
+            if extra := kwargs.get("extra"):
+                kwargs["extra"] = {**extra, **record_extra}
+            else:
+                kwargs["extra"] = record_extra
+        return msg, kwargs
+
     # cannot be named "extra" as that is the name of the extra on the instance
     def log_extra(
         self,
@@ -106,8 +254,8 @@ class SpanLogger(logging.LoggerAdapter):
         ref_dest: str = "",
         **kwargs,
     ) -> str | None:
-        return log_extra(
-            self.logger, msg, level, ref_src=ref_src, ref_dest=ref_dest, **kwargs
+        return _log_extra(
+            self.logger, msg, level, ref_src, ref_dest, kwargs, self._context
         )
 
     @staticmethod
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from threading import Lock
+from time import perf_counter_ns
+from typing import Any
+
+from span_tree.constants import ErrorTuple
+from span_tree.log_span import LogSpan
+from span_tree.log_trace import LogTrace, PendingTrace
+
+
+@dataclass
+class BatchSettings:
+    slow_threshold_seconds: float = 1.0
+    max_kept_traces: int = 10
+
+
+_settings = BatchSettings()
+
+
+def set_batch_settings(settings: BatchSettings) -> BatchSettings:
+    global _settings
+    old = _settings
+    _settings = settings
+    return old
+
+
+@dataclass
+class TraceBatch:
+    """Aggregate child node of a parent span for all items of one `Executor.map` call"""
+
+    name: str
+    settings: BatchSettings = field(default_factory=lambda: _settings)
+    count: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    duration_min: float = 0.0
+    duration_max: float = 0.0
+    duration_total: float = 0.0
+    kept_trace_ids: list[str] = field(default_factory=list)
+    _lock: Lock = field(default_factory=Lock, repr=False, compare=False)
+
+    @property
+    def duration_mean(self) -> float:
+        return self.duration_total / self.count if self.count else 0.0
+
+    def add(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            if not self.count or seconds < self.duration_min:
+                self.duration_min = seconds
+            self.duration_max = max(self.duration_max, seconds)
+            self.duration_total += seconds
+            self.count += 1
+            if ok:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+
+    def keep(self, trace_id: str) -> bool:
+        with self._lock:
+            if len(self.kept_trace_ids) >= self.settings.max_kept_traces:
+                return False
+            self.kept_trace_ids.append(trace_id)
+            return True
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.name} count={self.count} succeeded={self.succeeded} failed={self.failed} "
+            f"min={self.duration_min*1000:.3f}ms mean={self.duration_mean*1000:.3f}ms "
+            f"max={self.duration_max*1000:.3f}ms kept={self.kept_trace_ids}"
+        )
+
+
+class BatchItemTrace(PendingTrace):
+    """
+    Only counted in the batch, the item trace is kept in full if it fails or is slow.
+    Kept traces are linked to the parent span, the others are never published.
+    """
+
+    def __init__(
+        self,
+        span_name: str,
+        span_kwargs: dict[str, Any],
+        trace_id: str,
+        parent_trace: LogTrace,
+        parent_span: LogSpan,
+        batch: TraceBatch,
+    ):
+        super().__init__(span_name, span_kwargs, trace_id, parent_trace, parent_span)
+        self.batch = batch
+
+    def finish(self, error: ErrorTuple | None = None) -> None:
+        batch = self.batch
+        seconds = (perf_counter_ns() - self.ns_start) / 1e9
+        batch.add(seconds, ok=error is None)
+        is_interesting = error or seconds >= batch.settings.slow_threshold_seconds
+        if is_interesting and batch.keep(self.trace_id):
+            trace = self.start()
+            if self.parent_trace and self.parent_span:
+                self.parent_trace.link_trace_child(self.parent_span, self.trace_id)
+            self._exit(trace, error)
+        elif trace := self.trace:
+            trace.skip_publish = True
+            self._exit(trace, error)
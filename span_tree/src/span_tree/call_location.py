@@ -1,20 +1,26 @@
 from __future__ import annotations
 
 from inspect import currentframe
-from types import FrameType
+from types import CodeType, FrameType
 
 _MODULE_NAME = __name__.split(".")[0]
 
 
-def as_caller_name() -> str:
-    frame: FrameType | None = currentframe().f_back  # type: ignore
+def _caller_frame(frame: FrameType | None) -> FrameType | None:
     for frames_back in range(10):
         if frame is None:
-            return ""
+            return None
         frame = frame.f_back
-        package = frame.f_globals["__package__"]  # type: ignore
+        if frame is None:
+            return None
+        package = frame.f_globals.get("__package__")
         if package != _MODULE_NAME:
             break
+    return frame
+
+
+def as_caller_name() -> str:
+    frame = _caller_frame(currentframe().f_back)  # type: ignore
     if frame is None:
         return ""
     code = frame.f_code
@@ -24,3 +30,31 @@ def as_caller_name() -> str:
         name = code.co_name
     file = code.co_filename
     return f'File "{file}", line {frame.f_lineno}, in {name}'
+
+
+class CallLocation:
+    """Only stores the code and line number, the text is created on first `str()`"""
+
+    __slots__ = ("code", "lineno", "_text")
+
+    def __init__(self, code: CodeType, lineno: int):
+        self.code = code
+        self.lineno = lineno
+        self._text = ""
+
+    def __str__(self) -> str:
+        if not self._text:
+            code = self.code
+            name = getattr(code, "co_qualname", code.co_name)
+            self._text = f'File "{code.co_filename}", line {self.lineno}, in {name}'
+        return self._text
+
+    __repr__ = __str__
+
+
+def as_caller_location() -> CallLocation | str:
+    """Cheaper than `as_caller_name` when the location might never be rendered"""
+    frame = _caller_frame(currentframe().f_back)  # type: ignore
+    if frame is None:
+        return ""
+    return CallLocation(frame.f_code, frame.f_lineno)
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from statistics import median
+from time import monotonic
+from typing import Hashable
+
+from span_tree.log_span import (
+    NODE_TYPE_EXCEPT_ERROR,
+    NODE_TYPE_EXIT_ERROR,
+    NODE_TYPE_TRACE_BATCH,
+    NODE_TYPE_TREE_CHILD,
+    NODE_TYPE_TREE_PARENT,
+)
+from span_tree.log_trace import LogTrace
+
+# any of these events means the trace is printed in full
+_NOT_COALESCED_EVENTS = {
+    NODE_TYPE_EXIT_ERROR,
+    NODE_TYPE_EXCEPT_ERROR,
+    NODE_TYPE_TREE_CHILD,
+    NODE_TYPE_TREE_PARENT,
+    NODE_TYPE_TRACE_BATCH,
+    *(
+        logging.getLevelName(level)
+        for level in (logging.WARNING, logging.ERROR, logging.CRITICAL)
+    ),
+}
+
+
+def trace_signature(trace: LogTrace) -> Hashable | None:
+    """Span paths and names, None if the trace should never be coalesced"""
+    if trace.parent_trace:
+        return None
+    signature = []
+    for path, span in trace.spans.items():
+        if not span.is_done or not span.is_ok:
+            return None
+        for event_type, _ in span.events:
+            if event_type in _NOT_COALESCED_EVENTS:
+                return None
+        signature.append((path, span.name))
+    return tuple(signature)
+
+
+@dataclass
+class _Group:
+    name: str
+    first_seen: float
+    # root span duration of the printed trace
+    reference_ms: float
+    durations_ms: list[float] = field(default_factory=list)
+
+
+@dataclass
+class TraceCoalescer:
+    """
+    The first successful trace with a signature is printed, identical traces in the
+    next window_seconds are only counted and summarized in one line.
+    A trace slower than slow_factor times the printed one (and at least min_slow_ms)
+    is an anomaly and printed in full.
+    """
+
+    window_seconds: float
+    slow_factor: float = 10
+    min_slow_ms: float = 5
+    _groups: dict[Hashable, _Group] = field(init=False, default_factory=dict)
+
+    def add(self, trace: LogTrace) -> bool:
+        """Returns True if the trace should be printed"""
+        if (signature := trace_signature(trace)) is None:
+            return True
+        duration_ms = trace.root_span.duration_ms
+        if group := self._groups.get(signature):
+            slow_ms = max(group.reference_ms * self.slow_factor, self.min_slow_ms)
+            if duration_ms > slow_ms:
+                return True
+            group.durations_ms.append(duration_ms)
+            return False
+        self._groups[signature] = _Group(trace.root_span.name, monotonic(), duration_ms)
+        return True
+
+    def flush(self, force: bool = False) -> list[str]:
+        """Summaries of the windows that are done"""
+        threshold = monotonic() - self.window_seconds
+        summaries = []
+        for signature, group in list(self._groups.items()):
+            if force or group.first_seen <= threshold:
+                del self._groups[signature]
+                if durations := group.durations_ms:
+                    summaries.append(
+                        f"{group.name} ×{len(durations)} more identical traces"
+                        f" p50={median(durations):.3f}ms max={max(durations):.3f}ms"
+                    )
+        return summaries
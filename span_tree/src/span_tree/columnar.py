@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import struct
+import sys
+import zipfile
+from array import array
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Mapping, Sequence
+
+from span_tree.constants import VALID_STATUSES
+from span_tree.lifecycle import StopPublishing
+from span_tree.log_span import LogSpan
+from span_tree.log_trace import LogTrace
+from span_tree.sink_worker import SinkWorker
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# typecode, npy descr
+NUMERIC_COLUMNS: dict[str, tuple[str, str]] = {
+    "trace": ("I", "<u4"),
+    "path": ("I", "<u4"),
+    "parent": ("i", "<i4"),
+    "name": ("I", "<u4"),
+    "status": ("B", "|u1"),
+    "start": ("d", "<f8"),
+    "end": ("d", "<f8"),
+    "duration_ms": ("d", "<f8"),
+    "runtime": ("I", "<u4"),
+    "event_count": ("I", "<u4"),
+}
+# dictionary encoded columns, the values are stored as `{column}_values`
+DICTIONARY_COLUMNS = ("trace", "path", "name", "runtime")
+STATUS_VALUES = VALID_STATUSES
+
+
+class _Dictionary:
+    __slots__ = ("codes", "values")
+
+    def __init__(self) -> None:
+        self.codes: dict[str, int] = {}
+        self.values: list[str] = []
+
+    def encode(self, value: str) -> int:
+        try:
+            return self.codes[value]
+        except KeyError:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+            return code
+
+
+class SpanColumns:
+    """
+    Flattened spans, one row per span, in typed column buffers.
+    `parent` is the row of the parent span in the same chunk (-1 for a root), the
+    spans of one trace are always in the same chunk.
+    """
+
+    def __init__(self) -> None:
+        self.columns: dict[str, array] = {}
+        self.dictionaries: dict[str, _Dictionary] = {}
+        self.clear()
+
+    def __len__(self) -> int:
+        return len(self.columns["trace"])
+
+    def clear(self) -> None:
+        self.columns = {
+            name: array(typecode) for name, (typecode, _) in NUMERIC_COLUMNS.items()
+        }
+        self.dictionaries = {name: _Dictionary() for name in DICTIONARY_COLUMNS}
+
+    def append_trace(self, trace: LogTrace) -> None:
+        columns = self.columns
+        dictionaries = self.dictionaries
+        trace_code = dictionaries["trace"].encode(trace.trace_id)
+        runtime_code = dictionaries["runtime"].encode(trace.runtime_id)
+        rows: dict[str, int] = {}
+        span: LogSpan
+        for path, span in trace.spans.items():
+            if not span.is_done:
+                continue
+            rows[path] = len(columns["trace"])
+            parent_path, _, _ = path.rpartition("/")
+            start, end = span.timestamp, span.timestamp_end
+            columns["trace"].append(trace_code)
+            columns["path"].append(dictionaries["path"].encode(path))
+            columns["parent"].append(rows.get(parent_path, -1))
+            columns["name"].append(dictionaries["name"].encode(span.name))
+            columns["status"].append(STATUS_VALUES.index(span.status))
+            columns["start"].append(start)
+            columns["end"].append(end)
+            columns["duration_ms"].append(span.duration_ms)
+            columns["runtime"].append(runtime_code)
+            columns["event_count"].append(len(span.events))
+
+    def arrays(self) -> dict[str, array | list[str]]:
+        arrays: dict[str, array | list[str]] = dict(self.columns)
+        for name, dictionary in self.dictionaries.items():
+            arrays[f"{name}_values"] = dictionary.values
+        arrays["status_values"] = list(STATUS_VALUES)
+        return arrays
+
+
+def _npy_header(descr: str, length: int) -> bytes:
+    header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({length},), }}"
+    # magic(6) + version(2) + header length(2) + header, aligned to 64 bytes
+    padding = -(10 + len(header) + 1) % 64
+    header_bytes = f"{header}{' ' * padding}\n".encode("latin1")
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header_bytes)) + header_bytes
+
+
+def _npy_bytes(values: array | Sequence[str], descr: str = "") -> bytes:
+    if isinstance(values, array):
+        if sys.byteorder == "big":
+            values = array(values.typecode, values)
+            values.byteswap()
+        return _npy_header(descr, len(values)) + values.tobytes()
+    width = max((len(value) for value in values), default=0) or 1
+    data = b"".join(value.ljust(width, "\0").encode("utf-32-le") for value in values)
+    return _npy_header(f"<U{width}", len(values)) + data
+
+
+def write_npz(path: str | Path, arrays: Mapping[str, array | Sequence[str]]) -> None:
+    """Same layout as `numpy.savez`, without requiring numpy to write"""
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) as zf:
+        for name, values in arrays.items():
+            descr = NUMERIC_COLUMNS[name][1] if name in NUMERIC_COLUMNS else ""
+            zf.writestr(f"{name}.npy", _npy_bytes(values, descr))
+
+
+def columnar_publisher(
+    directory: str | Path,
+    chunk_rows: int = 100_000,
+    flush_interval_seconds: float = 60,
+) -> tuple[Callable[[LogTrace], None], StopPublishing]:
+    """
+    Returns: publish, stop_publishing
+    Writes `spans-00000.npz`, ... with at most ~chunk_rows spans each, a partial
+    chunk is written every flush_interval_seconds and on stop.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    columns = SpanColumns()
+    chunk_number = len(list(directory.glob("spans-*.npz")))
+
+    def flush() -> None:
+        nonlocal chunk_number
+        if not len(columns):
+            return
+        write_npz(directory / f"spans-{chunk_number:05d}.npz", columns.arrays())
+        chunk_number += 1
+        columns.clear()
+
+    def add_traces(traces: list[LogTrace]) -> None:
+        for trace in traces:
+            columns.append_trace(trace)
+            if len(columns) >= chunk_rows:
+                flush()
+
+    worker = SinkWorker(
+        "columnar",
+        add_traces,
+        on_interval=flush,
+        interval_seconds=flush_interval_seconds,
+    )
+
+    def stop_publishing(timeout: float | None = None) -> bool:
+        return worker.stop(timeout)
+
+    return worker.put, stop_publishing
+
+
+def load_chunks(paths: Sequence[str | Path]) -> dict[str, np.ndarray]:
+    """Concatenates chunks, the dictionary codes are re-encoded to one dictionary"""
+    import numpy as np
+
+    parts: dict[str, list[np.ndarray]] = {name: [] for name in NUMERIC_COLUMNS}
+    values: dict[str, list[str]] = {name: [] for name in DICTIONARY_COLUMNS}
+    codes: dict[str, dict[str, int]] = {name: {} for name in DICTIONARY_COLUMNS}
+    row_offset = 0
+    for path in paths:
+        with np.load(path) as chunk:
+            for name in NUMERIC_COLUMNS:
+                parts[name].append(chunk[name])
+            for name in DICTIONARY_COLUMNS:
+                mapping = codes[name]
+                chunk_values = chunk[f"{name}_values"].tolist()
+                for value in chunk_values:
+                    if value not in mapping:
+                        mapping[value] = len(values[name])
+                        values[name].append(value)
+                recode = np.array([mapping[value] for value in chunk_values], np.uint32)
+                parts[name][-1] = recode[parts[name][-1]]
+            parent = parts["parent"][-1]
+            parts["parent"][-1] = np.where(parent >= 0, parent + row_offset, -1)
+            row_offset += len(parent)
+    table: dict[str, Any] = {
+        name: np.concatenate(arrays) if arrays else np.array([])
+        for name, arrays in parts.items()
+    }
+    for name in DICTIONARY_COLUMNS:
+        table[f"{name}_values"] = np.array(values[name])
+    table["status_values"] = np.array(STATUS_VALUES)
+    return table
+
+
+def percentiles_by_name(
+    table: Mapping[str, np.ndarray], q: Sequence[float] = (50, 90, 99)
+) -> dict[str, list[float]]:
+    import numpy as np
+
+    names, durations = table["name"], table["duration_ms"]
+    order = np.lexsort((durations, names))
+    sorted_names = names[order]
+    sorted_durations = durations[order]
+    unique, starts = np.unique(sorted_names, return_index=True)
+    ends = np.append(starts[1:], len(sorted_names))
+    name_values = table["name_values"]
+    return {
+        str(name_values[code]): np.percentile(sorted_durations[start:end], q).tolist()
+        for code, start, end in zip(unique, starts, ends)
+    }
+
+
+def last_ending_child(table: Mapping[str, np.ndarray]) -> np.ndarray:
+    """Row of the child that ends last for every row, -1 for leaves"""
+    import numpy as np
+
+    parent, end = table["parent"], table["end"]
+    child_rows = np.flatnonzero(parent >= 0)
+    # sorted by parent then end, the last row of each parent ends last
+    child_rows = child_rows[np.lexsort((end[child_rows], parent[child_rows]))]
+    parents = parent[child_rows]
+    is_last = np.ones(len(child_rows), dtype=bool)
+    is_last[:-1] = parents[1:] != parents[:-1]
+    last_child = np.full(len(parent), -1, dtype=np.int64)
+    last_child[parents[is_last]] = child_rows[is_last]
+    return last_child
+
+
+def critical_path_ms(table: Mapping[str, np.ndarray]) -> dict[str, float]:
+    """
+    Following the last ending child from every root, the time spent in each span
+    name excluding the next span on the path, summed over all traces.
+    """
+    import numpy as np
+
+    duration = table["duration_ms"]
+    last_child = last_ending_child(table)
+    on_path = np.zeros(len(duration), dtype=bool)
+    current = np.flatnonzero(table["parent"] < 0)
+    while len(current):
+        on_path[current] = True
+        current = last_child[current]
+        current = current[current >= 0]
+    child_duration = np.where(last_child >= 0, duration[last_child], 0.0)
+    self_ms = np.clip(duration - child_duration, 0, None)
+    names = table["name"]
+    totals = np.bincount(
+        names[on_path], weights=self_ms[on_path], minlength=len(table["name_values"])
+    )
+    name_values = table["name_values"]
+    return {
+        str(name_values[code]): float(total)
+        for code, total in enumerate(totals)
+        if total
+    }
@@ -6,6 +6,7 @@ from typing import Optional, Type
 from typing_extensions import TypeAlias
 
 EXTRA_NAME = "log_trace"
+BOUND_CONTEXT = "span_tree_context"
 REF_SRC = "__REF_SRC"
 REF_DEST = "__REF_DEST"
 SPAN_STATUS_FIELD = "span_status"
@@ -15,10 +16,24 @@ STATUS_CREATED = "created"
 STATUS_STARTED = "started"
 STATUS_SUCCEEDED = "succeeded"
 STATUS_FAILED = "failed"
-VALID_STATUSES = (STATUS_CREATED, STATUS_STARTED, STATUS_SUCCEEDED, STATUS_FAILED)
+# still running when the process was shutting down
+STATUS_INTERRUPTED = "interrupted"
+VALID_STATUSES = (
+    STATUS_CREATED,
+    STATUS_STARTED,
+    STATUS_SUCCEEDED,
+    STATUS_FAILED,
+    STATUS_INTERRUPTED,
+)
 TS_START_FIELD = "ts_start"
 TS_END_FIELD = "ts_end"
+# perf_counter_ns, the durations are exact, ts_start/ts_end are derived from them
+NS_START_FIELD = "ns_start"
+NS_END_FIELD = "ns_end"
 CALL_LOCATION = "call_location"
+DEBUG_BUFFER_SIZE = "debug_buffer_size"
+# span kwarg, see span_tree.profiling
+PROFILE = "profile"
 
 # my own fields
 ASYNC_TASK_NAME = "async_task_name"
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from hashlib import blake2b
+from threading import Lock
+from time import monotonic
+from typing import Any, Iterable
+
+from span_tree.trace_store import error_type
+
+_SITE_PACKAGES = re.compile(r"^.*[/\\](site|dist)-packages[/\\]")
+_TRACEBACK_FRAME = re.compile(
+    r'^\s*File "(?P<filename>[^"]+)", line \d+, in (?P<name>.+)$'
+)
+
+
+def _normalize_filename(filename: str) -> str:
+    # installed packages are in different directories on each host
+    return _SITE_PACKAGES.sub("", filename)
+
+
+def _frames_from_text(text: str) -> Iterable[tuple[str, str]]:
+    for line in text.splitlines():
+        if match := _TRACEBACK_FRAME.match(line):
+            yield match["filename"], match["name"]
+
+
+def error_fingerprint(error: Any) -> tuple[str, str]:
+    """
+    Returns: (fingerprint, exception type) from a rich Trace or a formatted traceback.
+    Line numbers, locals and the message are ignored, an edit in the file or a
+    different value in the message keeps the fingerprint.
+    """
+    parts: list[str] = []
+    if stacks := getattr(error, "stacks", None):
+        for stack in stacks:
+            parts.append(stack.exc_type)
+            parts.extend(
+                f"{_normalize_filename(frame.filename)}:{frame.name}"
+                for frame in stack.frames
+            )
+    elif isinstance(error, str):
+        parts.append(error_type(error))
+        parts.extend(
+            f"{_normalize_filename(filename)}:{name}"
+            for filename, name in _frames_from_text(error)
+        )
+    digest = blake2b("\n".join(parts).encode(), digest_size=6).hexdigest()
+    return digest, error_type(error)
+
+
+@dataclass
+class ErrorCount:
+    fingerprint: str
+    exc_type: str
+    count: int = 0
+    window_count: int = 0
+    window_start: float = 0.0
+    last_seen: float = 0.0
+
+
+@dataclass
+class ErrorFingerprints:
+    """
+    Counts errors by fingerprint, an error is rendered in full the first time it is
+    seen in each window of window_seconds.
+    A trace can be rendered more than once (e.g., before a child trace arrives), the
+    same error object is only counted once and keeps its first in window result.
+    """
+
+    window_seconds: float = 60
+    # recent error objects, kept alive so their id is not reused
+    max_occurrences: int = 1000
+    _counts: dict[str, ErrorCount] = field(init=False, default_factory=dict)
+    _occurrences: OrderedDict[int, tuple[Any, bool]] = field(
+        init=False, default_factory=OrderedDict
+    )
+    _lock: Lock = field(init=False, default_factory=Lock)
+
+    def seen(
+        self, fingerprint: str, exc_type: str, error: Any = None
+    ) -> tuple[bool, ErrorCount]:
+        """
+        error: the rendered error, seen again when its trace is rendered again
+        Returns: (first in window, counts)
+        """
+        now = monotonic()
+        with self._lock:
+            counts = self._counts.get(fingerprint)
+            if counts is None:
+                counts = self._counts[fingerprint] = ErrorCount(fingerprint, exc_type)
+            if error is not None and (seen := self._occurrences.get(id(error))):
+                return seen[1], counts
+            first = (
+                not counts.window_count
+                or now - counts.window_start >= self.window_seconds
+            )
+            if first:
+                counts.window_start = now
+                counts.window_count = 0
+            counts.count += 1
+            counts.window_count += 1
+            counts.last_seen = now
+            if error is not None:
+                self._occurrences[id(error)] = (error, first)
+                if len(self._occurrences) > self.max_occurrences:
+                    self._occurrences.popitem(last=False)
+            return first, counts
+
+    def counts(self) -> list[ErrorCount]:
+        """Most frequent first"""
+        with self._lock:
+            return sorted(
+                (ErrorCount(**vars(counts)) for counts in self._counts.values()),
+                key=lambda counts: counts.count,
+                reverse=True,
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self._occurrences.clear()
+
+
+_fingerprints = ErrorFingerprints()
+
+
+def get_error_fingerprints() -> ErrorFingerprints:
+    return _fingerprints
+
+
+def set_error_fingerprints(fingerprints: ErrorFingerprints) -> ErrorFingerprints:
+    global _fingerprints
+    old = _fingerprints
+    _fingerprints = fingerprints
+    return old
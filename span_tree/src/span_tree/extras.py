@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import sys
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Callable, Sequence
+
+_SCALARS = (int, float, bool, type(None))
+_COPY_TYPES = (list, dict, set)
+_SEQUENCE_TYPES = (list, tuple, set, frozenset)
+_LEAF_TYPES = (*_SCALARS, str, bytes)
+
+
+@dataclass
+class ExtrasPolicy:
+    """
+    How extras are captured when added to a span
+    - snapshot: shallow copy list/dict/set values so later mutations are not rendered
+    - eager_repr: store the truncated repr of non-scalar values instead of the value
+    - max_repr_length: for str values and reprs
+    - max_extra_bytes/max_trace_bytes: values over the limit are replaced by a marker,
+      the size includes the values in containers and object attributes
+    - max_size_depth/max_size_items: containers nested deeper are not counted,
+      a value with more items is over the limit
+    """
+
+    snapshot: bool = True
+    eager_repr: bool = False
+    max_repr_length: int = 1_000
+    max_extra_bytes: int = 10_000
+    max_trace_bytes: int = 1_000_000
+    max_size_depth: int = 4
+    max_size_items: int = 1_000
+
+
+_policy = ExtrasPolicy()
+
+
+def set_extras_policy(policy: ExtrasPolicy) -> ExtrasPolicy:
+    global _policy
+    old = _policy
+    _policy = policy
+    return old
+
+
+@dataclass
+class ExtrasBudget:
+    used_bytes: int = 0
+    dropped: int = 0
+
+
+def truncate(text: str, max_length: int) -> str:
+    if len(text) <= max_length:
+        return text
+    return f"{text[:max_length]}...<{len(text) - max_length} more chars>"
+
+
+def safe_repr(value: Any, max_length: int) -> str:
+    try:
+        text = repr(value)
+    except Exception as e:
+        text = f"<repr failed: {e!r}>"
+    return truncate(text, max_length)
+
+
+class LazyRepr:
+    """Keeps the value until the first repr, then only the truncated repr"""
+
+    __slots__ = ("value", "max_length", "_repr")
+
+    def __init__(self, value: Any, max_length: int):
+        self.value = value
+        self.max_length = max_length
+        self._repr = ""
+
+    def __repr__(self) -> str:
+        if not self._repr:
+            self._repr = safe_repr(self.value, self.max_length)
+            self.value = None
+        return self._repr
+
+
+class Deferred:
+    """
+    Called only when the extra is rendered/serialized, e.g., never for a trace that is not published.
+    Called at most once, also when the renderer and a sink resolve it at the same time.
+    Exceptions are stored as the value.
+    """
+
+    __slots__ = ("func", "max_length", "_value", "_repr", "_lock")
+
+    def __init__(self, func: Callable[[], Any], max_length: int = 1_000):
+        self.func = func
+        self.max_length = max_length
+        self._value: Any = None
+        self._repr = ""
+        self._lock = Lock()
+
+    @property
+    def is_resolved(self) -> bool:
+        return self.func is None
+
+    def resolve(self) -> Any:
+        if self.func is not None:
+            with self._lock:
+                if (func := self.func) is not None:
+                    try:
+                        self._value = func()
+                    except Exception as e:
+                        self._value = f"<deferred failed: {e!r}>"
+                    self.func = None  # type: ignore
+        return self._value
+
+    def __repr__(self) -> str:
+        if not self._repr:
+            self._repr = safe_repr(self.resolve(), self.max_length)
+        return self._repr
+
+
+def deferred(func: Callable[[], Any]) -> Deferred:
+    return Deferred(func)
+
+
+def resolve(value: Any) -> Any:
+    """For exporters that serialize values instead of using repr"""
+    if isinstance(value, Deferred):
+        return value.resolve()
+    if isinstance(value, LazyRepr):
+        return repr(value)
+    return value
+
+
+def resolve_extra(extra: dict[str, Any]) -> dict[str, Any]:
+    return {key: resolve(value) for key, value in extra.items()}
+
+
+def _sizeof(value: Any) -> int:
+    try:
+        return sys.getsizeof(value)
+    except Exception:
+        return 0
+
+
+def _contained(value: Any, max_items: int) -> Sequence[Any] | None:
+    """
+    Returns: the values in a container or the attributes of an object,
+    None when there are more than max_items
+    """
+    if isinstance(value, dict):
+        if len(value) * 2 > max_items:
+            return None
+        return [*value.keys(), *value.values()]
+    if isinstance(value, _SEQUENCE_TYPES):
+        return None if len(value) > max_items else value  # type: ignore
+    if isinstance(attributes := getattr(value, "__dict__", None), dict):
+        return (attributes,)
+    return ()
+
+
+def estimate_size(value: Any, limit: int, max_depth: int, max_items: int) -> int:
+    """
+    sys.getsizeof of the value and everything it contains, containers are counted
+    once. Stops counting above limit, a value with more than max_items contained
+    values returns limit + 1.
+    """
+    size = _sizeof(value)
+    items = 0
+    seen: set[int] = set()
+    stack = [(value, 0)]
+    while stack and size <= limit:
+        value, depth = stack.pop()
+        if depth >= max_depth:
+            continue
+        contained = _contained(value, max_items - items)
+        if contained is None:
+            return limit + 1
+        items += len(contained)
+        for child in contained:
+            if isinstance(child, _LEAF_TYPES):
+                size += sys.getsizeof(child)
+            elif id(child) not in seen:
+                seen.add(id(child))
+                size += _sizeof(child)
+                stack.append((child, depth + 1))
+    return size
+
+
+def _capture_value(value: Any, policy: ExtrasPolicy, max_bytes: int) -> tuple[Any, int]:
+    if isinstance(value, _SCALARS):
+        return value, sys.getsizeof(value)
+    if isinstance(value, str):
+        text = truncate(value, policy.max_repr_length)
+        return text, sys.getsizeof(text)
+    if isinstance(value, Deferred):
+        value.max_length = policy.max_repr_length
+        return value, sys.getsizeof(value)
+    if policy.eager_repr:
+        text = safe_repr(value, policy.max_repr_length)
+        return text, sys.getsizeof(text)
+    if policy.snapshot and type(value) in _COPY_TYPES:
+        captured = value = value.copy()
+    else:
+        captured = LazyRepr(value, policy.max_repr_length)
+    # the whole value is kept alive until rendered
+    size = estimate_size(value, max_bytes, policy.max_size_depth, policy.max_size_items)
+    return captured, size
+
+
+def capture_extra(
+    extra: dict[str, Any],
+    budget: ExtrasBudget | None = None,
+    policy: ExtrasPolicy | None = None,
+) -> dict[str, Any]:
+    policy = policy or _policy
+    trace_bytes_left = policy.max_trace_bytes - (budget.used_bytes if budget else 0)
+    max_bytes = min(policy.max_extra_bytes, trace_bytes_left)
+    captured: dict[str, Any] = {}
+    extra_bytes = 0
+    dropped = 0
+    for key, value in extra.items():
+        value, size = _capture_value(value, policy, max_bytes - extra_bytes)
+        if extra_bytes + size > max_bytes:
+            captured[key] = f"<dropped: over the limit of {max_bytes} bytes>"
+            dropped += 1
+            continue
+        extra_bytes += size
+        captured[key] = value
+    if budget:
+        budget.used_bytes += extra_bytes
+        budget.dropped += dropped
+    return captured
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from queue import SimpleQueue
+from threading import Thread
+from time import monotonic
+from typing import Callable, Mapping
+
+from span_tree.handler import skip_wrap
+from span_tree.lifecycle import StopPublishing, register_stop, unregister_sink
+from span_tree.log_trace import LogTrace, TracePublisher
+from span_tree.sink_worker import SinkWorker
+
+logger = logging.getLogger(__name__)
+_stop = object()
+# SinkWorker name of a sink is WORKER_PREFIX + sink name
+WORKER_PREFIX = "fan_out."
+
+
+@dataclass
+class SinkStats:
+    name: str
+    handled: int
+    errors: int
+    dropped: int
+    queued: int
+
+
+class FanOut:
+    """
+    `publish` only hands the trace off to a dispatcher thread, which puts it in the
+    bounded queue of every sink. Each sink runs on its own SinkWorker, a slow sink
+    drops its own traces when its queue is full and a failing sink only counts errors.
+    A sink with a `handle_batch(traces)` method gets the whole batch in one call,
+    other sinks are called once per trace.
+    """
+
+    def __init__(
+        self,
+        sinks: Mapping[str, TracePublisher],
+        max_queue_size: int = 10_000,
+        max_batch_size: int = 100,
+    ):
+        self.names = list(sinks)
+        self.workers = [
+            self._sink_worker(name, sink, max_queue_size, max_batch_size)
+            for name, sink in sinks.items()
+        ]
+        self._handoff: SimpleQueue[LogTrace | object] = SimpleQueue()
+        self._thread = Thread(target=self._dispatch, name="fan-out", daemon=True)
+        self._thread.start()
+        self._registered = register_stop("fan_out", self.stop, self.qsize)
+
+    @staticmethod
+    def _sink_worker(
+        name: str, sink: TracePublisher, max_queue_size: int, max_batch_size: int
+    ) -> SinkWorker:
+        def handle_each(traces: list[LogTrace]) -> None:
+            # a failing trace never drops the rest of the batch
+            for trace in traces:
+                try:
+                    sink(trace)
+                except Exception as e:
+                    worker.errors += 1
+                    logger.exception(e)
+
+        worker = SinkWorker(
+            f"{WORKER_PREFIX}{name}",
+            getattr(sink, "handle_batch", handle_each),
+            max_batch_size=max_batch_size,
+            max_queue_size=max_queue_size,
+            register=False,
+        )
+        return worker
+
+    def publish(self, trace: LogTrace) -> None:
+        self._handoff.put(trace)
+
+    __call__ = publish
+
+    def qsize(self) -> int:
+        return self._handoff.qsize() + sum(worker.qsize() for worker in self.workers)
+
+    def stats(self) -> list[SinkStats]:
+        return [
+            SinkStats(
+                name,
+                worker.traces_handled,
+                worker.errors,
+                worker.dropped,
+                worker.qsize(),
+            )
+            for name, worker in zip(self.names, self.workers)
+        ]
+
+    def stop(self, timeout: float | None = None) -> bool:
+        """The dispatcher is drained first, then the sinks share the time left"""
+        unregister_sink(self._registered)
+        deadline = None if timeout is None else monotonic() + timeout
+        self._handoff.put(_stop)
+        self._thread.join(timeout)
+        flushed = not self._thread.is_alive()
+        for worker in self.workers:
+            worker.request_stop()
+        for worker in self.workers:
+            remaining = None if deadline is None else max(deadline - monotonic(), 0)
+            flushed = worker.stop(remaining) and flushed
+        return flushed
+
+    def _dispatch(self) -> None:
+        get = self._handoff.get
+        workers = self.workers
+        while (trace := get()) is not _stop:
+            for worker in workers:
+                worker.put(trace)  # type: ignore
+
+
+skip_wrap(FanOut._dispatch)
+
+
+def fan_out_publisher(
+    sinks: Mapping[str, TracePublisher],
+    max_queue_size: int = 10_000,
+    max_batch_size: int = 100,
+) -> tuple[Callable[[LogTrace], None], StopPublishing]:
+    """
+    Returns: publish, stop_publishing
+    e.g., `fan_out_publisher({"console": print_trace, "sqlite": sqlite_publish})`
+    """
+    fan_out = FanOut(sinks, max_queue_size, max_batch_size)
+    return fan_out.publish, fan_out.stop
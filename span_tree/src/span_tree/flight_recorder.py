@@ -0,0 +1,224 @@
+"""
+Recent span starts/ends in a fixed size memory-mapped ring buffer file.
+The pages belong to the OS page cache, so the records survive the process being
+killed (OOM, segfault, SIGKILL). Read them with `python -m span_tree.flight_recorder PATH`.
+The buffer of the previous process is kept at PATH.prev when a new recorder starts.
+"""
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import sys
+from dataclasses import dataclass
+from itertools import count
+from pathlib import Path
+from threading import get_ident
+from time import time
+from typing import Sequence
+
+from span_tree.constants import (
+    NS_END_FIELD,
+    NS_START_FIELD,
+    SPAN_NAME_FIELD,
+    SPAN_STATUS_FIELD,
+    STATUS_SUCCEEDED,
+)
+from span_tree.log_span import LogSpan
+from span_tree.log_trace import (
+    SPAN_ENDED,
+    SPAN_STARTED,
+    TRACE_DONE,
+    LogTrace,
+    set_span_listener,
+)
+
+MAGIC = b"SPANFR01"
+# magic, slot size, slot count, pid, created
+HEADER = struct.Struct("<8sIIQd")
+HEADER_SIZE = 64
+# seq, ts, kind, ok, thread, duration_ms, trace_id, name, span path
+RECORD = struct.Struct("<QdBBQf32s48s16s2x")
+RECORD_SIZE = RECORD.size
+KIND_NAMES = {SPAN_STARTED: "start", SPAN_ENDED: "end", TRACE_DONE: "done"}
+
+
+@dataclass
+class FlightRecord:
+    seq: int
+    ts: float
+    kind: str
+    ok: bool
+    thread: int
+    duration_ms: float
+    trace_id: str
+    name: str
+    span_path: str
+
+
+def previous_path(path: str | Path) -> Path:
+    path = Path(path)
+    return path.with_name(f"{path.name}.prev")
+
+
+def _open_rotated(path: Path) -> tuple[int, Path | None]:
+    """Returns: (fd of an empty file, where the previous buffer was moved)"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    header = os.pread(fd, HEADER.size, 0)
+    if not header:
+        return fd, None
+    os.close(fd)
+    if not header.startswith(MAGIC):
+        raise ValueError(f"not a flight recorder file: {path}")
+    previous = previous_path(path)
+    os.replace(path, previous)
+    return os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644), previous
+
+
+class FlightRecorder:
+    """
+    A span listener, every event is one `pack_into` a slot chosen by a global
+    sequence number, no lock is taken. The oldest slots are overwritten.
+    An existing buffer is renamed to `previous` instead of being overwritten,
+    a file that is not a flight recorder buffer raises ValueError.
+    """
+
+    def __init__(self, path: str | Path, slot_count: int = 65_536):
+        self.path = Path(path)
+        self.slot_count = slot_count
+        size = HEADER_SIZE + slot_count * RECORD.size
+        fd, self.previous = _open_rotated(self.path)
+        try:
+            os.ftruncate(fd, size)
+            self._mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        HEADER.pack_into(
+            self._mmap, 0, MAGIC, RECORD.size, slot_count, os.getpid(), time()
+        )
+        self._seq = count(1)
+        self._pack_into = RECORD.pack_into
+
+    def __call__(self, kind: int, trace: LogTrace, span: LogSpan, span_path: str):
+        # next() on itertools.count is atomic under the GIL
+        seq = next(self._seq)
+        # span.data skips the UserDict and property overhead
+        data = span.data
+        if kind == SPAN_STARTED:
+            duration_ms, ok = 0.0, False
+        else:
+            duration_ms = (data[NS_END_FIELD] - data[NS_START_FIELD]) / 1e6
+            ok = data[SPAN_STATUS_FIELD] == STATUS_SUCCEEDED
+        self._pack_into(
+            self._mmap,
+            HEADER_SIZE + (seq % self.slot_count) * RECORD_SIZE,
+            seq,
+            time(),
+            kind,
+            ok,
+            get_ident(),
+            duration_ms,
+            trace.trace_id.encode()[:32],
+            data[SPAN_NAME_FIELD].encode()[:48],
+            span_path.encode()[:16],
+        )
+
+    def close(self) -> None:
+        self._mmap.flush()
+        self._mmap.close()
+
+
+def start_flight_recorder(path: str | Path, slot_count: int = 65_536) -> FlightRecorder:
+    recorder = FlightRecorder(path, slot_count)
+    set_span_listener(recorder)
+    return recorder
+
+
+def stop_flight_recorder(recorder: FlightRecorder) -> None:
+    set_span_listener(None)
+    recorder.close()
+
+
+def _decode(raw: bytes) -> str:
+    return raw.rstrip(b"\0").decode(errors="replace")
+
+
+def read_flight_records(path: str | Path) -> tuple[int, list[FlightRecord]]:
+    """Returns: (pid, records oldest first)"""
+    data = Path(path).read_bytes()
+    magic, slot_size, slot_count, pid, _ = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or slot_size != RECORD.size:
+        raise ValueError(f"not a flight recorder file: {path}")
+    records = []
+    for slot in range(slot_count):
+        offset = HEADER_SIZE + slot * slot_size
+        (
+            seq,
+            ts,
+            kind,
+            ok,
+            thread,
+            duration,
+            trace_id,
+            name,
+            span_path,
+        ) = RECORD.unpack_from(data, offset)
+        # seq=0 is never written, a torn slot has a seq for another slot
+        if seq == 0 or seq % slot_count != slot:
+            continue
+        records.append(
+            FlightRecord(
+                seq,
+                ts,
+                KIND_NAMES.get(kind, str(kind)),
+                bool(ok),
+                thread,
+                duration,
+                _decode(trace_id),
+                _decode(name),
+                _decode(span_path),
+            )
+        )
+    records.sort(key=lambda record: record.seq)
+    return pid, records
+
+
+def in_flight(records: Sequence[FlightRecord]) -> list[FlightRecord]:
+    """Starts without an end, spans of a trace end in reverse order of starting"""
+    started: dict[str, list[FlightRecord]] = {}
+    for record in records:
+        if record.kind == "start":
+            started.setdefault(record.trace_id, []).append(record)
+        elif record.kind == "end" and (stack := started.get(record.trace_id)):
+            stack.pop()
+    return sorted(
+        (record for stack in started.values() for record in stack),
+        key=lambda record: record.seq,
+    )
+
+
+def _format(record: FlightRecord) -> str:
+    status = "" if record.kind == "start" else ("ok" if record.ok else "FAILED")
+    duration = f" {record.duration_ms:.3f}ms" if record.kind != "start" else ""
+    return (
+        f"{record.seq:>10} {record.ts:.6f} thread={record.thread} {record.kind:<5} "
+        f"{record.trace_id} {record.span_path} {record.name} {status}{duration}"
+    )
+
+
+def main(argv: Sequence[str]) -> int:
+    if len(argv) not in (1, 2):
+        print("usage: python -m span_tree.flight_recorder PATH [LAST_N]")  # noqa: T201
+        return 2
+    pid, records = read_flight_records(argv[0])
+    last_n = int(argv[1]) if len(argv) == 2 else 50
+    lines = [f"pid={pid} records={len(records)}, last {last_n}:"]
+    lines.extend(_format(record) for record in records[-last_n:])
+    lines.append("in-flight spans:")
+    lines.extend(_format(record) for record in in_flight(records))
+    print("\n".join(lines))  # noqa: T201
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
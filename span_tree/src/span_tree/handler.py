@@ -2,20 +2,34 @@ import logging
 import os
 import sys
 from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import partial
 from threading import Thread
 from typing import Callable, TextIO, TypeVar
+from weakref import WeakKeyDictionary
 
 from typing_extensions import ParamSpec
-from zero_3rdparty.error import error_and_traceback
 from zero_3rdparty.logging_utils import setup_logging
 from zero_3rdparty.object_name import as_name
 
-from span_tree.call_location import as_caller_name
-from span_tree.constants import CALL_LOCATION, EXTRA_NAME, REF_DEST, REF_SRC
+from span_tree.batch import BatchItemTrace, TraceBatch
+from span_tree.call_location import CallLocation, as_caller_location
+from span_tree.constants import (
+    BOUND_CONTEXT,
+    CALL_LOCATION,
+    EXTRA_NAME,
+    REF_DEST,
+    REF_SRC,
+)
+from span_tree.extras import capture_extra
+from span_tree.log_span import LogSpan
 from span_tree.log_trace import (
     LogTrace,
+    PendingTrace,
     current_trace_or_none,
+    get_debug_buffer_size,
     next_trace_id,
+    set_debug_buffer_size,
     set_trace_publisher,
 )
 
@@ -26,9 +40,11 @@ class MyHandler(logging.Handler):
         level=logging.NOTSET,
         stream: TextIO = sys.stdout,
         render_traces: bool = False,
+        event_level: int = logging.INFO,
     ):
         super().__init__(level)
         self.stream = stream
+        self.event_level = event_level
         if render_traces:
             from span_tree.rich_rendering import print_trace_call
 
@@ -36,47 +52,69 @@ class MyHandler(logging.Handler):
 
     def emit(self, record: logging.LogRecord) -> None:
         try:
+            if record.levelno < self.event_level and self._buffer_debug(record):
+                return
             has_msg = record.msg
             text = self.format(record)
             if has_msg:
                 self.stream.write(f"{text}\n")
             extra = getattr(record, EXTRA_NAME, None)
             if trace := current_trace_or_none():
-                if exc_info := record.exc_info:
-                    trace.handle_error(
-                        exc_info,  # type: ignore
-                        caller_name=record.funcName,
-                        caller_path=record.pathname,
-                        caller_lineno=record.lineno,
-                        call_trace=text,
-                    )
-                    return
-                span = trace.current_span
-                if has_msg:
-                    span.add_log(record.levelname, text)
-                if extra:
-                    span.add_extra(extra)
-                if ref := getattr(record, REF_SRC, None):
-                    span.add_ref_src(ref)
-                if ref := getattr(record, REF_DEST, None):
-                    span.add_ref_dest(ref)
+                self._add_to_trace(trace, record, text, extra)
                 return
             if extra:
                 self._dump_extras(record, extra)
         except Exception as e:
+            from zero_3rdparty.error import error_and_traceback
+
             error_str = error_and_traceback(e)
             self.stream.write(f"{error_str}\n")
 
+    def _buffer_debug(self, record: logging.LogRecord) -> bool:
+        """
+        True when the record is only kept for a failing span, without a debug buffer
+        the record is written and added to the span like any other record
+        """
+        trace = current_trace_or_none(start_pending=False)
+        if trace and trace.buffer_debug(record, self.format):
+            return True
+        # buffering every trace, records outside of a trace are not needed
+        return get_debug_buffer_size() > 0
+
+    def _add_to_trace(
+        self, trace: LogTrace, record: logging.LogRecord, text: str, extra: dict | None
+    ) -> None:
+        if exc_info := record.exc_info:
+            trace.handle_error(
+                exc_info,  # type: ignore
+                caller_name=record.funcName,
+                caller_path=record.pathname,
+                caller_lineno=record.lineno,
+                call_trace=text,
+            )
+            return
+        span = trace.current_span
+        if context := getattr(record, BOUND_CONTEXT, None):
+            span.add_context(context)
+        if record.msg:
+            span.add_log(record.levelname, text)
+        if extra:
+            span.add_extra(capture_extra(extra, trace.extras_budget))
+        if ref := getattr(record, REF_SRC, None):
+            span.add_ref_src(ref)
+        if ref := getattr(record, REF_DEST, None):
+            span.add_ref_dest(ref)
+
     def _dump_extras(self, record: logging.LogRecord, extra: dict):
-        record2 = logging.LogRecord(
-            **{
-                **record.__dict__,
-                "msg": f"log_extra_no_parent: {extra!r}",
-                "level": record.levelno,
-            }
-        )
-        self.stream.write(self.format(record2))
-        self.stream.write("\n")
+        if context := getattr(record, BOUND_CONTEXT, None):
+            extra = {**context, **extra}
+        msg, args = record.msg, record.args
+        record.msg, record.args = f"log_extra_no_parent: {extra!r}", None
+        try:
+            text = self.format(record)
+        finally:
+            record.msg, record.args = msg, args
+        self.stream.write(f"{text}\n")
 
 
 def create_handler(stream: TextIO, render_traces: bool) -> MyHandler:
@@ -89,16 +127,35 @@ def configure(
     render_traces: bool = False,
     tags: dict[str, str] | None = None,
     disable_prev_logger: bool = False,
+    debug_buffer_size: int = 0,
+    shutdown_deadline_seconds: float = 0,
 ):
+    """
+    debug_buffer_size: keep up to this many DEBUG records per trace, they are only
+    added to the spans when a span fails
+    shutdown_deadline_seconds: when > 0, running traces are published and all sinks
+    flushed on exit/SIGTERM within the deadline, see `span_tree.lifecycle`
+    """
     tags = tags or {}
     handler_dict = {
         "()": "span_tree.handler.create_handler",
-        "level": logging.INFO,
+        "level": logging.DEBUG if debug_buffer_size else logging.INFO,
         "stream": "ext://sys.stdout",
         "render_traces": render_traces,
     }
 
     setup_logging(handler_dict, disable_stream_handler=disable_prev_logger)
+    set_debug_buffer_size(debug_buffer_size)
+    if shutdown_deadline_seconds > 0:
+        from span_tree.lifecycle import install_shutdown_handlers
+
+        install_shutdown_handlers(shutdown_deadline_seconds)
+    if debug_buffer_size:
+        root_logger = logging.getLogger()
+        root_logger.setLevel(logging.DEBUG)
+        for handler in root_logger.handlers:
+            if handler.level == logging.NOTSET and not isinstance(handler, MyHandler):
+                handler.setLevel(logging.INFO)
 
 
 ParamSpecT = ParamSpec("ParamSpecT")
@@ -110,31 +167,56 @@ def skip_wrap(func: Callable) -> None:
     setattr(func, _skip_wrap, True)
 
 
+_span_names: WeakKeyDictionary[Callable, str] = WeakKeyDictionary()
+_current_batch: ContextVar[
+    tuple[TraceBatch, LogTrace, LogSpan, CallLocation | str] | None
+] = ContextVar(f"{__name__}.current_batch", default=None)
+
+
+def span_name(func: Callable) -> str:
+    # bound methods are created on every attribute access, cache the function
+    key = getattr(func, "__func__", func)
+    try:
+        return _span_names[key]
+    except KeyError:
+        name = _span_names[key] = as_name(func)
+        return name
+    except TypeError:
+        return as_name(func)
+
+
 def wrap_call(func: Callable[ParamSpecT, ReturnT]) -> Callable[ParamSpecT, ReturnT]:
-    func_name = as_name(func)
-    if (
-        getattr(func, _skip_wrap, False)
-        or func_name == "concurrent.futures.thread._worker"
-    ):
+    if getattr(func, _skip_wrap, False):
+        return func
+    func_name = span_name(func)
+    if func_name == "concurrent.futures.thread._worker":
         return func
+    if batch_parent := _current_batch.get():
+        batch, parent_trace, parent_span, caller_location = batch_parent
+        pending: PendingTrace = BatchItemTrace(
+            func_name,
+            {CALL_LOCATION: caller_location},
+            next_trace_id(),
+            parent_trace,
+            parent_span,
+            batch,
+        )
+        return partial(pending.run, func)  # type: ignore
+    caller_location = as_caller_location()
     parent_trace = current_trace_or_none()
-    span_name = as_name(func)
-    caller_location = as_caller_name()
     trace_id = next_trace_id()
+    parent_span = None
     if parent_trace:
-        parent_trace.current_span.add_trace_child(trace_id)
-
-    def wrapped_func(*args: ParamSpecT.args, **kwargs: ParamSpecT.kwargs) -> ReturnT:
-        task = LogTrace(
-            span_name,
-            span_kwargs={CALL_LOCATION: caller_location},
-            parent_trace=parent_trace,
-            trace_id=trace_id,
-        )
-        with task:
-            return func(*args, **kwargs)
-
-    return wrapped_func
+        parent_span = parent_trace.current_span
+        parent_span.add_trace_child(trace_id)
+    pending = PendingTrace(
+        func_name,
+        {CALL_LOCATION: caller_location},
+        trace_id,
+        parent_trace,
+        parent_span,
+    )
+    return partial(pending.run, func)  # type: ignore
 
 
 def monkeypatch_submit():
@@ -147,6 +229,27 @@ def monkeypatch_submit():
     ThreadPoolExecutor.submit = new_submit
 
 
+def monkeypatch_map():
+    old_map = ThreadPoolExecutor.map
+
+    def new_map(self, fn, *iterables, **kwargs):
+        if (parent_trace := current_trace_or_none()) is None:
+            return old_map(self, fn, *iterables, **kwargs)
+        parent_span = parent_trace.current_span
+        batch = TraceBatch(span_name(fn))
+        parent_span.add_trace_batch(batch)
+        # Executor.map submits all items before returning the iterator
+        token = _current_batch.set(
+            (batch, parent_trace, parent_span, as_caller_location())
+        )
+        try:
+            return old_map(self, fn, *iterables, **kwargs)
+        finally:
+            _current_batch.reset(token)
+
+    ThreadPoolExecutor.map = new_map  # type: ignore
+
+
 def monkeypatch_thread_init():
     old_init = Thread.__init__
 
@@ -169,4 +272,5 @@ def monkeypatch_thread_init():
 
 if not os.environ.get("LOG_TREE_SKIP_MONKEYPATCH"):
     monkeypatch_submit()
+    monkeypatch_map()
     monkeypatch_thread_init()
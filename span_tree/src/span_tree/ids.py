@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import itertools
+import os
+import string
+from threading import Lock, local
+from time import time
+from typing import Callable
+from weakref import WeakSet
+
+from typing_extensions import TypeAlias
+
+IdGenerator: TypeAlias = Callable[[], str]
+_BASE62 = string.digits + string.ascii_uppercase + string.ascii_lowercase
+_BASE62_PAIRS = [a + b for a in _BASE62 for b in _BASE62]
+KSUID_EPOCH = 1_400_000_000
+KSUID_LENGTH = 27
+_PREFIX_BYTES = 6
+_THREAD_BITS = 24
+_COUNTER_BITS = 40
+
+
+def base62(value: int, length: int = 0) -> str:
+    # two digits per divmod halves the big int divisions
+    pairs = []
+    while value:
+        value, remainder = divmod(value, 3844)
+        pairs.append(_BASE62_PAIRS[remainder])
+    return "".join(reversed(pairs)).lstrip("0").rjust(length, "0")
+
+
+class ProcessCounterIds:
+    """
+    Ids are `{process_prefix}{thread_number}-{counter}`.
+    The prefix is random per process (regenerated after fork), the counter is
+    per thread so no lock is taken after a thread's first id.
+    """
+
+    def __init__(self) -> None:
+        self._reset()
+        _generators.add(self)
+
+    def _reset(self) -> None:
+        # the lock can be held by another thread of the parent while forking
+        self._lock = Lock()
+        self.process_random = int.from_bytes(os.urandom(_PREFIX_BYTES), "big")
+        self.prefix = base62(self.process_random, 9)
+        self._thread_numbers = itertools.count()
+        self._local = local()
+
+    def _register_thread(self) -> tuple[int, Callable[[], int]]:
+        with self._lock:
+            thread_number = next(self._thread_numbers)
+        counter = itertools.count().__next__
+        self._local.thread_number = thread_number
+        self._local.counter = counter
+        return thread_number, counter
+
+    def _thread_counter(self) -> tuple[int, Callable[[], int]]:
+        thread_local = self._local
+        try:
+            return thread_local.thread_number, thread_local.counter
+        except AttributeError:
+            return self._register_thread()
+
+    def __call__(self) -> str:
+        thread_number, counter = self._thread_counter()
+        return f"{self.prefix}{thread_number}-{counter()}"
+
+
+class KsuidIds(ProcessCounterIds):
+    """
+    Time-sortable 27 character base62 ids with the [ksuid](https://github.com/segmentio/ksuid) layout:
+    4 bytes seconds since the ksuid epoch + 16 bytes payload.
+    The payload is the process random + thread number + counter instead of
+    os.urandom, so ids stay unique without a syscall per id.
+    """
+
+    def __call__(self) -> str:
+        thread_number, counter = self._thread_counter()
+        payload = (
+            (self.process_random << (_THREAD_BITS + _COUNTER_BITS))
+            | ((thread_number & ((1 << _THREAD_BITS) - 1)) << _COUNTER_BITS)
+            | (counter() & ((1 << _COUNTER_BITS) - 1))
+        )
+        seconds = int(time()) - KSUID_EPOCH
+        return base62((seconds << 128) | payload, KSUID_LENGTH)
+
+
+_generators: WeakSet[ProcessCounterIds] = WeakSet()
+
+
+def _reset_after_fork() -> None:
+    for generator in list(_generators):
+        generator._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+_id_generator: IdGenerator = ProcessCounterIds()
+
+
+def next_id() -> str:
+    return _id_generator()
+
+
+def set_id_generator(generator: IdGenerator) -> IdGenerator:
+    global _id_generator
+    old = _id_generator
+    _id_generator = generator
+    return old
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import signal
+from dataclasses import dataclass, field
+from threading import Lock, Thread, current_thread, main_thread
+from time import monotonic
+from typing import Any, Callable, Protocol
+
+from span_tree.handler import skip_wrap
+from span_tree.log_trace import state
+
+logger = logging.getLogger(__name__)
+
+
+class StopPublishing(Protocol):
+    def __call__(self, timeout: float | None = None) -> bool:
+        """Returns True if everything was flushed before the timeout"""
+
+
+class Sink(Protocol):
+    name: str
+
+    def stop(self, timeout: float | None = None) -> bool:
+        """Returns True if everything was flushed before the timeout"""
+
+    def qsize(self) -> int:
+        ...
+
+
+@dataclass
+class _StopSink:
+    name: str
+    stop_publishing: StopPublishing
+    pending: Callable[[], int]
+
+    def stop(self, timeout: float | None = None) -> bool:
+        return self.stop_publishing(timeout)
+
+    def qsize(self) -> int:
+        return self.pending()
+
+
+@dataclass
+class ShutdownStats:
+    interrupted_traces: int = 0
+    flushed_sinks: list[str] = field(default_factory=list)
+    timed_out_sinks: list[str] = field(default_factory=list)
+    # traces still queued in the sinks that timed out
+    dropped_traces: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+
+
+_sinks: dict[int, Sink] = {}
+_lock = Lock()
+_shutdown_stats: ShutdownStats | None = None
+_deadline_seconds = 5.0
+
+
+def register_sink(sink: Sink) -> None:
+    with _lock:
+        _sinks[id(sink)] = sink
+
+
+def unregister_sink(sink: Sink) -> None:
+    with _lock:
+        _sinks.pop(id(sink), None)
+
+
+def register_stop(
+    name: str,
+    stop_publishing: StopPublishing,
+    pending: Callable[[], int] | None = None,
+) -> Sink:
+    """For publishers without a SinkWorker, e.g., `trace_publisher`"""
+    sink = _StopSink(name, stop_publishing, pending or int)
+    register_sink(sink)
+    return sink
+
+
+def active_sinks() -> list[Sink]:
+    with _lock:
+        return list(_sinks.values())
+
+
+def interrupt_running_traces() -> int:
+    """Publishes the traces that are still running, their running spans are `interrupted`"""
+    count = 0
+    for trace in state.snapshot().values():
+        try:
+            trace.interrupt()
+            count += 1
+        except Exception as e:
+            logger.exception(e)
+    return count
+
+
+def shutdown(deadline_seconds: float | None = None) -> ShutdownStats:
+    """
+    Only runs once, later calls return the stats of the first call.
+    The running traces are published before the sinks are stopped, each sink gets
+    the time left until the deadline.
+    Sinks are stopped in reverse registration order: a sink wrapping others (e.g.,
+    `FanOut`) is created after them and drains into them before they are stopped.
+    """
+    global _shutdown_stats
+    with _lock:
+        if _shutdown_stats is not None:
+            return _shutdown_stats
+        stats = _shutdown_stats = ShutdownStats()
+    start = monotonic()
+    deadline = start + (
+        _deadline_seconds if deadline_seconds is None else deadline_seconds
+    )
+    stats.interrupted_traces = interrupt_running_traces()
+    for sink in reversed(active_sinks()):
+        try:
+            if sink.stop(max(deadline - monotonic(), 0)):
+                stats.flushed_sinks.append(sink.name)
+            else:
+                stats.timed_out_sinks.append(sink.name)
+                stats.dropped_traces += sink.qsize()
+        except Exception as e:
+            stats.errors += 1
+            logger.exception(e)
+        unregister_sink(sink)
+    stats.seconds = monotonic() - start
+    if stats.timed_out_sinks or stats.dropped_traces:
+        logger.warning(f"shutdown flush incomplete: {stats}")
+    return stats
+
+
+def shutdown_stats() -> ShutdownStats | None:
+    return _shutdown_stats
+
+
+def _on_exit() -> None:
+    shutdown()
+
+
+def _shutdown_in_thread() -> None:
+    shutdown()
+
+
+skip_wrap(_shutdown_in_thread)
+
+
+# the default action of these signals is to ignore them
+_IGNORED_BY_DEFAULT = {
+    getattr(signal, name)
+    for name in ("SIGCHLD", "SIGURG", "SIGWINCH")
+    if hasattr(signal, name)
+}
+
+
+def _is_ignored(signum: int, previous: Any) -> bool:
+    if previous == signal.SIG_IGN:
+        return True
+    return previous in (signal.SIG_DFL, None) and signum in _IGNORED_BY_DEFAULT
+
+
+def _on_signal(signum: int, frame: Any) -> None:
+    previous = _previous_handlers.get(signum, signal.SIG_DFL)
+    if _is_ignored(signum, previous):
+        # the process keeps running, so do the sinks
+        return
+    # the interrupted main thread can hold a trace or registry lock, waiting for the
+    # flush on another thread keeps the deadline even if the flush blocks on it
+    flush = Thread(target=_shutdown_in_thread, name="span-tree-shutdown", daemon=True)
+    flush.start()
+    flush.join(_deadline_seconds)
+    if flush.is_alive():
+        logger.warning(
+            f"shutdown flush still running after {_deadline_seconds}s, "
+            f"handling signal {signum}"
+        )
+    if callable(previous):
+        previous(signum, frame)
+        return
+    # re-raise with the default handler to keep the exit code of the signal
+    signal.signal(signum, signal.SIG_DFL)
+    os.kill(os.getpid(), signum)
+
+
+_previous_handlers: dict[int, Any] = {}
+
+
+def install_shutdown_handlers(
+    deadline_seconds: float = 5.0,
+    signals: tuple[signal.Signals, ...] = (signal.SIGTERM,),
+) -> None:
+    """atexit and signal handlers flushing all sinks within deadline_seconds"""
+    global _deadline_seconds
+    _deadline_seconds = deadline_seconds
+    atexit.unregister(_on_exit)
+    atexit.register(_on_exit)
+    if current_thread() is not main_thread():
+        logger.warning("signal handlers can only be installed from the main thread")
+        return
+    for signum in signals:
+        previous = signal.signal(signum, _on_signal)
+        if previous is not _on_signal:
+            _previous_handlers[signum] = previous
@@ -0,0 +1,406 @@
+"""
+Synthetic traces through the real span, log_extra, ThreadPoolExecutor and asyncio
+paths, to size the publisher and the sinks without production traffic.
+`python -m span_tree.loadgen --sink sqlite --sink otlp --rate 500 --duration 10`
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Event, Thread
+from time import monotonic, perf_counter_ns
+from typing import Callable, Sequence
+
+from typing_extensions import TypeAlias
+
+from span_tree import get_logger
+from span_tree.fan_out import WORKER_PREFIX
+from span_tree.handler import MyHandler, skip_wrap
+from span_tree.lifecycle import StopPublishing, active_sinks
+from span_tree.log_trace import LogTrace, TracePublisher, temp_publisher
+from span_tree.sink_worker import SinkWorker, set_batch_listener
+
+logger = get_logger(__name__)
+ROOT_SPAN_NAME = "loadgen_root"
+
+
+class LoadgenError(Exception):
+    pass
+
+
+@dataclass
+class LoadSettings:
+    # span levels below the root and child spans per span
+    depth: int = 3
+    fan_out: int = 2
+    events_per_span: int = 2
+    # probability that a leaf span raises, the error is handled by its parent
+    error_rate: float = 0.01
+    # threads starting root traces
+    threads: int = 4
+    # per root trace, each item/task is a child trace
+    pool_items: int = 0
+    async_tasks: int = 0
+    # root traces per second for all threads, 0 is as fast as possible
+    target_rate: float = 0
+    duration_seconds: float = 10
+    drain_timeout_seconds: float = 30
+
+    @property
+    def spans_per_trace(self) -> int:
+        return sum(self.fan_out**level for level in range(self.depth + 1))
+
+
+def _span_tree(settings: LoadSettings, depth: int) -> None:
+    for event in range(settings.events_per_span):
+        logger.log_extra(event=event, depth=depth)
+    if depth >= settings.depth:
+        if random.random() < settings.error_rate:
+            raise LoadgenError(f"synthetic error at depth {depth}")
+        return
+    for _ in range(settings.fan_out):
+        try:
+            with logger(f"loadgen_depth_{depth + 1}"):
+                _span_tree(settings, depth + 1)
+        except LoadgenError:
+            logger.exception("handled synthetic error")
+
+
+def _pool_item(item: int) -> int:
+    logger.log_extra(item=item)
+    return item
+
+
+async def _async_task(index: int) -> None:
+    with logger("loadgen_task"):
+        logger.log_extra(task=index)
+        await asyncio.sleep(0)
+
+
+async def _gather_tasks(count: int) -> None:
+    await asyncio.gather(*(_async_task(index) for index in range(count)))
+
+
+def _root_trace(settings: LoadSettings, executor: ThreadPoolExecutor) -> None:
+    # depth=0 makes the root a leaf that can fail
+    try:
+        with logger(ROOT_SPAN_NAME):
+            _span_tree(settings, 0)
+            if settings.pool_items:
+                list(executor.map(_pool_item, range(settings.pool_items)))
+            if settings.async_tasks:
+                asyncio.run(_gather_tasks(settings.async_tasks))
+    except LoadgenError:
+        pass
+
+
+def _generate(settings: LoadSettings, stop: Event, counts: list[int], index: int):
+    interval = settings.threads / settings.target_rate if settings.target_rate else 0
+    next_start = monotonic()
+    with ThreadPoolExecutor(max(settings.pool_items, 1)) as executor:
+        while not stop.is_set():
+            if interval:
+                next_start += interval
+                if stop.wait(max(next_start - monotonic(), 0)):
+                    break
+            _root_trace(settings, executor)
+            counts[index] += 1
+
+
+skip_wrap(_generate)
+
+
+@dataclass
+class Percentiles:
+    p50: float = 0.0
+    p99: float = 0.0
+    max: float = 0.0
+
+    @classmethod
+    def of(cls, values: list[int], unit_ns: int) -> Percentiles:
+        if not values:
+            return cls()
+        ordered = sorted(values)
+        last = len(ordered) - 1
+        return cls(
+            ordered[last // 2] / unit_ns,
+            ordered[last * 99 // 100] / unit_ns,
+            ordered[last] / unit_ns,
+        )
+
+
+@dataclass
+class LoadReport:
+    settings: LoadSettings
+    root_traces: int
+    seconds: float
+    # time spent in the publisher on the thread exiting the root span
+    publish_us: Percentiles
+    # root span exit -> batch handled, by SinkWorker name
+    # `fan_out.<sink>` workers only hand the traces to the sink, e.g., the sqlite
+    # writes are measured by the `sqlite` worker
+    sink_latency_ms: dict[str, Percentiles]
+    sink_traces: dict[str, int]
+    queue_depth_max: int
+    queue_depth_mean: float
+    drained: bool
+    drain_seconds: float
+
+    @property
+    def traces_per_second(self) -> float:
+        return self.root_traces / self.seconds if self.seconds else 0.0
+
+    def sink_traces_per_second(self, name: str) -> float:
+        total_seconds = self.seconds + self.drain_seconds
+        return self.sink_traces[name] / total_seconds if total_seconds else 0.0
+
+    def format(self) -> str:
+        publish = self.publish_us
+        lines = [
+            f"root traces: {self.root_traces} in {self.seconds:.1f}s"
+            f" = {self.traces_per_second:.0f}/s"
+            f" ({self.settings.spans_per_trace} spans per root trace)",
+            f"publish on app thread: p50={publish.p50:.1f}us p99={publish.p99:.1f}us"
+            f" max={publish.max:.1f}us",
+            f"queued traces: max={self.queue_depth_max} mean={self.queue_depth_mean:.1f}",
+            f"drained={self.drained} in {self.drain_seconds:.2f}s",
+        ]
+        for name, latency in sorted(self.sink_latency_ms.items()):
+            label = (
+                f"fan-out to {name.removeprefix(WORKER_PREFIX)}"
+                if name.startswith(WORKER_PREFIX)
+                else f"sink {name}"
+            )
+            lines.append(
+                f"{label}: {self.sink_traces[name]} traces"
+                f" = {self.sink_traces_per_second(name):.0f}/s,"
+                f" latency p50={latency.p50:.1f}ms p99={latency.p99:.1f}ms"
+                f" max={latency.max:.1f}ms"
+            )
+        return "\n".join(lines)
+
+
+@dataclass
+class _Recorder:
+    publish_ns: list[int] = field(default_factory=list)
+    latencies_ns: dict[str, list[int]] = field(default_factory=dict)
+    queue_depths: list[int] = field(default_factory=list)
+
+    def wrap(self, publish: TracePublisher) -> TracePublisher:
+        append = self.publish_ns.append
+
+        def measured_publish(trace: LogTrace) -> None:
+            start = perf_counter_ns()
+            publish(trace)
+            append(perf_counter_ns() - start)
+
+        return measured_publish
+
+    def on_batch(self, sink_name: str, batch: list[LogTrace]) -> None:
+        now = perf_counter_ns()
+        latencies = self.latencies_ns.setdefault(sink_name, [])
+        latencies.extend(now - trace.root_span.end_ns for trace in batch)
+
+    def monitor_queues(self, stop: Event, interval_seconds: float = 0.05) -> None:
+        while not stop.wait(interval_seconds):
+            self.queue_depths.append(sum(sink.qsize() for sink in active_sinks()))
+
+
+skip_wrap(_Recorder.monitor_queues)
+
+
+def run_load(
+    settings: LoadSettings,
+    publish: TracePublisher,
+    stop_publishing: StopPublishing | None = None,
+) -> LoadReport:
+    """
+    Runs the workload against `publish`, stop_publishing is called afterwards to
+    measure how long the sinks need to drain.
+    Sink latencies are only reported for SinkWorker based sinks.
+    """
+    recorder = _Recorder()
+    stop, monitor_stop = Event(), Event()
+    counts = [0] * settings.threads
+    threads = [
+        Thread(
+            target=_generate,
+            args=(settings, stop, counts, index),
+            name=f"loadgen-{index}",
+            daemon=True,
+        )
+        for index in range(settings.threads)
+    ]
+    monitor = Thread(target=recorder.monitor_queues, args=(monitor_stop,), daemon=True)
+    old_listener = set_batch_listener(recorder.on_batch)
+    try:
+        with temp_publisher(recorder.wrap(publish)):
+            start = monotonic()
+            monitor.start()
+            for thread in threads:
+                thread.start()
+            stop.wait(settings.duration_seconds)
+            stop.set()
+            for thread in threads:
+                thread.join()
+            seconds = monotonic() - start
+        drain_start = monotonic()
+        drained = True
+        if stop_publishing:
+            drained = stop_publishing(settings.drain_timeout_seconds)
+        drain_seconds = monotonic() - drain_start
+    finally:
+        monitor_stop.set()
+        set_batch_listener(old_listener)
+    depths = recorder.queue_depths or [0]
+    return LoadReport(
+        settings=settings,
+        root_traces=sum(counts),
+        seconds=seconds,
+        publish_us=Percentiles.of(recorder.publish_ns, 1_000),
+        sink_latency_ms={
+            name: Percentiles.of(latencies, 1_000_000)
+            for name, latencies in recorder.latencies_ns.items()
+        },
+        sink_traces={
+            name: len(latencies) for name, latencies in recorder.latencies_ns.items()
+        },
+        queue_depth_max=max(depths),
+        queue_depth_mean=sum(depths) / len(depths),
+        drained=drained,
+        drain_seconds=drain_seconds,
+    )
+
+
+Publisher: TypeAlias = tuple[TracePublisher, StopPublishing]
+
+
+def _null_sink(out: Path) -> Publisher:
+    worker = SinkWorker("null", lambda traces: None)
+    return worker.put, worker.stop
+
+
+def _sqlite_sink(out: Path) -> Publisher:
+    from span_tree.sqlite_store import sqlite_publisher
+
+    return sqlite_publisher(out / "traces.db")
+
+
+def _columnar_sink(out: Path) -> Publisher:
+    from span_tree.columnar import columnar_publisher
+
+    return columnar_publisher(out / "columnar")
+
+
+def _otlp_sink(out: Path) -> Publisher:
+    from span_tree.otlp_json import otlp_file_publisher
+
+    return otlp_file_publisher(out / "traces.otlp.jsonl")
+
+
+def _metrics_sink(out: Path) -> Publisher:
+    from span_tree.metrics_exporter import metrics_file_publisher
+
+    return metrics_file_publisher(out / "span_tree.prom")
+
+
+def _console_sink(out: Path) -> Publisher:
+    from span_tree.log_trace_publisher import trace_publisher
+
+    return trace_publisher()
+
+
+SINKS: dict[str, Callable[[Path], Publisher]] = {
+    "null": _null_sink,
+    "sqlite": _sqlite_sink,
+    "columnar": _columnar_sink,
+    "otlp": _otlp_sink,
+    "metrics": _metrics_sink,
+    "console": _console_sink,
+}
+
+
+def create_publisher(names: Sequence[str], out: Path) -> Publisher:
+    """More than one sink are combined with `fan_out_publisher`"""
+    out.mkdir(parents=True, exist_ok=True)
+    publishers = {name: SINKS[name](out) for name in dict.fromkeys(names)}
+    if len(publishers) == 1:
+        return next(iter(publishers.values()))
+    from span_tree.fan_out import fan_out_publisher
+
+    fan_out_publish, fan_out_stop = fan_out_publisher(
+        {name: publish for name, (publish, _) in publishers.items()}
+    )
+
+    def stop_publishing(timeout: float | None = None) -> bool:
+        deadline = None if timeout is None else monotonic() + timeout
+        flushed = fan_out_stop(timeout)
+        for _, stop in publishers.values():
+            remaining = None if deadline is None else max(deadline - monotonic(), 0)
+            flushed = stop(remaining) and flushed
+        return flushed
+
+    return fan_out_publish, stop_publishing
+
+
+def parse_settings(argv: Sequence[str]) -> tuple[LoadSettings, list[str], Path]:
+    defaults = LoadSettings()
+    parser = argparse.ArgumentParser(
+        prog="python -m span_tree.loadgen", description=__doc__
+    )
+    parser.add_argument("--sink", action="append", choices=sorted(SINKS))
+    parser.add_argument("--out", type=Path, default=Path("loadgen-out"))
+    parser.add_argument("--depth", type=int, default=defaults.depth)
+    parser.add_argument("--fan-out", type=int, default=defaults.fan_out)
+    parser.add_argument("--events", type=int, default=defaults.events_per_span)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--threads", type=int, default=defaults.threads)
+    parser.add_argument("--pool-items", type=int, default=defaults.pool_items)
+    parser.add_argument("--async-tasks", type=int, default=defaults.async_tasks)
+    parser.add_argument("--rate", type=float, default=defaults.target_rate)
+    parser.add_argument("--duration", type=float, default=defaults.duration_seconds)
+    args = parser.parse_args(argv)
+    settings = LoadSettings(
+        depth=args.depth,
+        fan_out=args.fan_out,
+        events_per_span=args.events,
+        error_rate=args.error_rate,
+        threads=args.threads,
+        pool_items=args.pool_items,
+        async_tasks=args.async_tasks,
+        target_rate=args.rate,
+        duration_seconds=args.duration,
+    )
+    return settings, args.sink or ["null"], args.out
+
+
+def install_handler() -> None:
+    """
+    log_extra and logger.exception only reach the spans through a MyHandler, the
+    handler output (synthetic errors) goes to os.devnull to keep the report readable.
+    """
+    root_logger = logging.getLogger()
+    if not any(isinstance(handler, MyHandler) for handler in root_logger.handlers):
+        root_logger.addHandler(MyHandler(stream=open(os.devnull, "w")))
+    if root_logger.getEffectiveLevel() > logging.INFO:
+        root_logger.setLevel(logging.INFO)
+
+
+def main(argv: Sequence[str]) -> int:
+    settings, sinks, out = parse_settings(argv)
+    install_handler()
+    publish, stop_publishing = create_publisher(sinks, out)
+    report = run_load(settings, publish, stop_publishing)
+    print(report.format())  # noqa: T201
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -2,20 +2,30 @@ from __future__ import annotations
 
 import logging
 from collections import UserDict
-from time import time
-from typing import Any, Callable, Iterable, Literal, Type, TypeVar
-
-from rich.traceback import Trace
+from time import perf_counter_ns, time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Iterable,
+    Literal,
+    NamedTuple,
+    Type,
+    TypeVar,
+)
 
 from span_tree.call_location import as_caller_name
 from span_tree.constants import (
     ASYNC_TASK_NAME,
     CALL_LOCATION,
+    NS_END_FIELD,
+    NS_START_FIELD,
     ON_EXIT,
     SPAN_NAME_FIELD,
     SPAN_STATUS_FIELD,
     STATUS_CREATED,
     STATUS_FAILED,
+    STATUS_INTERRUPTED,
     STATUS_STARTED,
     STATUS_SUCCEEDED,
     TS_END_FIELD,
@@ -23,18 +33,44 @@ from span_tree.constants import (
     ErrorTuple,
 )
 
+if TYPE_CHECKING:
+    from rich.traceback import Trace
+
 logger = logging.getLogger(__name__)
 _NODE_COUNTER = "__node_counter__"
 _CHILD_INDEX = "__child_counter__"
 _CHILD_PLACEHOLDER = "__child_placeholder"
+_CONTEXT_IDS = "__context_ids__"
 NODE_TYPE_EXIT_ERROR = "exit_error"
 NODE_TYPE_EXCEPT_ERROR = "except_error"
 NODE_TYPE_REF_SRC = "ref_src"
 NODE_TYPE_REF_DEST = "ref_dest"
 NODE_TYPE_TREE_CHILD = "trace_child"
 NODE_TYPE_TREE_PARENT = "trace_parent"
+NODE_TYPE_TRACE_BATCH = "trace_batch"
+NODE_TYPE_CONTEXT = "context"
+NODE_TYPE_PROFILE = "profile"
+NODE_TYPE_STACK_SAMPLES = "stack_samples"
 _EVENTS = "__EVENTS__"
 T = TypeVar("T")
+_DONE_STATUSES = {STATUS_FAILED, STATUS_SUCCEEDED, STATUS_INTERRUPTED}
+
+
+class ClockAnchor(NamedTuple):
+    """
+    time() at perf_counter_ns(), spans convert their perf_counter_ns to wall clock
+    seconds with it, so wall clock adjustments never change a duration.
+    """
+
+    wall: float
+    ns: int
+
+    def wall_time(self, ns: int) -> float:
+        return self.wall + (ns - self.ns) / 1e9
+
+
+def clock_anchor() -> ClockAnchor:
+    return ClockAnchor(time(), perf_counter_ns())
 
 
 def as_trace_child_id(key: str, value: Any) -> str | None:
@@ -57,31 +93,55 @@ class LogSpan(UserDict):
         name: str,
         on_exit: Callable[[LogSpan, ErrorTuple | None], None] | None = None,
         *args,
+        clock: ClockAnchor | None = None,
         **kwargs,
     ) -> None:
-        super().__init__(*args, **kwargs)
-        self[SPAN_STATUS_FIELD] = STATUS_CREATED
-        self[_NODE_COUNTER] = 0
-        self[SPAN_NAME_FIELD] = name
-        self[_EVENTS] = []
+        # one anchor per trace, see LogTrace.clock
+        self.clock = clock or clock_anchor()
+        # using self.data directly skips UserDict.__setitem__ on the hot path
+        data = self.data = dict(*args, **kwargs)
+        data[SPAN_STATUS_FIELD] = STATUS_CREATED
+        data[_NODE_COUNTER] = 0
+        data[SPAN_NAME_FIELD] = name
+        data[_EVENTS] = []
         if on_exit:
-            self[ON_EXIT] = on_exit
+            data[ON_EXIT] = on_exit
 
     def __enter__(self) -> LogSpan:
-        assert self.status == STATUS_CREATED
-        self[SPAN_STATUS_FIELD] = STATUS_STARTED
-        self[TS_START_FIELD] = time()
-        if CALL_LOCATION not in self:
-            self[CALL_LOCATION] = as_caller_name()
+        data = self.data
+        assert data[SPAN_STATUS_FIELD] == STATUS_CREATED
+        data[SPAN_STATUS_FIELD] = STATUS_STARTED
+        self.set_start_ns(perf_counter_ns())
+        if CALL_LOCATION not in data:
+            data[CALL_LOCATION] = as_caller_name()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self[TS_END_FIELD] = time()
-        self[SPAN_STATUS_FIELD] = STATUS_FAILED if exc_val else STATUS_SUCCEEDED
-        if on_complete := self.get(ON_EXIT):
+        data = self.data
+        # interrupted by a shutdown: already published, the end and status are kept
+        if data[SPAN_STATUS_FIELD] != STATUS_INTERRUPTED:
+            self._set_end_ns(perf_counter_ns())
+            data[SPAN_STATUS_FIELD] = STATUS_FAILED if exc_val else STATUS_SUCCEEDED
+        if on_complete := data.get(ON_EXIT):
             error_tuple = (exc_type, exc_val, exc_tb) if exc_val else None
             on_complete(self, error_tuple)
 
+    def interrupt(self) -> None:
+        """Ends a running span, on_exit is still called when the span exits"""
+        self._set_end_ns(perf_counter_ns())
+        self.data[SPAN_STATUS_FIELD] = STATUS_INTERRUPTED
+
+    def set_start_ns(self, ns: int) -> None:
+        """Also used to start a span at an earlier perf_counter_ns"""
+        data = self.data
+        data[NS_START_FIELD] = ns
+        data[TS_START_FIELD] = self.clock.wall_time(ns)
+
+    def _set_end_ns(self, ns: int) -> None:
+        data = self.data
+        data[NS_END_FIELD] = ns
+        data[TS_END_FIELD] = self.clock.wall_time(ns)
+
     def __repr__(self):
         return repr({k: v for k, v in self.items() if k != ON_EXIT})
 
@@ -91,12 +151,21 @@ class LogSpan(UserDict):
 
     @property
     def call_location(self) -> str:
-        return self[CALL_LOCATION]
+        return str(self[CALL_LOCATION])
 
     @property
-    def duration_ms(self) -> float:
+    def duration_ns(self) -> int:
         assert self.is_done
-        return self.timestamp_end - self.timestamp
+        data = self.data
+        return data[NS_END_FIELD] - data[NS_START_FIELD]
+
+    @property
+    def duration_us(self) -> float:
+        return self.duration_ns / 1_000
+
+    @property
+    def duration_ms(self) -> float:
+        return self.duration_ns / 1_000_000
 
     @property
     def is_ok(self) -> bool:
@@ -113,7 +182,7 @@ class LogSpan(UserDict):
 
     @property
     def is_done(self) -> bool:
-        return self[SPAN_STATUS_FIELD] in {STATUS_FAILED, STATUS_SUCCEEDED}
+        return self[SPAN_STATUS_FIELD] in _DONE_STATUSES
 
     @property
     def timestamp(self) -> float:
@@ -123,6 +192,14 @@ class LogSpan(UserDict):
     def timestamp_end(self) -> float:
         return self[TS_END_FIELD]
 
+    @property
+    def start_ns(self) -> int:
+        return self[NS_START_FIELD]
+
+    @property
+    def end_ns(self) -> int:
+        return self[NS_END_FIELD]
+
     @property
     def async_task_name(self) -> str | None:
         return self.get(ASYNC_TASK_NAME)
@@ -145,6 +222,19 @@ class LogSpan(UserDict):
     def add_extra(self, extra: dict[str, Any]) -> None:
         self.add_event("extra", extra)
 
+    def add_context(self, context: dict[str, Any]) -> None:
+        # a bound logger shares one context dict, only added on its first event
+        seen: set[int] = self.data.setdefault(_CONTEXT_IDS, set())
+        if (context_id := id(context)) not in seen:
+            seen.add(context_id)
+            self.add_event(NODE_TYPE_CONTEXT, context)
+
+    def add_profile(self, profile: Any) -> None:
+        self.add_event(NODE_TYPE_PROFILE, profile)
+
+    def add_stack_samples(self, samples: Any) -> None:
+        self.add_event(NODE_TYPE_STACK_SAMPLES, samples)
+
     def add_log(self, level: str, message: str) -> None:
         self.add_event(level, message)
 
@@ -154,6 +244,18 @@ class LogSpan(UserDict):
     def add_trace_child(self, child_id: str) -> None:
         self.add_event(NODE_TYPE_TREE_CHILD, dict(id=child_id))
 
+    def add_trace_batch(self, batch: Any) -> None:
+        self.add_event(NODE_TYPE_TRACE_BATCH, batch)
+
+    def remove_trace_child(self, child_id: str) -> None:
+        events = self[_EVENTS]
+        # children are usually removed soon after being added
+        for index in range(len(events) - 1, -1, -1):
+            event_type, event = events[index]
+            if event_type == NODE_TYPE_TREE_CHILD and event["id"] == child_id:
+                del events[index]
+                return
+
     @property
     def events(self) -> list[tuple[str, Any]]:
         return [(k, v) for (k, v) in self[_EVENTS] if not k.startswith("__")]
@@ -170,11 +272,11 @@ class LogSpan(UserDict):
     def events_with_child_placeholders(self) -> Iterable[tuple[str, Any]]:
         return self[_EVENTS]
 
-    def add_exit_trace(self, trace: Trace, call_trace: str) -> None:
+    def add_exit_trace(self, trace: Trace | str, call_trace: str) -> None:
         self.add_event(NODE_TYPE_EXIT_ERROR, trace)
         self.add_event("call_trace", call_trace)
 
-    def add_except_trace(self, trace: Trace, call_trace: str) -> None:
+    def add_except_trace(self, trace: Trace | str, call_trace: str) -> None:
         self.add_event(NODE_TYPE_EXCEPT_ERROR, trace)
         self.add_event("call_trace", call_trace)
 
@@ -1,31 +1,51 @@
 from __future__ import annotations
 
-import itertools
 import logging
-from asyncio import current_task as current_async_task
+import sys
+from collections import deque
 from contextlib import contextmanager, suppress
 from contextvars import ContextVar, Token
 from dataclasses import dataclass, field
 from functools import cached_property
-from threading import current_thread
-from typing import Any, Callable
+from threading import Lock, current_thread, get_ident
+from time import perf_counter_ns
+from traceback import format_exception
+from typing import TYPE_CHECKING, Any, Callable, TypeVar
 
-from rich.traceback import Frame, Traceback
 from typing_extensions import TypeAlias
 
-from span_tree.constants import ErrorTuple
-from span_tree.log_span import LogSpan
+from span_tree.constants import DEBUG_BUFFER_SIZE, STATUS_INTERRUPTED, ErrorTuple
+from span_tree.extras import ExtrasBudget
+from span_tree.ids import next_id
+from span_tree.log_span import ClockAnchor, LogSpan, clock_anchor
+from span_tree.profiling import should_profile, start_profiler, stop_profiler
+from span_tree.trace_state import TraceRegistry
+
+if TYPE_CHECKING:
+    from cProfile import Profile
+
+    from rich.traceback import Trace
 
 logger = logging.getLogger(__name__)
+T = TypeVar("T")
+FormatRecord: TypeAlias = Callable[[logging.LogRecord], str]
+SPAN_STARTED = 1
+SPAN_ENDED = 2
+TRACE_DONE = 3
+# event, trace, span, span path (empty when the span ends)
+SpanListener: TypeAlias = Callable[[int, "LogTrace", LogSpan, str], Any]
 
 
 def next_trace_id() -> str:
-    return f"t-{counter()}"
+    return f"t-{next_id()}"
 
 
 def async_task_name() -> str:
+    # no task can be running if asyncio was never imported
+    if (asyncio := sys.modules.get("asyncio")) is None:
+        return ""
     with suppress(RuntimeError):
-        if task := current_async_task():
+        if task := asyncio.current_task():
             return task.get_name()
     return ""
 
@@ -37,6 +57,26 @@ def runtime_id() -> str:
     return thread_name
 
 
+def extract_trace(
+    error_tuple: ErrorTuple, except_location: tuple[str, int, str] | None = None
+) -> Trace | str:
+    """rich is only imported on the first error, without rich the trace is the formatted traceback"""
+    try:
+        from rich.traceback import Frame, Traceback
+    except ImportError:
+        return "".join(format_exception(*error_tuple))
+    trace = Traceback.extract(*error_tuple, show_locals=True)
+    if except_location:
+        filename, lineno, name = except_location
+        trace_stack = trace.stacks[0]
+        # raise location, call location
+        trace_stack.frames = [
+            trace_stack.frames[-1],
+            Frame(filename=filename, lineno=lineno, name=name),
+        ]
+    return trace
+
+
 @dataclass
 class LogTrace:
     span_name: str = ""
@@ -46,7 +86,27 @@ class LogTrace:
     parent_trace: LogTrace | None = None
 
     runtime_id: str = field(init=False, default_factory=runtime_id)
+    thread_id: int = field(
+        init=False, repr=False, compare=False, default_factory=get_ident
+    )
+    # child traces share the anchor of their parent
+    clock: ClockAnchor = field(
+        init=False, repr=False, compare=False, default_factory=clock_anchor
+    )
     _token: Token = field(init=False, repr=False)
+    skip_publish: bool = field(init=False, repr=False, default=False)
+    extras_budget: ExtrasBudget = field(
+        init=False, repr=False, compare=False, default_factory=ExtrasBudget
+    )
+    _debug_records: deque[
+        tuple[LogSpan, logging.LogRecord, FormatRecord]
+    ] | None = field(init=False, repr=False, compare=False, default=None)
+    _done: bool = field(init=False, repr=False, compare=False, default=False)
+    # id(span) -> profiler running until the span exits
+    _profilers: dict[int, Profile] | None = field(
+        init=False, repr=False, compare=False, default=None
+    )
+    _lock: Lock = field(init=False, repr=False, compare=False, default_factory=Lock)
 
     @cached_property
     def root_span(self):
@@ -56,6 +116,10 @@ class LogTrace:
         task_id = self.trace_id
         state[task_id] = self
         self.span_name = self.span_name or task_id
+        if self.parent_trace:
+            self.clock = self.parent_trace.clock
+        if _debug_buffer_size:
+            self.enable_debug_buffer(_debug_buffer_size)
         self._token = _trace_id.set(task_id)
         kwargs = self.span_kwargs
         span = self.add_span(self.span_name, kwargs)
@@ -72,6 +136,8 @@ class LogTrace:
         # should be the only entry-point for creating an span
         # should ensure this task thread/task matches this span, and add the
         # reference if it is relevant
+        if debug_buffer_size := kwargs.get(DEBUG_BUFFER_SIZE):
+            self.enable_debug_buffer(debug_buffer_size)
         now_runtime_id = runtime_id()
         if now_runtime_id != self.runtime_id:
             trace_id = next_trace_id()
@@ -83,16 +149,83 @@ class LogTrace:
             child_index: str = f"{span_index}/{span.next_child_index()}"
         else:
             child_index = "0"
-        next_span = LogSpan(name, on_exit=self.on_span_exit_trace, **kwargs)
+        next_span = LogSpan(
+            name, on_exit=self.on_span_exit_trace, clock=self.clock, **kwargs
+        )
         self.spans[child_index] = next_span
+        if _span_listener is not None:
+            _span_listener(SPAN_STARTED, self, next_span, child_index)
+        if should_profile(name, kwargs):
+            self._start_profiler(next_span)
         return next_span
 
+    def _start_profiler(self, span: LogSpan) -> None:
+        if profiler := start_profiler():
+            if self._profilers is None:
+                self._profilers = {}
+            self._profilers[id(span)] = profiler
+
+    def enable_debug_buffer(self, size: int) -> None:
+        records = self._debug_records
+        if records is None or (records.maxlen or 0) < size:
+            self._debug_records = deque(records or (), maxlen=size)
+
+    def buffer_debug(self, record: logging.LogRecord, format: FormatRecord) -> bool:
+        """Kept unformatted and only added to the span if it fails, False when not buffering"""
+        if (records := self._debug_records) is None:
+            return False
+        records.append((self.current_span, record, format))
+        return True
+
+    def _attach_debug_records(self, failed_span: LogSpan | None) -> None:
+        """failed_span=None attaches all buffered records to their spans"""
+        records = self._debug_records
+        if not records:
+            return
+        remaining: deque = deque(maxlen=records.maxlen)
+        for span, record, format in records:
+            if failed_span is not None and span is not failed_span:
+                remaining.append((span, record, format))
+                continue
+            try:
+                text = format(record)
+            except Exception as e:
+                text = f"failed to format debug record: {e!r}"
+            span.add_log(record.levelname, text)
+        self._debug_records = remaining
+
     def on_span_exit_trace(self, span: LogSpan, error: ErrorTuple | None) -> None:
+        if span.status == STATUS_INTERRUPTED:
+            self._on_interrupted_exit(span)
+            return
+        if self._profilers and (profiler := self._profilers.pop(id(span), None)):
+            self._add_profile(span, profiler)
+        if _stack_sampler is not None:
+            _stack_sampler(span)
+        if _span_listener is not None:
+            _span_listener(SPAN_ENDED, self, span, "")
+        if error and self._debug_records:
+            self._attach_debug_records(None if span is self.root_span else span)
         if span is self.root_span:
             if error:
                 logger.exception(error[1])
             self._root_done()
 
+    @staticmethod
+    def _add_profile(span: LogSpan, profiler: Profile) -> None:
+        # the profiler is always stopped, a failure never skips the other exit hooks
+        try:
+            span.add_profile(stop_profiler(profiler))
+        except Exception as e:
+            logger.exception(e)
+
+    def _on_interrupted_exit(self, span: LogSpan) -> None:
+        """The trace is already published, only the per-span state is cleaned up"""
+        if self._profilers and (profiler := self._profilers.pop(id(span), None)):
+            stop_profiler(profiler)
+        if _span_listener is not None:
+            _span_listener(SPAN_ENDED, self, span, "")
+
     def handle_error(
         self,
         error_tuple: ErrorTuple,
@@ -101,29 +234,54 @@ class LogTrace:
         caller_lineno: int,
         call_trace: str,
     ) -> None:
-        trace = Traceback.extract(*error_tuple, show_locals=True)
         if caller_path == __file__ and caller_name == "on_span_exit_trace":
             # called from logger.exception above
-            self.root_span.add_exit_trace(trace, call_trace)
+            self.root_span.add_exit_trace(extract_trace(error_tuple), call_trace)
             return
-        except_frame = Frame(
-            filename=caller_path,
-            lineno=caller_lineno,
-            name=caller_name,
-        )
-        trace_stack = trace.stacks[0]
-        # raise location, call location
-        trace_stack.frames = [trace_stack.frames[-1], except_frame]
+        trace = extract_trace(error_tuple, (caller_path, caller_lineno, caller_name))
         self.current_span.add_except_trace(trace, call_trace)
 
+    def prune_trace_child(self, span: LogSpan, child_id: str) -> bool:
+        """Returns False when the trace is done and the child link must be kept"""
+        with self._lock:
+            if self._done:
+                return False
+            span.remove_trace_child(child_id)
+            return True
+
+    def link_trace_child(self, span: LogSpan, child_id: str) -> bool:
+        with self._lock:
+            if self._done:
+                return False
+            span.add_trace_child(child_id)
+            return True
+
+    def interrupt(self) -> None:
+        """Publishes a trace that is still running with its running spans interrupted"""
+        # a copy, the trace thread can still be adding spans
+        for span in list(self.spans.values()):
+            if span.is_running:
+                span.interrupt()
+        self._root_done()
+
     def _root_done(self):
+        with self._lock:
+            if self._done:
+                return
+            self._done = True
+        self._debug_records = None
         try:
-            _trace_publisher(self)
+            if not self.skip_publish:
+                _trace_publisher(self)
+                if _span_listener is not None:
+                    _span_listener(TRACE_DONE, self, self.root_span, "")
         except BaseException as e:
             logger.exception(e)
         finally:
-            state.pop(self.trace_id)
-            _trace_id.reset(self._token)
+            state.pop(self.trace_id, None)
+            # a PendingTrace can be started inside an asyncio task context
+            with suppress(ValueError):
+                _trace_id.reset(self._token)
 
     @property
     def current_span(self) -> LogSpan:
@@ -136,19 +294,78 @@ class LogTrace:
         )
 
 
-state: dict[str, LogTrace] = {}
-counter = itertools.count().__next__
+@dataclass
+class PendingTrace:
+    """
+    Child trace of a thread target or submitted function.
+    The LogTrace is only created if the function logs, opens a span or fails.
+    Otherwise, the trace_child link is pruned from the parent span.
+    """
+
+    span_name: str
+    span_kwargs: dict[str, Any]
+    trace_id: str
+    parent_trace: LogTrace | None = None
+    parent_span: LogSpan | None = None
+    trace: LogTrace | None = field(init=False, default=None)
+    ns_start: int = field(init=False, default=0)
+
+    def start(self) -> LogTrace:
+        if (trace := self.trace) is None:
+            trace = self.trace = LogTrace(
+                self.span_name,
+                span_kwargs=self.span_kwargs,
+                parent_trace=self.parent_trace,
+                trace_id=self.trace_id,
+            )
+            trace.__enter__().set_start_ns(self.ns_start)
+        return trace
+
+    def finish(self, error: ErrorTuple | None = None) -> None:
+        if self.trace is None and error is None:
+            parent, parent_span = self.parent_trace, self.parent_span
+            if parent is None or parent_span is None:
+                return
+            if parent.prune_trace_child(parent_span, self.trace_id):
+                return
+            # parent is already published and waiting for this child
+        self._exit(self.start(), error)
+
+    @staticmethod
+    def _exit(trace: LogTrace, error: ErrorTuple | None) -> None:
+        if error:
+            trace.__exit__(*error)
+        else:
+            trace.__exit__(None, None, None)
+
+    def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        self.ns_start = perf_counter_ns()
+        token = _pending_trace.set(self)
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self.finish((type(e), e, e.__traceback__))
+            raise
+        else:
+            self.finish()
+            return result
+        finally:
+            _pending_trace.reset(token)
+
+
+state: TraceRegistry[LogTrace] = TraceRegistry()
 _trace_id: ContextVar[str] = ContextVar(f"{__name__}.trace_id")
 _main_thread_token = _trace_id.set(next_trace_id())
+_pending_trace: ContextVar[PendingTrace | None] = ContextVar(
+    f"{__name__}.pending_trace", default=None
+)
 
 
-def current_trace_or_none() -> LogTrace | None:
-    try:
-        task_id = _trace_id.get()
-    except LookupError:
-        return None
-    if task := state.get(task_id):
+def current_trace_or_none(start_pending: bool = True) -> LogTrace | None:
+    if (task_id := _trace_id.get(None)) and (task := state.get(task_id)):
         return task
+    if start_pending and (pending := _pending_trace.get()):
+        return pending.start()
     return None
 
 
@@ -159,15 +376,53 @@ def current_span_or_none() -> LogSpan | None:
 
 
 def get_trace_state() -> dict[str, LogTrace]:
-    return state
+    return state.snapshot()
 
 
 def clear_trace_state():
-    global counter, _main_thread_token
+    global _main_thread_token
     state.clear()
-    counter = itertools.count().__next__
     _trace_id.reset(_main_thread_token)
-    _main_thread_token = _trace_id.set(f"t-{counter()}")
+    _main_thread_token = _trace_id.set(next_trace_id())
+
+
+_debug_buffer_size = 0
+
+
+def set_debug_buffer_size(size: int) -> int:
+    """Buffer up to `size` records below the handler's event level in every new trace"""
+    global _debug_buffer_size
+    old = _debug_buffer_size
+    _debug_buffer_size = size
+    return old
+
+
+def get_debug_buffer_size() -> int:
+    return _debug_buffer_size
+
+
+_span_listener: SpanListener | None = None
+
+
+def set_span_listener(listener: SpanListener | None) -> SpanListener | None:
+    """Called on the thread of the span, must be fast and never raise"""
+    global _span_listener
+    old = _span_listener
+    _span_listener = listener
+    return old
+
+
+# called with every span that exits, see span_tree.stack_sampler
+_stack_sampler: Callable[[LogSpan], Any] | None = None
+
+
+def set_stack_sampler(
+    on_span_done: Callable[[LogSpan], Any] | None
+) -> Callable[[LogSpan], Any] | None:
+    global _stack_sampler
+    old = _stack_sampler
+    _stack_sampler = on_span_done
+    return old
 
 
 def default_trace_publisher(trace: LogTrace):
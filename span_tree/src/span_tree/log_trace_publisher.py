@@ -10,8 +10,11 @@ from rich.console import Console
 from rich.tree import Tree
 from zero_3rdparty.closable_queue import ClosableQueue
 
+from span_tree.coalesce import TraceCoalescer
 from span_tree.handler import skip_wrap
+from span_tree.lifecycle import StopPublishing, register_stop, unregister_sink
 from span_tree.log_trace import LogTrace
+from span_tree.ref_index import RefIndex
 from span_tree.rich_rendering import HasParentTraceError, create_rich_trace
 
 logger = logging.getLogger(__name__)
@@ -19,14 +22,24 @@ _flush = object()
 
 
 def trace_publisher(  # noqa: C901
-    console: Console | None = None, flush_interval_seconds: float = 1
-) -> tuple[Callable[[LogTrace], None], Callable[[], None]]:
+    console: Console | None = None,
+    flush_interval_seconds: float = 1,
+    refs: RefIndex | None = None,
+    coalesce_window_seconds: float = 0,
+) -> tuple[Callable[[LogTrace], None], StopPublishing]:
     """
     Returns: publish, stop_publishing
     ## Print to console when
     1. All children are printed
     2. Timeout waiting for children
+    refs: ref_src/ref_dest nodes link to the span on the other side
+    coalesce_window_seconds: when > 0 identical successful traces in the window are
+    printed once followed by a "×N p50/max" line
     """
+    refs = RefIndex() if refs is None else refs
+    coalescer = (
+        TraceCoalescer(coalesce_window_seconds) if coalesce_window_seconds > 0 else None
+    )
     queue: ClosableQueue[LogTrace | object] = ClosableQueue()
     console = console or get_console()
     traces: dict[str, LogTrace] = {}
@@ -42,7 +55,7 @@ def trace_publisher(  # noqa: C901
     def force_print(trace_id: str):
         logger.warning(f"force printing trace: {trace_id}")
         trace = traces[trace_id]
-        rich_trace, trace_ids = create_rich_trace(trace, traces.get)
+        rich_trace, trace_ids = create_rich_trace(trace, traces.get, refs=refs)
         console_print_trace(trace_ids, rich_trace)
 
     def flush_pending(threshold: float):
@@ -56,7 +69,7 @@ def trace_publisher(  # noqa: C901
     def attempt_print(trace: LogTrace):
         try:
             rich_trace, trace_ids = create_rich_trace(
-                trace, traces.__getitem__, raise_on_has_parent=True
+                trace, traces.__getitem__, raise_on_has_parent=True, refs=refs
             )
             console_print_trace(trace_ids, rich_trace)
         except (KeyError, HasParentTraceError) as e:
@@ -68,14 +81,24 @@ def trace_publisher(  # noqa: C901
                     attempt_print(parent)
             return None
 
+    def print_coalesced(force: bool = False) -> None:
+        if coalescer:
+            for summary in coalescer.flush(force):
+                console.print(summary)
+
     def consume_traces() -> None:
         logger.info("trace_consumer start")
         for trace in queue:  # type: ignore
             if trace is _flush:
                 flush_pending(monotonic() - flush_interval_seconds)
+                print_coalesced()
+                continue
+            refs.add_trace(trace)  # type: ignore
+            if coalescer and not coalescer.add(trace):  # type: ignore
                 continue
             attempt_print(trace)
         flush_pending(monotonic())
+        print_coalesced(force=True)
         logger.warning("trace_consumer done")
 
     flush_done: Future[bool] = Future()
@@ -93,9 +116,12 @@ def trace_publisher(  # noqa: C901
         queue.close()
         logger.info("flusher done")
 
-    def stop_publishing() -> None:
+    def stop_publishing(timeout: float | None = None) -> bool:
+        unregister_sink(sink)
         if not flush_done.done():
             flush_done.set_result(True)
+        t_consumer.join(timeout)
+        return not t_consumer.is_alive()
 
     skip_wrap(flush_on_interval)
     skip_wrap(consume_traces)
@@ -103,5 +129,6 @@ def trace_publisher(  # noqa: C901
     t_consumer.start()
     t_flusher = Thread(target=flush_on_interval)
     t_flusher.start()
+    sink = register_stop("trace_publisher", stop_publishing, queue.qsize)
 
     return queue.put_nowait, stop_publishing
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from span_tree.lifecycle import StopPublishing
+from span_tree.log_span import LogSpan
+from span_tree.log_trace import LogTrace
+from span_tree.sink_worker import SinkWorker
+
+DEFAULT_BUCKETS_SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels: str) -> str:
+    inner = ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels.items())
+    return f"{{{inner}}}"
+
+
+@dataclass
+class _Histogram:
+    bucket_counts: list[int]
+    count: int = 0
+    total: float = 0.0
+
+
+@dataclass
+class SpanMetrics:
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS_SECONDS
+    prefix: str = "span_tree"
+    counts: dict[tuple[str, str], int] = field(default_factory=dict)
+    durations: dict[str, _Histogram] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.buckets = tuple(sorted(self.buckets))
+
+    def add_trace(self, trace: LogTrace) -> None:
+        for span in trace.spans.values():
+            self.add_span(span)
+
+    def add_span(self, span: LogSpan) -> None:
+        if not span.is_done:
+            return
+        name = span.name
+        key = (name, span.status)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        histogram = self.durations.get(name)
+        if histogram is None:
+            histogram = self.durations[name] = _Histogram([0] * (len(self.buckets) + 1))
+        seconds = span.duration_ns / 1e9
+        histogram.bucket_counts[bisect_left(self.buckets, seconds)] += 1
+        histogram.count += 1
+        histogram.total += seconds
+
+    def dump(self) -> str:
+        prefix = self.prefix
+        lines = [
+            f"# HELP {prefix}_spans_total Finished spans by name and status.",
+            f"# TYPE {prefix}_spans_total counter",
+        ]
+        for (name, status), count in sorted(self.counts.items()):
+            lines.append(
+                f"{prefix}_spans_total{_labels(span_name=name, status=status)} {count}"
+            )
+        metric = f"{prefix}_span_duration_seconds"
+        lines.extend(
+            [
+                f"# HELP {metric} Duration of finished spans.",
+                f"# TYPE {metric} histogram",
+            ]
+        )
+        for name, histogram in sorted(self.durations.items()):
+            cumulative = 0
+            for le, bucket_count in zip(
+                [*(f"{b:g}" for b in self.buckets), "+Inf"], histogram.bucket_counts
+            ):
+                cumulative += bucket_count
+                lines.append(
+                    f"{metric}_bucket{_labels(span_name=name, le=le)} {cumulative}"
+                )
+            name_label = _labels(span_name=name)
+            lines.append(f"{metric}_sum{name_label} {histogram.total!r}")
+            lines.append(f"{metric}_count{name_label} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _current_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# read once, os.umask can only be read by setting it
+_UMASK = _current_umask()
+
+
+def write_atomic(path: Path, text: str) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        # mkstemp creates 0600, scrapers running as another user must read the file
+        os.chmod(tmp_path, 0o644 & ~_UMASK)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def metrics_file_publisher(
+    path: str | Path,
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS_SECONDS,
+    write_interval_seconds: float = 15,
+    prefix: str = "span_tree",
+) -> tuple[Callable[[LogTrace], None], StopPublishing]:
+    """
+    Returns: publish, stop_publishing
+    Spans are aggregated as traces arrive on the worker thread and the file is
+    rewritten (write to temp + rename) on every interval with new spans.
+    Use a `.prom` path in the node-exporter textfile collector directory.
+    """
+    path = Path(path)
+    metrics = SpanMetrics(buckets=buckets, prefix=prefix)
+    dirty = True
+
+    def add_traces(traces: list[LogTrace]) -> None:
+        nonlocal dirty
+        for trace in traces:
+            metrics.add_trace(trace)
+        dirty = True
+
+    def write_metrics() -> None:
+        nonlocal dirty
+        if dirty:
+            dirty = False
+            write_atomic(path, metrics.dump())
+
+    worker = SinkWorker(
+        "metrics-file",
+        add_traces,
+        on_interval=write_metrics,
+        interval_seconds=write_interval_seconds,
+    )
+
+    def stop_publishing(timeout: float | None = None) -> bool:
+        return worker.stop(timeout)
+
+    return worker.put, stop_publishing
@@ -0,0 +1,312 @@
+"""
+Traces as OpenTelemetry OTLP/JSON `resourceSpans`, one export request per line.
+The files can be loaded by the collector's `otlpjsonfile` receiver or any tool
+reading OTLP/JSON, no collector or network is needed while exporting.
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+from hashlib import blake2b
+from pathlib import Path
+from typing import IO, Any, Callable, Iterable
+
+from span_tree.constants import STATUS_FAILED, STATUS_SUCCEEDED
+from span_tree.extras import resolve, safe_repr
+from span_tree.lifecycle import StopPublishing
+from span_tree.log_span import (
+    NODE_TYPE_CONTEXT,
+    NODE_TYPE_EXCEPT_ERROR,
+    NODE_TYPE_TREE_CHILD,
+    NODE_TYPE_TREE_PARENT,
+    LogSpan,
+)
+from span_tree.log_trace import LogTrace
+from span_tree.sink_worker import SinkWorker
+from span_tree.trace_store import ERROR_NODE_TYPES, error_type
+
+SCOPE = {"name": "span_tree"}
+SPAN_KIND_INTERNAL = 1
+STATUS_CODE_UNSET = 0
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+_STATUS_CODES = {STATUS_SUCCEEDED: STATUS_CODE_OK, STATUS_FAILED: STATUS_CODE_ERROR}
+_LOG_EVENTS = {"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"}
+MAX_VALUE_LENGTH = 4096
+# raises instead of writing NaN/Infinity tokens
+_dumps = json.JSONEncoder(
+    separators=(",", ":"), ensure_ascii=False, allow_nan=False
+).encode
+
+
+def otlp_trace_id(trace_id: str) -> str:
+    return blake2b(trace_id.encode(), digest_size=16).hexdigest()
+
+
+def otlp_span_id(trace_id: str, span_path: str) -> str:
+    return blake2b(f"{trace_id}/{span_path}".encode(), digest_size=8).hexdigest()
+
+
+def _double_value(value: float) -> dict[str, Any]:
+    if math.isfinite(value):
+        return {"doubleValue": value}
+    # NaN/Infinity are not json
+    return {"stringValue": str(value)}
+
+
+_SCALAR_VALUES: dict[type, Callable[[Any], dict[str, Any]]] = {
+    str: lambda value: {"stringValue": value[:MAX_VALUE_LENGTH]},
+    bool: lambda value: {"boolValue": value},
+    int: lambda value: {"intValue": str(value)},
+    float: _double_value,
+}
+
+
+def any_value(value: Any) -> dict[str, Any]:
+    # exact type lookup, subclasses and Deferred/LazyRepr take the slow path
+    if scalar := _SCALAR_VALUES.get(type(value)):
+        return scalar(value)
+    value = resolve(value)
+    if scalar := _SCALAR_VALUES.get(type(value)):
+        return scalar(value)
+    return {"stringValue": safe_repr(value, MAX_VALUE_LENGTH)}
+
+
+def attributes(values: dict[str, Any]) -> list[dict[str, Any]]:
+    return [{"key": key, "value": any_value(value)} for key, value in values.items()]
+
+
+def _wall_ns(span: LogSpan, ns: int) -> str:
+    clock = span.clock
+    return str(int(clock.wall * 1e9) + ns - clock.ns)
+
+
+def _stacktrace(error: Any) -> tuple[str, str]:
+    """Returns: message, stacktrace from a rich Trace or a formatted traceback"""
+    if isinstance(error, str):
+        last_line = error.rstrip().rsplit("\n", 1)[-1]
+        return last_line.partition(":")[2].strip(), error
+    lines = []
+    for stack in reversed(error.stacks):
+        lines.append("Traceback (most recent call last):")
+        lines.extend(
+            f'  File "{frame.filename}", line {frame.lineno}, in {frame.name}'
+            for frame in stack.frames
+        )
+        lines.append(f"{stack.exc_type}: {stack.exc_value}")
+    return error.stacks[0].exc_value, "\n".join(lines)
+
+
+def _event(name: str, time: str, values: dict[str, Any]) -> dict[str, Any]:
+    return {"timeUnixNano": time, "name": name, "attributes": attributes(values)}
+
+
+def _span_events(events: list[tuple[str, Any]], time: str) -> Iterable[dict[str, Any]]:
+    """LogSpan events have no timestamps, they keep their order at the span start"""
+    exception: dict[str, Any] | None = None
+    for event_type, value in events:
+        if event_type in _LOG_EVENTS:
+            yield _event("log", time, {"log.severity": event_type, "message": value})
+        elif event_type in ERROR_NODE_TYPES:
+            message, stacktrace = _stacktrace(value)
+            exception = _event(
+                "exception",
+                time,
+                {
+                    "exception.type": error_type(value),
+                    "exception.message": message,
+                    "exception.stacktrace": stacktrace,
+                    "exception.escaped": event_type != NODE_TYPE_EXCEPT_ERROR,
+                },
+            )
+            yield exception
+        elif event_type == "call_trace" and exception is not None:
+            exception["attributes"].extend(attributes({"span_tree.call_trace": value}))
+        elif event_type in ("extra", NODE_TYPE_CONTEXT):
+            yield _event(event_type, time, value)
+        elif event_type not in (NODE_TYPE_TREE_CHILD, NODE_TYPE_TREE_PARENT):
+            yield _event(event_type, time, {"value": value})
+
+
+def _parent_span_path(trace: LogTrace) -> str:
+    """Path of the span in the parent trace that started this trace"""
+    if parent := trace.parent_trace:
+        child_id = trace.trace_id
+        for path, span in parent.spans.items():
+            for event_type, value in span.events:
+                if event_type == NODE_TYPE_TREE_CHILD and value["id"] == child_id:
+                    return path
+    return "0"
+
+
+def _span_links(trace: LogTrace, events: list[tuple[str, Any]]) -> list[dict[str, Any]]:
+    links = []
+    for event_type, value in events:
+        if event_type == NODE_TYPE_TREE_CHILD:
+            linked_trace, linked_path = value["id"], "0"
+        elif event_type == NODE_TYPE_TREE_PARENT:
+            linked_trace, linked_path = value["trace_id"], _parent_span_path(trace)
+        else:
+            continue
+        links.append(
+            {
+                "traceId": otlp_trace_id(linked_trace),
+                "spanId": otlp_span_id(linked_trace, linked_path),
+                "attributes": attributes({"span_tree.link": event_type}),
+            }
+        )
+    return links
+
+
+def otlp_spans(trace: LogTrace) -> Iterable[dict[str, Any]]:
+    trace_id = trace.trace_id
+    otlp_id = otlp_trace_id(trace_id)
+    # shared by the spans, only read by the json encoder
+    trace_attributes = attributes(
+        {"span_tree.trace_id": trace_id, "thread.name": trace.runtime_id}
+    )
+    for path, span in trace.spans.items():
+        if not span.is_done:
+            continue
+        parent_path = path.rpartition("/")[0]
+        start = _wall_ns(span, span.start_ns)
+        status = span.status
+        events = span.events
+        yield {
+            "traceId": otlp_id,
+            "spanId": otlp_span_id(trace_id, path),
+            "parentSpanId": otlp_span_id(trace_id, parent_path) if parent_path else "",
+            "name": span.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": start,
+            "endTimeUnixNano": _wall_ns(span, span.end_ns),
+            "attributes": trace_attributes
+            + attributes(
+                {
+                    "span_tree.span_path": path,
+                    "span_tree.status": status,
+                    "span_tree.call_location": span.call_location,
+                }
+            ),
+            "events": list(_span_events(events, start)),
+            "links": _span_links(trace, events),
+            "status": {"code": _STATUS_CODES.get(status, STATUS_CODE_UNSET)},
+        }
+
+
+def export_request(
+    traces: Iterable[LogTrace], resource: dict[str, Any]
+) -> dict[str, Any]:
+    """An OTLP ExportTraceServiceRequest with all spans in one resource and scope"""
+    spans = [span for trace in traces for span in otlp_spans(trace)]
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": attributes(resource)},
+                "scopeSpans": [{"scope": SCOPE, "spans": spans}],
+            }
+        ]
+    }
+
+
+def encode_request(
+    traces: Iterable[LogTrace], resource: dict[str, Any]
+) -> Iterable[str]:
+    """
+    Same json as `export_request`, each span is encoded on its own so a batch never
+    keeps all its span dicts alive (less work for the garbage collector).
+    """
+    resource_json = _dumps({"attributes": attributes(resource)})
+    yield (
+        f'{{"resourceSpans":[{{"resource":{resource_json},'
+        f'"scopeSpans":[{{"scope":{_dumps(SCOPE)},"spans":['
+    )
+    separator = ""
+    for trace in traces:
+        for span in otlp_spans(trace):
+            yield separator
+            yield _dumps(span)
+            separator = ","
+    yield "]}]}]}"
+
+
+class RotatingFile:
+    """Appends lines, `path` is renamed to `path.1` (`path.1` to `path.2`, ...) when it exceeds max_bytes"""
+
+    def __init__(self, path: str | Path, max_bytes: int, backup_count: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._file: IO[str] = self._open()
+
+    def _open(self) -> IO[str]:
+        return self.path.open("a", encoding="utf-8")
+
+    def write_line(self, chunks: Iterable[str]) -> None:
+        """A chunk failing to encode truncates the file back to the previous line"""
+        file = self._file
+        start = file.tell()
+        try:
+            file.writelines(chunks)
+            file.write("\n")
+        except BaseException:
+            file.truncate(start)
+            file.seek(start)
+            raise
+        if file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self) -> None:
+        self._file.close()
+        for number in range(self.backup_count - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{number}")
+            if source.exists():
+                os.replace(
+                    source, self.path.with_name(f"{self.path.name}.{number + 1}")
+                )
+        if self.backup_count:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+        self._file = self._open()
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def otlp_file_publisher(
+    path: str | Path,
+    service_name: str = "span_tree",
+    max_bytes: int = 100_000_000,
+    backup_count: int = 5,
+    max_batch_size: int = 1000,
+    flush_interval_seconds: float = 1,
+) -> tuple[Callable[[LogTrace], None], StopPublishing]:
+    """
+    Returns: publish, stop_publishing
+    Every batch of traces is one OTLP/JSON line in `path`, rotated at max_bytes.
+    """
+    resource = {"service.name": service_name, "process.pid": os.getpid()}
+    file = RotatingFile(path, max_bytes, backup_count)
+
+    def write_batch(traces: list[LogTrace]) -> None:
+        file.write_line(encode_request(traces, resource))
+
+    worker = SinkWorker(
+        "otlp_json",
+        write_batch,
+        on_interval=file.flush,
+        interval_seconds=flush_interval_seconds,
+        max_batch_size=max_batch_size,
+    )
+
+    def stop_publishing(timeout: float | None = None) -> bool:
+        if flushed := worker.stop(timeout):
+            file.close()
+        return flushed
+
+    return worker.put, stop_publishing
@@ -0,0 +1,148 @@
+"""
+Deterministic profiling (cProfile) of chosen spans, only while the span is open.
+`logger("slow", profile=True)` or `set_profile_settings(ProfileSettings({"slow"}))`
+add a `profile` event with the top functions when the span exits.
+Python 3.12+ cProfile uses the process wide sys.monitoring, only one span is
+profiled at a time and spans started meanwhile (on any thread) are not profiled.
+"""
+from __future__ import annotations
+
+import logging
+import sys
+from dataclasses import dataclass, field
+from operator import attrgetter
+from pathlib import PurePath
+from random import random
+from threading import get_ident
+from typing import TYPE_CHECKING, Any, Literal
+
+from span_tree.constants import PROFILE
+
+if TYPE_CHECKING:
+    from cProfile import Profile
+
+logger = logging.getLogger(__name__)
+SortBy = Literal["tottime", "cumtime", "calls"]
+
+
+@dataclass(frozen=True)
+class ProfileSettings:
+    span_names: frozenset[str] = frozenset()
+    # fraction of all other spans that are profiled
+    sample_rate: float = 0.0
+    top_n: int = 20
+    sort_by: SortBy = "tottime"
+
+
+_settings = ProfileSettings()
+
+
+def set_profile_settings(settings: ProfileSettings) -> ProfileSettings:
+    global _settings
+    old = _settings
+    _settings = settings
+    return old
+
+
+@dataclass
+class ProfileRow:
+    function: str
+    calls: int
+    primitive_calls: int
+    tottime: float
+    cumtime: float
+
+
+@dataclass
+class SpanProfile:
+    total_calls: int
+    total_seconds: float
+    sort_by: SortBy
+    rows: list[ProfileRow] = field(default_factory=list)
+
+    def __repr__(self) -> str:
+        lines = [
+            f"{self.total_calls} calls {self.total_seconds * 1000:.3f}ms,"
+            f" top {len(self.rows)} by {self.sort_by}:"
+        ]
+        lines.extend(
+            f"  {row.tottime * 1000:9.3f}ms self {row.cumtime * 1000:9.3f}ms cum"
+            f" {row.calls:>7} {row.function}"
+            for row in self.rows
+        )
+        return "\n".join(lines)
+
+
+def should_profile(name: str, kwargs: dict[str, Any]) -> bool:
+    if kwargs.get(PROFILE):
+        return True
+    settings = _settings
+    if name in settings.span_names:
+        return True
+    return settings.sample_rate > 0 and random() < settings.sample_rate
+
+
+# thread -> profiler of the outermost profiled span, nested spans are covered by it
+_active: dict[int, Profile] = {}
+_ONE_PROFILER = sys.version_info >= (3, 12)
+
+
+def start_profiler() -> Profile | None:
+    """None if the thread is already profiled or another profiler is active"""
+    thread = get_ident()
+    if thread in _active or (_ONE_PROFILER and _active):
+        return None
+    from cProfile import Profile
+
+    profiler = Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # another profiling tool, e.g., a debugger or coverage on python 3.12+
+        logger.debug(f"span profiler not started: {e}")
+        return None
+    _active[thread] = profiler
+    return profiler
+
+
+def stop_profiler(profiler: Profile) -> SpanProfile:
+    try:
+        profiler.disable()
+    finally:
+        for thread, active in list(_active.items()):
+            if active is profiler:
+                del _active[thread]
+    settings = _settings
+    return span_profile(profiler, settings.top_n, settings.sort_by)
+
+
+def _function_label(filename: str, lineno: int, function: str) -> str:
+    if filename == "~":
+        # built-in
+        return function
+    short_name = "/".join(PurePath(filename).parts[-2:])
+    return f"{short_name}:{lineno}({function})"
+
+
+def span_profile(profiler: Profile, top_n: int, sort_by: SortBy) -> SpanProfile:
+    profiler.create_stats()
+    stats: dict[tuple[str, int, str], tuple] = profiler.stats  # type: ignore
+    total_calls, total_seconds = 0, 0.0
+    rows = []
+    for key, (primitive, calls, tottime, cumtime, _) in stats.items():
+        filename, lineno, function = key
+        total_calls += calls
+        total_seconds += tottime
+        if function == "<method 'disable' of '_lsprof.Profiler' objects>":
+            continue
+        rows.append(
+            ProfileRow(
+                _function_label(filename, lineno, function),
+                calls,
+                primitive,
+                tottime,
+                cumtime,
+            )
+        )
+    rows.sort(key=attrgetter(sort_by), reverse=True)
+    return SpanProfile(total_calls, total_seconds, sort_by, rows[:top_n])
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from threading import Lock
+from time import monotonic
+from typing import NamedTuple
+
+from span_tree.log_span import LogSpan
+from span_tree.log_trace import LogTrace
+
+
+class RefEnd(NamedTuple):
+    trace_id: str
+    span_path: str
+
+
+@dataclass
+class RefLink:
+    ref: str
+    first_seen: float
+    src: RefEnd | None = None
+    dests: list[RefEnd] = field(default_factory=list)
+
+    @property
+    def is_matched(self) -> bool:
+        return self.src is not None and bool(self.dests)
+
+
+@dataclass
+class RefIndex:
+    """
+    ref id -> the span that created it (ref_src) and the spans that used it (ref_dest).
+    Unmatched refs expire after ttl_seconds, the oldest refs are dropped above max_refs.
+    """
+
+    max_refs: int = 100_000
+    ttl_seconds: float = 300
+
+    _links: dict[str, RefLink] = field(init=False, default_factory=dict)
+    _unmatched: dict[str, RefLink] = field(init=False, default_factory=dict)
+    _lock: Lock = field(init=False, default_factory=Lock)
+
+    def __len__(self) -> int:
+        return len(self._links)
+
+    def get(self, ref: str) -> RefLink | None:
+        return self._links.get(ref)
+
+    def add_trace(self, trace: LogTrace) -> None:
+        now = monotonic()
+        trace_id = trace.trace_id
+        span: LogSpan
+        with self._lock:
+            for span_path, span in trace.spans.items():
+                end = RefEnd(trace_id, span_path)
+                for ref in span.refs_src:
+                    self._link(ref, now).src = end
+                    self._update_matched(ref)
+                for ref in span.refs_dest:
+                    link = self._link(ref, now)
+                    if end not in link.dests:
+                        link.dests.append(end)
+                    self._update_matched(ref)
+            self._expire(now)
+
+    def _link(self, ref: str, now: float) -> RefLink:
+        if link := self._links.get(ref):
+            return link
+        link = self._links[ref] = self._unmatched[ref] = RefLink(ref, now)
+        return link
+
+    def _update_matched(self, ref: str) -> None:
+        if self._links[ref].is_matched:
+            self._unmatched.pop(ref, None)
+
+    def _expire(self, now: float) -> None:
+        expired_ts = now - self.ttl_seconds
+        unmatched = self._unmatched
+        while unmatched:
+            ref, link = next(iter(unmatched.items()))
+            if link.first_seen > expired_ts:
+                break
+            del unmatched[ref]
+            del self._links[ref]
+        links = self._links
+        while len(links) > self.max_refs:
+            ref = next(iter(links))
+            del links[ref]
+            unmatched.pop(ref, None)
+
+    def expire(self) -> None:
+        with self._lock:
+            self._expire(monotonic())
@@ -7,12 +7,16 @@ from rich.tree import Tree
 from typing_extensions import TypeAlias
 from zero_3rdparty.datetime_utils import dump_date_as_rfc3339
 
+from span_tree.error_fingerprint import error_fingerprint, get_error_fingerprints
 from span_tree.log_span import (
     NODE_TYPE_EXIT_ERROR,
+    NODE_TYPE_REF_DEST,
+    NODE_TYPE_REF_SRC,
     as_trace_child_id,
     as_trace_parent_id,
 )
 from span_tree.log_trace import LogTrace
+from span_tree.ref_index import RefIndex, RefLink
 
 MAX_FRAMES_ERROR = 5
 
@@ -53,6 +57,7 @@ def create_rich_trace(
     log_trace: LogTrace,
     reader: ReadTrace,
     raise_on_has_parent: bool = False,
+    refs: RefIndex | None = None,
 ) -> tuple[Tree, set[str]]:
     root_trace_id = log_trace.trace_id
     ids = {root_trace_id}
@@ -66,12 +71,29 @@ def create_rich_trace(
                 ids.add(child_id)
                 child_root = convert_tree(child_trace, node_adder=add_subtrace)
                 return node.add(child_root)
+        if refs and key in _REF_NODE_TYPES and (link := refs.get(value)):
+            if label := _ref_label(key, link):
+                return node.add(label)
         return _default_node_adder(node, key, value)
 
     trace = convert_tree(log_trace, node_adder=add_subtrace)
     return trace, ids
 
 
+_REF_NODE_TYPES = (NODE_TYPE_REF_SRC, NODE_TYPE_REF_DEST)
+
+
+def _ref_label(key: str, link: RefLink) -> str:
+    """links the other side of the ref, empty when it is not published yet"""
+    if key == NODE_TYPE_REF_SRC:
+        ends = ", ".join(f"{end.trace_id}[{end.span_path}]" for end in link.dests)
+        arrow = "→"
+    else:
+        ends = f"{link.src.trace_id}[{link.src.span_path}]" if link.src else ""
+        arrow = "←"
+    return f"[blue]{key}[/]={link.ref} {arrow} [cyan]{ends}[/]" if ends else ""
+
+
 def print_trace_call(render_call_locations: bool = True) -> Callable[[LogTrace], Trace]:
     def print_trace(trace: LogTrace):
         rich_trace = convert_tree(trace, render_call_locations=render_call_locations)
@@ -92,7 +114,8 @@ def _tree_and_node_adder(trace: LogTrace) -> tuple[Tree, Callable[[str, str], Tr
             span_node = root.add(header)
             setattr(span_node, _SPAN_NODE, True)
             return span_node
-        *indexes, _, __ = index_str.split("/")
+        # first index is the root span, last index is the new span
+        *indexes, _ = index_str.split("/")[1:]
         node = root.children[0]
         for level_index in indexes:
             span_children = [
@@ -113,7 +136,16 @@ def _tree_and_node_adder(trace: LogTrace) -> tuple[Tree, Callable[[str, str], Tr
 def _default_node_adder(node: Tree, key: str, value: Any) -> Tree:
     if isinstance(value, Trace):
         is_error = key.startswith(NODE_TYPE_EXIT_ERROR)
-        node_tb = node.add(key, style="red" if is_error else "yellow")
+        fingerprint, exc_type = error_fingerprint(value)
+        first, counts = get_error_fingerprints().seen(fingerprint, exc_type, value)
+        label = f"{key} {exc_type} [dim]#{fingerprint}[/]"
+        if not first:
+            # only the first occurrence in each window is rendered in full
+            seen = f"seen ×{counts.window_count} in window, ×{counts.count} total"
+            return node.add(
+                f"{label} [dim]{seen}[/]", style="red" if is_error else "yellow"
+            )
+        node_tb = node.add(label, style="red" if is_error else "yellow")
         traceback = Traceback(value, max_frames=MAX_FRAMES_ERROR, show_locals=True)
         node_tb.add(traceback)
         return node_tb
@@ -135,7 +167,7 @@ def convert_tree(
         ts = dump_date_as_rfc3339(span.timestamp, strip_microseconds=True).replace(
             "+00:00", "Z"
         )
-        span_header = f"[b {color}]{span.name} => {span.status}[/] [cyan]{ts}[/] ⧖ [blue]{span.duration_ms*1000:.3f}ms[/]"
+        span_header = f"[b {color}]{span.name} => {span.status}[/] [cyan]{ts}[/] ⧖ [blue]{span.duration_ms:.3f}ms[/]"
 
         node = add_span_node(trace_index, span_header)
         if render_call_locations:
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import logging
+from queue import Empty, SimpleQueue
+from threading import Thread
+from time import monotonic
+from typing import Any, Callable
+
+from typing_extensions import TypeAlias
+
+from span_tree.handler import skip_wrap
+from span_tree.lifecycle import register_sink, unregister_sink
+from span_tree.log_trace import LogTrace
+
+logger = logging.getLogger(__name__)
+_stop = object()
+
+HandleBatch: TypeAlias = Callable[[list[LogTrace]], Any]
+# sink name, the batch that was just handled
+BatchListener: TypeAlias = Callable[[str, list[LogTrace]], Any]
+_batch_listener: BatchListener | None = None
+
+
+def set_batch_listener(listener: BatchListener | None) -> BatchListener | None:
+    """Called on the sink thread after every batch, e.g., to measure sink latency"""
+    global _batch_listener
+    old = _batch_listener
+    _batch_listener = listener
+    return old
+
+
+class SinkWorker:
+    """
+    Runs a sink on its own daemon thread.
+    Traces are handed off with `put` and given to `handle_batch` in batches of
+    at most `max_batch_size`. `on_interval` is called every `interval_seconds`
+    and once more when the worker stops.
+    max_queue_size: when > 0, traces are dropped (and counted) while the queue is full
+    Running workers are stopped by `span_tree.lifecycle.shutdown` unless register=False.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handle_batch: HandleBatch,
+        *,
+        on_interval: Callable[[], Any] | None = None,
+        interval_seconds: float = 1,
+        max_batch_size: int = 1000,
+        max_queue_size: int = 0,
+        register: bool = True,
+    ):
+        self.name = name
+        self.handle_batch = handle_batch
+        self.on_interval = on_interval
+        self.interval_seconds = interval_seconds
+        self.max_batch_size = max_batch_size
+        self.max_queue_size = max_queue_size
+        self.traces_handled = 0
+        self.errors = 0
+        self.dropped = 0
+        self._queue: SimpleQueue[LogTrace | object] = SimpleQueue()
+        self._thread = Thread(target=self._run, name=f"sink-{name}", daemon=True)
+        self._thread.start()
+        if register:
+            register_sink(self)
+
+    def put(self, trace: LogTrace) -> None:
+        queue = self._queue
+        if self.max_queue_size and queue.qsize() >= self.max_queue_size:
+            self.dropped += 1
+            return
+        queue.put(trace)
+
+    __call__ = put
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def stop(self, timeout: float | None = None) -> bool:
+        """Returns True if all queued traces were handled before the timeout"""
+        self.request_stop()
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def request_stop(self) -> None:
+        """The traces queued before are still handled"""
+        unregister_sink(self)
+        self._queue.put(_stop)
+
+    def _next_batch(self, timeout: float) -> tuple[list[LogTrace], bool]:
+        batch: list[LogTrace] = []
+        try:
+            item = self._queue.get(timeout=timeout)
+            while True:
+                if item is _stop:
+                    return batch, True
+                batch.append(item)  # type: ignore
+                if len(batch) >= self.max_batch_size:
+                    break
+                item = self._queue.get_nowait()
+        except Empty:
+            pass
+        return batch, False
+
+    def _safe_call(self, call: Callable[..., Any], *args) -> None:
+        try:
+            call(*args)
+        except Exception as e:
+            self.errors += 1
+            logger.exception(e)
+
+    def _run(self) -> None:
+        next_interval = monotonic() + self.interval_seconds
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch(max(next_interval - monotonic(), 0))
+            if batch:
+                self._safe_call(self.handle_batch, batch)
+                self.traces_handled += len(batch)
+                if _batch_listener is not None:
+                    self._safe_call(_batch_listener, self.name, batch)
+            if self.on_interval and (stopping or monotonic() >= next_interval):
+                self._safe_call(self.on_interval)
+            if monotonic() >= next_interval:
+                next_interval = monotonic() + self.interval_seconds
+
+
+skip_wrap(SinkWorker._run)
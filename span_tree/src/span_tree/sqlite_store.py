@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Any, Callable, Iterable
+
+from span_tree.lifecycle import StopPublishing
+from span_tree.log_span import LogSpan
+from span_tree.log_trace import LogTrace
+from span_tree.sink_worker import SinkWorker
+from span_tree.trace_store import ERROR_NODE_TYPES, error_type
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spans (
+    trace_id TEXT NOT NULL,
+    span_path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    ts_start REAL NOT NULL,
+    duration_ms REAL NOT NULL,
+    error_type TEXT,
+    call_location TEXT,
+    parent_trace_id TEXT,
+    PRIMARY KEY (trace_id, span_path)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS events (
+    trace_id TEXT NOT NULL,
+    span_path TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    event_type TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (trace_id, span_path, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS spans_dashboard ON spans (name, status, ts_start);
+CREATE INDEX IF NOT EXISTS spans_status ON spans (status, ts_start);
+CREATE INDEX IF NOT EXISTS spans_ts_start ON spans (ts_start);
+CREATE INDEX IF NOT EXISTS spans_duration ON spans (duration_ms);
+"""
+_INSERT_SPAN = "INSERT OR REPLACE INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+_INSERT_EVENT = "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?)"
+# covered by the spans_dashboard index, no table lookups
+_DASHBOARD = """
+SELECT name, status, COUNT(*), MAX(ts_start) FROM spans
+GROUP BY name, status ORDER BY name, status
+"""
+_SPAN_COLUMNS = (
+    "trace_id, span_path, name, status, ts_start, duration_ms, error_type, "
+    "call_location, parent_trace_id"
+)
+
+
+@dataclass
+class DashboardRow:
+    name: str
+    status: str
+    count: int
+    last_ts: float
+
+
+@dataclass
+class SpanRow:
+    trace_id: str
+    span_path: str
+    name: str
+    status: str
+    ts_start: float
+    duration_ms: float
+    error_type: str | None
+    call_location: str | None
+    parent_trace_id: str | None
+
+
+def _event_value(event_type: str, value: Any) -> str:
+    if event_type in ERROR_NODE_TYPES:
+        return error_type(value)
+    return value if isinstance(value, str) else repr(value)
+
+
+def _span_rows(trace: LogTrace) -> Iterable[tuple[tuple, list[tuple]]]:
+    trace_id = trace.trace_id
+    parent_id = trace.parent_trace.trace_id if trace.parent_trace else None
+    span: LogSpan
+    for span_path, span in trace.spans.items():
+        if not span.is_done:
+            continue
+        events = [
+            (trace_id, span_path, position, event_type, _event_value(event_type, event))
+            for position, (event_type, event) in enumerate(span.events)
+        ]
+        first_error = next(
+            (row[-1] for row in events if row[3] in ERROR_NODE_TYPES), None
+        )
+        span_row = (
+            trace_id,
+            span_path,
+            span.name,
+            span.status,
+            span.timestamp,
+            span.duration_ms,
+            first_error,
+            span.call_location,
+            parent_id,
+        )
+        yield span_row, events
+
+
+class SqliteTraces:
+    """
+    Spans and their events in a SQLite database (WAL mode).
+    Writes are batched in one transaction per `insert` call, a trace published
+    again replaces its rows.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    def insert(self, traces: list[LogTrace]) -> None:
+        span_rows: list[tuple] = []
+        event_rows: list[tuple] = []
+        for trace in traces:
+            for span_row, events in _span_rows(trace):
+                span_rows.append(span_row)
+                event_rows.extend(events)
+        with self._lock, self._conn:
+            self._conn.executemany(_INSERT_SPAN, span_rows)
+            self._conn.executemany(_INSERT_EVENT, event_rows)
+
+    def _select(self, sql: str, params: Iterable[Any] = ()) -> list[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, tuple(params)).fetchall()
+
+    def dashboard(self) -> list[DashboardRow]:
+        return [DashboardRow(*row) for row in self._select(_DASHBOARD)]
+
+    def trace(self, trace_id: str) -> list[SpanRow]:
+        sql = f"SELECT {_SPAN_COLUMNS} FROM spans WHERE trace_id = ? ORDER BY span_path"
+        return [SpanRow(*row) for row in self._select(sql, [trace_id])]
+
+    def spans(
+        self,
+        name: str | None = None,
+        status: str | None = None,
+        min_ms: float | None = None,
+        limit: int = 100,
+    ) -> list[SpanRow]:
+        """Latest spans first, e.g., the error view `spans(status=STATUS_FAILED)`"""
+        filters = {"name = ?": name, "status = ?": status, "duration_ms >= ?": min_ms}
+        where = [sql for sql, value in filters.items() if value is not None]
+        params = [value for value in filters.values() if value is not None]
+        sql = f"SELECT {_SPAN_COLUMNS} FROM spans"
+        if where:
+            sql += f" WHERE {' AND '.join(where)}"
+        sql += " ORDER BY ts_start DESC LIMIT ?"
+        return [SpanRow(*row) for row in self._select(sql, [*params, limit])]
+
+    def events(self, trace_id: str, span_path: str = "0") -> list[tuple[str, str]]:
+        sql = (
+            "SELECT event_type, value FROM events"
+            " WHERE trace_id = ? AND span_path = ? ORDER BY position"
+        )
+        return self._select(sql, [trace_id, span_path])  # type: ignore
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def sqlite_publisher(
+    path: str | Path, max_batch_size: int = 1000
+) -> tuple[Callable[[LogTrace], None], StopPublishing]:
+    """
+    Returns: publish, stop_publishing
+    Each batch of traces from the worker thread is written in one transaction.
+    """
+    store = SqliteTraces(path)
+    worker = SinkWorker("sqlite", store.insert, max_batch_size=max_batch_size)
+
+    def stop_publishing(timeout: float | None = None) -> bool:
+        flushed = worker.stop(timeout)
+        if flushed:
+            store.close()
+        return flushed
+
+    return worker.put, stop_publishing
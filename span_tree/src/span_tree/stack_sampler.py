@@ -0,0 +1,201 @@
+"""
+Periodic stack samples of the threads that are running a span, summarized per span.
+Only the innermost running span of a thread gets the sample, a thread running more
+than one trace (asyncio tasks) is skipped as the sample cannot be attributed.
+"""
+from __future__ import annotations
+
+import logging
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import PurePath
+from threading import Event, Lock, Thread
+from types import FrameType
+
+from span_tree.handler import skip_wrap
+from span_tree.log_span import LogSpan
+from span_tree.log_trace import LogTrace, set_stack_sampler, state
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SamplerSettings:
+    interval_seconds: float = 0.01
+    max_samples_per_span: int = 1000
+    # spans with fewer samples get no summary
+    min_samples: int = 3
+    max_stack_depth: int = 64
+    # stacks in the summary, the rest are counted as `other`
+    max_stacks: int = 10
+
+
+@dataclass
+class StackSamples:
+    interval_seconds: float
+    sample_count: int
+    dropped: int
+    # collapsed stack (root first, `;` separated) -> count, most common first
+    stacks: list[tuple[str, int]]
+    other: int = 0
+
+    def collapsed(self) -> str:
+        """flamegraph.pl/speedscope collapsed format"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks)
+
+    def __repr__(self) -> str:
+        lines = [
+            f"{self.sample_count} samples every {self.interval_seconds * 1000:g}ms"
+            + (f", {self.dropped} dropped" if self.dropped else "")
+        ]
+        lines.extend(f"  {count:>5} {_tail(stack)}" for stack, count in self.stacks)
+        if self.other:
+            lines.append(f"  {self.other:>5} other")
+        return "\n".join(lines)
+
+
+def _tail(stack: str, frames: int = 3) -> str:
+    """Leaf frames of a collapsed stack"""
+    parts = stack.split(";")
+    if len(parts) <= frames:
+        return stack
+    return "…;" + ";".join(parts[-frames:])
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{PurePath(code.co_filename).name}:{code.co_name}"
+
+
+def collapse_stack(frame: FrameType | None, max_depth: int) -> str:
+    labels = []
+    while frame is not None and len(labels) < max_depth:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+def _innermost_running_span(trace: LogTrace, retries: int = 3) -> LogSpan | None:
+    """The trace thread adds spans while this thread reads them, spans are copied first"""
+    for _ in range(retries):
+        try:
+            spans = list(trace.spans.values())
+        except RuntimeError:
+            # dictionary changed size during iteration
+            continue
+        return next((span for span in reversed(spans) if span.is_running), None)
+    return None
+
+
+@dataclass
+class _SpanSamples:
+    span: LogSpan
+    stacks: Counter[str] = field(default_factory=Counter)
+    count: int = 0
+    dropped: int = 0
+
+
+class StackSampler:
+    """
+    A daemon thread taking `sys._current_frames()` every interval_seconds.
+    The samples of a span are added as a `stack_samples` event when it exits.
+    """
+
+    def __init__(self, settings: SamplerSettings | None = None):
+        self.settings = settings or SamplerSettings()
+        self.ticks = 0
+        # sample() runs on the sampler thread, on_span_done on the span threads
+        self._samples: dict[int, _SpanSamples] = {}
+        self._samples_lock = Lock()
+        self._stop = Event()
+        self._thread = Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _running_spans(self) -> dict[int, LogSpan]:
+        """thread ident -> innermost running span, threads with one trace only"""
+        traces: dict[int, LogTrace | None] = {}
+        for trace in state.snapshot().values():
+            thread = trace.thread_id
+            traces[thread] = None if thread in traces else trace
+        spans = {}
+        for thread, trace in traces.items():
+            if trace is None:
+                continue
+            if span := _innermost_running_span(trace):
+                spans[thread] = span
+        return spans
+
+    def sample(self) -> None:
+        settings = self.settings
+        spans = self._running_spans()
+        if not spans:
+            return
+        frames = sys._current_frames()
+        with self._samples_lock:
+            for thread, span in spans.items():
+                if (frame := frames.get(thread)) is None:
+                    continue
+                key = id(span)
+                if (samples := self._samples.get(key)) is None:
+                    samples = self._samples[key] = _SpanSamples(span)
+                if samples.count >= settings.max_samples_per_span:
+                    samples.dropped += 1
+                    continue
+                samples.stacks[collapse_stack(frame, settings.max_stack_depth)] += 1
+                samples.count += 1
+            # spans that exited without on_span_done, e.g., interrupted
+            for key, samples in list(self._samples.items()):
+                if samples.span.is_done:
+                    del self._samples[key]
+
+    def on_span_done(self, span: LogSpan) -> None:
+        """Called on the span thread before the trace is published"""
+        with self._samples_lock:
+            samples = self._samples.pop(id(span), None)
+        if samples is None:
+            return
+        settings = self.settings
+        if samples.count < settings.min_samples:
+            return
+        stacks = samples.stacks.most_common(settings.max_stacks)
+        span.add_stack_samples(
+            StackSamples(
+                settings.interval_seconds,
+                samples.count,
+                samples.dropped,
+                stacks,
+                other=samples.count - sum(count for _, count in stacks),
+            )
+        )
+
+    def _run(self) -> None:
+        interval = self.settings.interval_seconds
+        while not self._stop.wait(interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.exception(e)
+            self.ticks += 1
+
+
+skip_wrap(StackSampler._run)
+
+
+def start_stack_sampler(settings: SamplerSettings | None = None) -> StackSampler:
+    sampler = StackSampler(settings)
+    set_stack_sampler(sampler.on_span_done)
+    sampler.start()
+    return sampler
+
+
+def stop_stack_sampler(sampler: StackSampler) -> None:
+    set_stack_sampler(None)
+    sampler.stop()
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from threading import Lock
+from typing import Generic, Iterator, TypeVar
+
+T = TypeVar("T")
+_MISSING = object()
+
+
+class TraceRegistry(Generic[T]):
+    """
+    trace_id -> value, sharded by the hash of the trace_id with one lock per shard.
+    - reads are lock-free dict lookups (atomic with the GIL and in free-threaded builds)
+    - writes only lock their own shard, so threads rarely contend
+    - `snapshot` and `clear` hold every shard lock and see/clear a consistent state
+    """
+
+    def __init__(self, shard_count: int = 32):
+        assert (
+            shard_count > 0 and shard_count & (shard_count - 1) == 0
+        ), "shard_count must be a power of 2"
+        self._mask = shard_count - 1
+        self._shards: list[dict[str, T]] = [{} for _ in range(shard_count)]
+        self._locks = [Lock() for _ in range(shard_count)]
+
+    def __setitem__(self, trace_id: str, value: T) -> None:
+        index = hash(trace_id) & self._mask
+        with self._locks[index]:
+            self._shards[index][trace_id] = value
+
+    def __getitem__(self, trace_id: str) -> T:
+        return self._shards[hash(trace_id) & self._mask][trace_id]
+
+    def __contains__(self, trace_id: object) -> bool:
+        return trace_id in self._shards[hash(trace_id) & self._mask]
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.snapshot())
+
+    def get(self, trace_id: str, default: T | None = None) -> T | None:
+        return self._shards[hash(trace_id) & self._mask].get(trace_id, default)
+
+    def pop(self, trace_id: str, default: T | object = _MISSING) -> T:
+        index = hash(trace_id) & self._mask
+        with self._locks[index]:
+            if default is _MISSING:
+                return self._shards[index].pop(trace_id)
+            return self._shards[index].pop(trace_id, default)  # type: ignore
+
+    def _lock_all(self) -> None:
+        for lock in self._locks:
+            lock.acquire()
+
+    def _unlock_all(self) -> None:
+        for lock in reversed(self._locks):
+            lock.release()
+
+    def snapshot(self) -> dict[str, T]:
+        self._lock_all()
+        try:
+            merged: dict[str, T] = {}
+            for shard in self._shards:
+                merged.update(shard)
+            return merged
+        finally:
+            self._unlock_all()
+
+    def clear(self) -> None:
+        self._lock_all()
+        try:
+            for shard in self._shards:
+                shard.clear()
+        finally:
+            self._unlock_all()
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import sys
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from dataclasses import dataclass, field
+from itertools import count
+from threading import Lock
+from typing import Any, Iterable
+
+from span_tree.log_span import (
+    NODE_TYPE_EXCEPT_ERROR,
+    NODE_TYPE_EXIT_ERROR,
+    LogSpan,
+    as_trace_child_id,
+    as_trace_parent_id,
+)
+from span_tree.log_trace import LogTrace
+
+SpanKey = int
+ERROR_NODE_TYPES = (NODE_TYPE_EXIT_ERROR, NODE_TYPE_EXCEPT_ERROR)
+
+
+def error_type(error: Any) -> str:
+    """Name of the exception from a rich Trace or a formatted traceback"""
+    if stacks := getattr(error, "stacks", None):
+        return stacks[0].exc_type
+    if isinstance(error, str) and error:
+        last_line = error.rstrip().rsplit("\n", 1)[-1]
+        return last_line.split(":", 1)[0]
+    return ""
+
+
+def span_error_types(span: LogSpan) -> set[str]:
+    return {
+        error_type(event)
+        for event_type, event in span.events
+        if event_type in ERROR_NODE_TYPES
+    }
+
+
+# a LogSpan, its events list and its index entries in a TraceStore
+SPAN_OVERHEAD_BYTES = 1_000
+
+
+def trace_size_bytes(trace: LogTrace) -> int:
+    """Estimate: span overhead, log lines and the bytes counted by the extras budget"""
+    size = trace.extras_budget.used_bytes
+    for span in trace.spans.values():
+        size += SPAN_OVERHEAD_BYTES
+        for _, event in span.events:
+            if isinstance(event, str):
+                size += sys.getsizeof(event)
+    return size
+
+
+@dataclass
+class TraceStore:
+    """
+    Indexes finished traces for queries, use `add` as a trace publisher.
+    The oldest traces are evicted when there are more than max_spans or, when
+    max_bytes > 0, their estimated size (`trace_size_bytes`) is over max_bytes.
+    """
+
+    max_spans: int = 100_000
+    max_bytes: int = 0
+
+    _traces: dict[str, LogTrace] = field(init=False, default_factory=dict)
+    _trace_bytes: dict[str, int] = field(init=False, default_factory=dict)
+    _bytes: int = field(init=False, default=0)
+    _spans: dict[SpanKey, tuple[LogTrace, LogSpan]] = field(
+        init=False, default_factory=dict
+    )
+    _trace_keys: dict[str, list[SpanKey]] = field(init=False, default_factory=dict)
+    _by_name: defaultdict[str, set[SpanKey]] = field(
+        init=False, default_factory=lambda: defaultdict(set)
+    )
+    _by_status: defaultdict[str, set[SpanKey]] = field(
+        init=False, default_factory=lambda: defaultdict(set)
+    )
+    _by_error: defaultdict[str, set[SpanKey]] = field(
+        init=False, default_factory=lambda: defaultdict(set)
+    )
+    _by_ref: defaultdict[str, set[str]] = field(
+        init=False, default_factory=lambda: defaultdict(set)
+    )
+    _durations: list[tuple[float, SpanKey]] = field(init=False, default_factory=list)
+    _children: defaultdict[str, set[str]] = field(
+        init=False, default_factory=lambda: defaultdict(set)
+    )
+    _parents: dict[str, str] = field(init=False, default_factory=dict)
+    _next_key: count = field(init=False, default_factory=count)
+    _lock: Lock = field(init=False, default_factory=Lock)
+
+    def __call__(self, trace: LogTrace) -> None:
+        self.add(trace)
+
+    def __len__(self) -> int:
+        return len(self._traces)
+
+    def __contains__(self, trace_id: str) -> bool:
+        return trace_id in self._traces
+
+    @property
+    def span_count(self) -> int:
+        return len(self._spans)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def _over_limit(self) -> bool:
+        if len(self._spans) > self.max_spans:
+            return True
+        return 0 < self.max_bytes < self._bytes
+
+    def add(self, trace: LogTrace) -> None:
+        with self._lock:
+            if trace.trace_id in self._traces:
+                self._remove(trace.trace_id)
+            self._add(trace)
+            while self._over_limit() and len(self._traces) > 1:
+                self._remove(next(iter(self._traces)))
+
+    def _add(self, trace: LogTrace) -> None:
+        trace_id = trace.trace_id
+        self._traces[trace_id] = trace
+        size = self._trace_bytes[trace_id] = trace_size_bytes(trace)
+        self._bytes += size
+        keys = self._trace_keys[trace_id] = []
+        if parent := trace.parent_trace:
+            self._link(parent.trace_id, trace_id)
+        for span in trace.spans.values():
+            if not span.is_done:
+                continue
+            key = next(self._next_key)
+            keys.append(key)
+            self._spans[key] = (trace, span)
+            self._by_name[span.name].add(key)
+            self._by_status[span.status].add(key)
+            insort(self._durations, (span.duration_ms, key))
+            for name in span_error_types(span):
+                self._by_error[name].add(key)
+            for ref in (*span.refs_src, *span.refs_dest):
+                self._by_ref[ref].add(trace_id)
+            for event_type, event in span.events:
+                if child_id := as_trace_child_id(event_type, event):
+                    self._link(trace_id, child_id)
+                elif parent_id := as_trace_parent_id(event_type, event):
+                    self._link(parent_id, trace_id)
+
+    def _link(self, parent_id: str, child_id: str) -> None:
+        self._children[parent_id].add(child_id)
+        self._parents[child_id] = parent_id
+
+    def _remove(self, trace_id: str) -> None:
+        del self._traces[trace_id]
+        self._bytes -= self._trace_bytes.pop(trace_id)
+        for key in self._trace_keys.pop(trace_id):
+            _, span = self._spans.pop(key)
+            _discard(self._by_name, span.name, key)
+            _discard(self._by_status, span.status, key)
+            for name in span_error_types(span):
+                _discard(self._by_error, name, key)
+            for ref in (*span.refs_src, *span.refs_dest):
+                _discard(self._by_ref, ref, trace_id)
+            duration = (span.duration_ms, key)
+            del self._durations[bisect_left(self._durations, duration)]
+        # links of an evicted trace are dropped from both sides
+        for child_id in self._children.pop(trace_id, ()):
+            if self._parents.get(child_id) == trace_id:
+                del self._parents[child_id]
+        if parent_id := self._parents.pop(trace_id, None):
+            _discard(self._children, parent_id, trace_id)
+
+    def get(self, trace_id: str) -> LogTrace | None:
+        return self._traces.get(trace_id)
+
+    def spans(
+        self,
+        name: str | None = None,
+        status: str | None = None,
+        error_type: str | None = None,
+        min_ms: float | None = None,
+        max_ms: float | None = None,
+    ) -> list[tuple[LogTrace, LogSpan]]:
+        """Matching spans, oldest first, e.g., `spans("x", STATUS_FAILED, min_ms=200)`"""
+        with self._lock:
+            candidates: list[set[SpanKey]] = []
+            if name is not None:
+                candidates.append(self._by_name.get(name, set()))
+            if status is not None:
+                candidates.append(self._by_status.get(status, set()))
+            if error_type is not None:
+                candidates.append(self._by_error.get(error_type, set()))
+            if min_ms is not None or max_ms is not None:
+                candidates.append(self._duration_keys(min_ms, max_ms))
+            if not candidates:
+                return list(self._spans.values())
+            candidates.sort(key=len)
+            smallest, *others = candidates
+            keys = [key for key in smallest if all(key in other for other in others)]
+            return [self._spans[key] for key in sorted(keys)]
+
+    def _duration_keys(
+        self, min_ms: float | None, max_ms: float | None
+    ) -> set[SpanKey]:
+        durations = self._durations
+        start = 0 if min_ms is None else bisect_left(durations, (min_ms, -1))
+        end = (
+            len(durations)
+            if max_ms is None
+            else bisect_right(durations, (max_ms, float("inf")))
+        )
+        return {key for _, key in durations[start:end]}
+
+    def traces(self, **span_filters) -> list[LogTrace]:
+        """Traces with at least one span matching the filters of `spans`"""
+        found = {id(trace): trace for trace, _ in self.spans(**span_filters)}
+        return list(found.values())
+
+    def traces_by_ref(self, ref: str) -> list[LogTrace]:
+        with self._lock:
+            return [self._traces[trace_id] for trace_id in self._by_ref.get(ref, ())]
+
+    def children(self, trace_id: str) -> list[str]:
+        with self._lock:
+            return sorted(self._children.get(trace_id, ()))
+
+    def parent(self, trace_id: str) -> str | None:
+        with self._lock:
+            return self._parents.get(trace_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            for trace_id in list(self._traces):
+                self._remove(trace_id)
+            self._parents.clear()
+            self._children.clear()
+
+
+def _discard(index: dict[str, set[Any]], key: str, value: Any) -> None:
+    if (values := index.get(key)) is not None:
+        values.discard(value)
+        if not values:
+            del index[key]
+
+
+def store_traces(
+    traces: Iterable[LogTrace], max_spans: int = 100_000, max_bytes: int = 0
+) -> TraceStore:
+    store = TraceStore(max_spans, max_bytes)
+    for trace in traces:
+        store.add(trace)
+    return store
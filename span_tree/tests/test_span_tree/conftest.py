@@ -11,6 +11,7 @@ from span_tree.handler import configure
 from span_tree.log_span import LogSpan
 from span_tree.log_trace import LogTrace, clear_trace_state, temp_publisher
 from span_tree.log_trace_publisher import trace_publisher
+from span_tree.trace_store import TraceStore
 
 FLUSH_INTERVAL_SECONDS = 0.1
 
@@ -66,6 +67,19 @@ def publish_traces(trace_rich_printer, all_traces):
         yield
 
 
+@pytest.fixture()
+def trace_store(all_traces, trace_rich_printer) -> Iterable[TraceStore]:
+    store = TraceStore()
+
+    def new_publisher(trace: LogTrace) -> None:
+        all_traces.append(trace)
+        store.add(trace)
+        trace_rich_printer(trace)
+
+    with temp_publisher(new_publisher):
+        yield store
+
+
 def wait_for_printed_traces(traces: list[Tree]) -> None:
     for _ in range(10):
         if traces:
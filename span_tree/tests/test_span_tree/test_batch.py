@@ -0,0 +1,85 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from span_tree import get_logger
+from span_tree.batch import BatchSettings, TraceBatch, set_batch_settings
+from span_tree.log_span import NODE_TYPE_TRACE_BATCH, NODE_TYPE_TREE_CHILD
+from test_span_tree.conftest import trace_by_name
+
+logger = get_logger(__name__)
+
+
+@pytest.fixture()
+def batch_settings():
+    settings = BatchSettings(slow_threshold_seconds=0.05, max_kept_traces=2)
+    old = set_batch_settings(settings)
+    yield settings
+    set_batch_settings(old)
+
+
+def square(value: int) -> int:
+    logger.info(f"squaring {value}")
+    return value * value
+
+
+def test_map_should_aggregate_items_in_one_batch_node(all_traces, batch_settings):
+    # no item should count as slow on a busy machine
+    batch_settings.slow_threshold_seconds = 60
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        with logger("map_parent") as span:
+            assert list(pool.map(square, range(500))) == [i * i for i in range(500)]
+    assert [trace.root_span.name for trace in all_traces] == ["map_parent"]
+    [(key, batch)] = span.events
+    assert key == NODE_TYPE_TRACE_BATCH
+    assert isinstance(batch, TraceBatch)
+    assert (batch.count, batch.succeeded, batch.failed) == (500, 500, 0)
+    assert batch.kept_trace_ids == []
+    assert 0 <= batch.duration_min <= batch.duration_mean <= batch.duration_max
+
+
+def fail_on_odd(value: int) -> int:
+    if value % 2:
+        raise ValueError(value)
+    return value
+
+
+def test_map_should_keep_failed_traces_up_to_limit(all_traces, batch_settings):
+    pool = ThreadPoolExecutor(max_workers=4)
+    with logger("map_failing_parent") as span:
+        results = pool.map(fail_on_odd, range(10))
+        # consuming results cancels pending items after the first error
+        pool.shutdown(wait=True)
+        with pytest.raises(ValueError):
+            list(results)
+    batch = next(span.events_filter(NODE_TYPE_TRACE_BATCH, TraceBatch))
+    assert (batch.count, batch.succeeded, batch.failed) == (10, 5, 5)
+    assert len(batch.kept_trace_ids) == 2
+    linked_ids = list(span.events_filter(NODE_TYPE_TREE_CHILD, dict))
+    assert [link["id"] for link in linked_ids] == batch.kept_trace_ids
+    parent = trace_by_name(all_traces, "map_failing_parent")
+    kept = [trace for trace in all_traces if trace is not parent]
+    assert sorted(trace.trace_id for trace in kept) == sorted(batch.kept_trace_ids)
+    assert all(not trace.root_span.is_ok for trace in kept)
+
+
+def sleep_if_first(value: int) -> int:
+    if value == 0:
+        time.sleep(0.06)
+    return value
+
+
+def test_map_should_keep_slow_traces(all_traces, batch_settings):
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        with logger("map_slow_parent") as span:
+            assert list(pool.map(sleep_if_first, range(5))) == list(range(5))
+    batch = next(span.events_filter(NODE_TYPE_TRACE_BATCH, TraceBatch))
+    assert len(batch.kept_trace_ids) == 1
+    assert len(all_traces) == 2
+
+
+def test_map_without_parent_should_not_batch(all_traces):
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        assert list(pool.map(square, range(3))) == [0, 1, 4]
+    assert len(all_traces) == 3
@@ -0,0 +1,72 @@
+import io
+import logging
+import sys
+
+from span_tree import get_logger
+from span_tree.handler import MyHandler
+from span_tree.log_span import NODE_TYPE_CONTEXT
+
+logger = get_logger(__name__)
+
+
+def test_bound_context_should_be_added_once_per_span():
+    bound = logger.bind(user="u1").bind(request="r1")
+    assert dict(bound.context) == {"user": "u1", "request": "r1"}
+    assert not logger.context
+    with logger("bind_root") as root:
+        for i in range(3):
+            bound.log_extra(i=i)
+        bound.info("done")
+        with logger("bind_child") as child:
+            bound.info("in child")
+    assert [key for key, _ in root.events] == [
+        NODE_TYPE_CONTEXT,
+        "extra",
+        "extra",
+        "extra",
+        "INFO",
+    ]
+    assert root.events[0][1] == {"user": "u1", "request": "r1"}
+    assert [key for key, _ in child.events] == [NODE_TYPE_CONTEXT, "INFO"]
+
+
+def test_bound_logger_should_keep_user_extra():
+    records: list[logging.LogRecord] = []
+    handler = logging.Handler()
+    handler.emit = records.append  # type: ignore
+    logger.logger.addHandler(handler)
+    try:
+        logger.bind(user="u1").info("msg", extra={"custom": 1})
+    finally:
+        logger.logger.removeHandler(handler)
+    [record] = records
+    assert record.custom == 1  # type: ignore
+    assert record.span_tree_context == {"user": "u1"}  # type: ignore
+
+
+def test_dump_extras_should_not_change_the_record():
+    stream = io.StringIO()
+    handler = MyHandler(stream=stream)
+    record = logging.LogRecord(
+        __name__, logging.INFO, __file__, 1, "msg %s", ("a",), None
+    )
+    handler._dump_extras(record, {"a": 1})
+    assert "log_extra_no_parent: {'a': 1}" in stream.getvalue()
+    assert (record.msg, record.args) == ("msg %s", ("a",))
+
+
+def test_log_extra_should_report_the_callers_line():
+    records: list[logging.LogRecord] = []
+    handler = logging.Handler()
+    handler.emit = records.append  # type: ignore
+    logger.logger.addHandler(handler)
+    try:
+        line = sys._getframe().f_lineno + 1
+        logger.bind(user="u1").log_extra(located=True)
+    finally:
+        logger.logger.removeHandler(handler)
+    [record] = records
+    assert (record.funcName, record.lineno) == (
+        "test_log_extra_should_report_the_callers_line",
+        line,
+    )
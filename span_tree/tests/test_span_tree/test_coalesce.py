@@ -0,0 +1,79 @@
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from freezegun import freeze_time
+
+from span_tree import get_logger
+from span_tree.coalesce import TraceCoalescer, trace_signature
+from span_tree.log_trace import LogTrace, temp_publisher
+from span_tree.log_trace_publisher import trace_publisher
+
+logger = get_logger(__name__)
+
+
+def health_checks(count: int, warn_on: int = -1, slow_on: int = -1) -> list[LogTrace]:
+    traces: list[LogTrace] = []
+    with temp_publisher(traces.append):
+        for i in range(count):
+            with logger("health_check"):
+                with logger("ping"):
+                    logger.info(f"ping {i}")
+                    if i == slow_on:
+                        time.sleep(0.1)
+                if i == warn_on:
+                    logger.warning("slow ping")
+    return traces
+
+
+def test_signature_should_ignore_info_logs_but_not_warnings():
+    first, second, warned = health_checks(3, warn_on=2)
+    assert trace_signature(first) == trace_signature(second)
+    assert trace_signature(first) == (("0", "health_check"), ("0/0", "ping"))
+    assert trace_signature(warned) is None
+
+
+def test_failed_traces_should_never_be_coalesced():
+    traces: list[LogTrace] = []
+    with temp_publisher(traces.append):
+        with pytest.raises(ValueError):
+            with logger("failing"):
+                raise ValueError("boom")
+    assert trace_signature(traces[0]) is None
+
+
+def test_coalescer_should_summarize_after_window():
+    coalescer = TraceCoalescer(window_seconds=10)
+    with freeze_time("2020-01-01") as frozen:
+        printed = [coalescer.add(trace) for trace in health_checks(5)]
+        assert coalescer.flush() == []
+        frozen.tick(11)
+        [summary] = coalescer.flush()
+    assert printed == [True, False, False, False, False]
+    assert summary.startswith("health_check ×4 more identical traces p50=")
+
+
+def test_slow_trace_should_be_printed_in_full():
+    coalescer = TraceCoalescer(window_seconds=10)
+    printed = [coalescer.add(trace) for trace in health_checks(4, slow_on=2)]
+    assert printed == [True, False, True, False]
+    [summary] = coalescer.flush(force=True)
+    assert summary.startswith("health_check ×2 more identical traces")
+
+
+def test_trace_publisher_should_coalesce():
+    printed: list = []
+    publish, stop_publishing = trace_publisher(
+        console=MagicMock(print=printed.append),
+        flush_interval_seconds=0.01,
+        coalesce_window_seconds=60,
+    )
+    for trace in health_checks(10, warn_on=5):
+        publish(trace)
+    stop_publishing()
+    for _ in range(100):
+        if len(printed) == 3:
+            break
+        time.sleep(0.01)
+    assert len(printed) == 3
+    assert printed[-1].startswith("health_check ×8 more identical traces")
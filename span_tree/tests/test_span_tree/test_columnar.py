@@ -0,0 +1,89 @@
+import zipfile
+from array import array
+
+import pytest
+
+from span_tree import get_logger
+from span_tree.columnar import SpanColumns, columnar_publisher, write_npz
+from span_tree.log_trace import LogTrace, temp_publisher
+
+logger = get_logger(__name__)
+
+
+def make_traces() -> list[LogTrace]:
+    traces: list[LogTrace] = []
+    with temp_publisher(traces.append):
+        for _ in range(3):
+            with logger("columnar_root"):
+                with logger("columnar_child"):
+                    logger.info("event")
+                with logger("columnar_child"):
+                    with logger("columnar_grand_child"):
+                        pass
+    return traces
+
+
+def test_span_columns_should_flatten_traces():
+    columns = SpanColumns()
+    for trace in make_traces():
+        columns.append_trace(trace)
+    assert len(columns) == 12
+    arrays = columns.arrays()
+    assert arrays["name_values"] == [
+        "columnar_root",
+        "columnar_child",
+        "columnar_grand_child",
+    ]
+    assert arrays["path_values"] == ["0", "0/0", "0/1", "0/1/0"]
+    assert arrays["parent"][:4].tolist() == [-1, 0, 0, 2]
+    assert arrays["event_count"][:4].tolist() == [0, 1, 0, 0]
+    assert arrays["trace"].tolist() == [0] * 4 + [1] * 4 + [2] * 4
+
+
+def test_write_npz_should_use_npy_layout(tmp_path):
+    path = tmp_path / "chunk.npz"
+    write_npz(path, {"start": array("d", [1.5, 2.5]), "name_values": ["a", "bc"]})
+    with zipfile.ZipFile(path) as zf:
+        start = zf.read("start.npy")
+        names = zf.read("name_values.npy")
+    assert start.startswith(b"\x93NUMPY\x01\x00")
+    header_length = int.from_bytes(start[8:10], "little")
+    assert (10 + header_length) % 64 == 0
+    assert array("d", start[10 + header_length :]).tolist() == [1.5, 2.5]
+    assert b"'descr': '<U2'" in names
+
+
+def test_columnar_publisher_chunks_with_numpy(tmp_path):
+    np = pytest.importorskip("numpy")
+    from span_tree.columnar import critical_path_ms, load_chunks, percentiles_by_name
+
+    publish, stop_publishing = columnar_publisher(tmp_path, chunk_rows=5)
+    for trace in make_traces():
+        publish(trace)
+    stop_publishing()
+    paths = sorted(tmp_path.glob("spans-*.npz"))
+    assert len(paths) == 2  # a chunk is flushed after the trace crossing chunk_rows
+    table = load_chunks(paths)
+    assert len(table["name"]) == 12
+    assert table["parent"].tolist()[8:] == [-1, 8, 8, 10]
+    assert np.all(table["duration_ms"] >= 0)
+    percentiles = percentiles_by_name(table, q=(50, 100))
+    assert sorted(percentiles) == [
+        "columnar_child",
+        "columnar_grand_child",
+        "columnar_root",
+    ]
+    critical = critical_path_ms(table)
+    roots_total = float(table["duration_ms"][table["parent"] < 0].sum())
+    assert sum(critical.values()) == pytest.approx(roots_total)
+
+
+def test_last_ending_child_should_pick_the_latest_end():
+    np = pytest.importorskip("numpy")
+    from span_tree.columnar import last_ending_child
+
+    table = {
+        "parent": np.array([-1, 0, 0, 0, 2, 2, -1, 6]),
+        "end": np.array([9.0, 5.0, 8.0, 3.0, 6.0, 4.0, 2.0, 1.0]),
+    }
+    assert last_ending_child(table).tolist() == [2, -1, 4, -1, -1, -1, 7, -1]
@@ -3,13 +3,14 @@ import time
 from asyncio import create_task
 from concurrent.futures import ThreadPoolExecutor
 from contextlib import nullcontext
-from threading import Thread
+from threading import Event, Thread
 
 import pytest
 
 from span_tree.api import get_logger, new_span
-from span_tree.handler import skip_wrap
+from span_tree.handler import skip_wrap, span_name
 from span_tree.log_trace import get_trace_state
+from test_span_tree.conftest import trace_by_name
 
 logger = get_logger(__name__)
 
@@ -88,3 +89,49 @@ def test_logging_from_main_thread_without_parent():
     logger.log_extra(main_thread=True)
     task_state = get_trace_state()
     assert len(task_state) == 0
+
+
+def test_submit_without_logging_should_prune_child_trace(all_traces):
+    def no_logging():
+        return 1
+
+    with ThreadPoolExecutor() as pool:
+        with new_span("pruned_parent"):
+            assert pool.submit(no_logging).result(timeout=1) == 1
+    assert [trace.root_span.name for trace in all_traces] == ["pruned_parent"]
+    assert all_traces[0].root_span.events == []
+
+
+def test_submit_with_logging_should_link_child_trace(all_traces):
+    with ThreadPoolExecutor() as pool:
+        with new_span("linked_parent") as span:
+            pool.submit(log_in_thread, 0, "linked").result(timeout=1)
+    parent = trace_by_name(all_traces, "linked_parent")
+    child = next(trace for trace in all_traces if trace is not parent)
+    assert span.events == [("trace_child", {"id": child.trace_id})]
+    assert child.parent_trace is parent
+    assert child.root_span.is_ok
+
+
+def test_submit_finishing_after_parent_should_keep_child_trace(all_traces):
+    release = Event()
+
+    def wait_without_logging():
+        release.wait(timeout=1)
+
+    with ThreadPoolExecutor() as pool:
+        with new_span("done_parent"):
+            future = pool.submit(wait_without_logging)
+        release.set()
+        future.result(timeout=1)
+    assert len(all_traces) == 2
+
+
+def test_span_name_should_be_cached():
+    class Worker:
+        def run(self):
+            pass
+
+    worker = Worker()
+    assert span_name(worker.run) is span_name(worker.run)
+    assert span_name(worker.run).endswith("Worker.run")
@@ -0,0 +1,101 @@
+import io
+import logging
+
+import pytest
+
+from span_tree import get_logger
+from span_tree.handler import MyHandler
+from span_tree.log_span import LogSpan
+from span_tree.log_trace import set_debug_buffer_size
+
+logger = get_logger(__name__)
+
+
+@pytest.fixture()
+def debug_buffer():
+    root_logger = logging.getLogger()
+    handler = next(h for h in root_logger.handlers if isinstance(h, MyHandler))
+    old_handler_level, old_root_level = handler.level, root_logger.level
+    handler.setLevel(logging.DEBUG)
+    root_logger.setLevel(logging.DEBUG)
+    old_size = set_debug_buffer_size(3)
+    yield
+    set_debug_buffer_size(old_size)
+    handler.setLevel(old_handler_level)
+    root_logger.setLevel(old_root_level)
+
+
+def _levels(span: LogSpan) -> list[str]:
+    return [key for key, _ in span.events]
+
+
+def test_debug_records_dropped_on_success(all_traces, debug_buffer):
+    with logger("debug_ok"):
+        logger.debug("not needed")
+        logger.info("kept")
+    assert _levels(all_traces[0].root_span) == ["INFO"]
+
+
+class _Error(Exception):
+    pass
+
+
+def test_debug_records_attached_to_failed_span(all_traces, debug_buffer):
+    with logger("debug_root"):
+        logger.debug("root debug")
+        with pytest.raises(_Error):
+            with logger("debug_child"):
+                for i in range(5):
+                    logger.debug(f"child debug {i}")
+                raise _Error()
+    trace = all_traces[0]
+    root, child = trace.spans.values()
+    assert _levels(root) == []
+    child_messages = [message for key, message in child.events if key == "DEBUG"]
+    # only the last 3 records fit in the buffer
+    assert [message.rsplit(" ", 1)[-1] for message in child_messages] == [
+        "2",
+        "3",
+        "4",
+    ]
+
+
+def test_debug_records_attached_when_trace_fails(all_traces, debug_buffer):
+    with pytest.raises(_Error):
+        with logger("debug_failed_root"):
+            logger.debug("root debug")
+            raise _Error()
+    root_span = all_traces[0].root_span
+    assert _levels(root_span)[:1] == ["DEBUG"]
+
+
+def test_debug_buffer_enabled_per_trace(all_traces, debug_buffer):
+    set_debug_buffer_size(0)
+    with pytest.raises(_Error):
+        with logger("debug_per_trace", debug_buffer_size=2):
+            logger.debug("per trace debug")
+            raise _Error()
+    with pytest.raises(_Error):
+        with logger("debug_disabled"):
+            logger.debug("not buffered")
+            raise _Error()
+    per_trace, disabled = all_traces
+    assert "DEBUG" in _levels(per_trace.root_span)
+    # without a buffer the record is added like any other record
+    assert _levels(disabled.root_span)[:1] == ["DEBUG"]
+
+
+def test_debug_records_written_without_buffer():
+    stream = io.StringIO()
+    handler = MyHandler(stream=stream)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    debug_logger = logging.getLogger("test_debug_records_written_without_buffer")
+    debug_logger.addHandler(handler)
+    debug_logger.setLevel(logging.DEBUG)
+    debug_logger.propagate = False
+    try:
+        debug_logger.debug("debug line")
+        debug_logger.info("info line")
+    finally:
+        debug_logger.removeHandler(handler)
+    assert stream.getvalue() == "debug line\ninfo line\n"
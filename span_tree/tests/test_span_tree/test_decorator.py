@@ -1,8 +1,14 @@
 from __future__ import annotations
 
+import asyncio
+import timeit
+from os import getenv
+
+import pytest
 from zero_3rdparty.object_name import as_name
 
 from span_tree import get_logger
+from span_tree.log_trace import temp_publisher
 from test_span_tree.conftest import trace_by_name
 
 logger = get_logger(__name__)
@@ -42,3 +48,108 @@ def test_span_decorator_multiple_times(all_traces):
     assert result == "hey-22"
     trace = all_traces[0]
     assert len(trace.spans) == 1
+
+
+@logger.span
+async def my_coroutine(seconds: float) -> str:
+    await asyncio.sleep(seconds)
+    logger.info("coroutine done")
+    return "done"
+
+
+@pytest.mark.asyncio()
+async def test_span_decorator_coroutine_should_time_execution(all_traces):
+    assert await my_coroutine(0.02) == "done"
+    trace = trace_by_name(all_traces, as_name(my_coroutine))
+    assert trace.root_span.duration_ms >= 20
+    assert [key for key, _ in trace.root_span.events] == ["INFO"]
+    assert trace.root_span.call_location.endswith(f"in {my_coroutine.__qualname__}")
+
+
+@logger.span
+def my_generator(count: int):
+    for i in range(count):
+        logger.info(f"yielding {i}")
+        yield i
+    return count
+
+
+def test_span_decorator_generator_should_cover_all_items(all_traces):
+    assert list(my_generator(3)) == [0, 1, 2]
+    trace = trace_by_name(all_traces, as_name(my_generator))
+    assert len(trace.root_span.events) == 3
+    assert trace.root_span.is_ok
+
+
+def test_span_decorator_generator_closed_early_should_succeed(all_traces):
+    generator = my_generator(3)
+    assert next(generator) == 0
+    assert not all_traces
+    generator.close()
+    trace = trace_by_name(all_traces, as_name(my_generator))
+    assert trace.root_span.is_ok
+
+
+@logger.span
+async def my_async_generator(count: int):
+    for i in range(count):
+        await asyncio.sleep(0)
+        yield i
+
+
+@pytest.mark.asyncio()
+async def test_span_decorator_async_generator(all_traces):
+    assert [i async for i in my_async_generator(3)] == [0, 1, 2]
+    async_gen = my_async_generator(3)
+    assert await async_gen.__anext__() == 0
+    await async_gen.aclose()
+    traces = [t for t in all_traces if t.root_span.name == as_name(my_async_generator)]
+    assert len(traces) == 2
+    assert all(trace.root_span.is_ok for trace in traces)
+
+
+class _Reset(Exception):
+    pass
+
+
+@logger.span
+async def my_async_accumulator():
+    total = 0
+    while True:
+        try:
+            total += yield total
+        except _Reset:
+            total = 0
+
+
+@pytest.mark.asyncio()
+async def test_span_decorator_async_generator_should_forward_asend_athrow(
+    all_traces,
+):
+    accumulator = my_async_accumulator()
+    assert await accumulator.asend(None) == 0
+    assert await accumulator.asend(2) == 2
+    assert await accumulator.asend(3) == 5
+    assert await accumulator.athrow(_Reset()) == 0
+    assert await accumulator.asend(1) == 1
+    await accumulator.aclose()
+    trace = trace_by_name(all_traces, as_name(my_async_accumulator))
+    assert trace.root_span.is_ok
+
+
+@pytest.mark.skipif(getenv("RUN_SLOW", "") == "", reason="RUN_SLOW must exist in env")
+def test_span_decorator_overhead_lower_than_new_span():
+    @logger.span("decorated")
+    def decorated():
+        pass
+
+    def manual():
+        with logger.new_span("manual"):
+            pass
+
+    with temp_publisher(lambda _: None):
+        decorated_seconds = min(timeit.repeat(decorated, number=5000, repeat=5))
+        manual_seconds = min(timeit.repeat(manual, number=5000, repeat=5))
+    result = f"decorated={decorated_seconds:.3f}s manual={manual_seconds:.3f}s"
+    print(result)  # noqa: T201
+    assert decorated_seconds < manual_seconds
@@ -0,0 +1,75 @@
+from threading import Thread
+from time import sleep
+
+from span_tree import deferred, get_logger
+from span_tree.extras import Deferred, capture_extra, resolve_extra
+from span_tree.log_trace import LogTrace, temp_publisher
+
+logger = get_logger(__name__)
+
+
+def test_deferred_should_only_be_called_when_rendered():
+    calls = []
+
+    def expensive():
+        calls.append(1)
+        return {"rows": 3}
+
+    published: list[LogTrace] = []
+    with temp_publisher(published.append):
+        with logger("deferred_root") as span:
+            logger.log_extra(
+                payload=deferred(expensive), other=deferred(lambda: "marker")
+            )
+    assert calls == []
+    assert len(published) == 1
+    [(_, extra)] = span.events
+    assert isinstance(extra["payload"], Deferred)
+    assert "{'rows': 3}" in repr(extra)
+    assert resolve_extra(extra) == {"payload": {"rows": 3}, "other": "marker"}
+    assert calls == [1]
+
+
+def test_deferred_should_not_be_called_when_trace_is_skipped():
+    calls = []
+    with temp_publisher(lambda trace: None):
+        with logger("deferred_skipped"):
+            logger.log_extra(payload=deferred(lambda: calls.append(1)))
+    assert calls == []
+
+
+def test_deferred_errors_should_be_contained():
+    def fails():
+        raise ValueError("boom")
+
+    captured = capture_extra({"payload": deferred(fails)})
+    assert repr(captured) == "{'payload': \"<deferred failed: ValueError('boom')>\"}"
+
+
+def test_functions_are_not_called_unless_deferred():
+    calls = []
+
+    def callback(value: int) -> None:
+        calls.append(value)
+
+    captured = capture_extra({"callback": callback})
+    assert "<function" in repr(captured)
+    assert calls == []
+
+
+def test_deferred_should_be_called_once_from_many_threads():
+    calls = []
+
+    def slow():
+        calls.append(1)
+        sleep(0.05)
+        return "value"
+
+    value = deferred(slow)
+    threads = [Thread(target=value.resolve) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert value.resolve() == "value"
+    assert calls == [1]
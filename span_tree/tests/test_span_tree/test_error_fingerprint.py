@@ -0,0 +1,80 @@
+import sys
+import traceback
+
+import pytest
+from freezegun import freeze_time
+from rich.traceback import Traceback
+from rich.tree import Tree
+
+from span_tree.error_fingerprint import (
+    ErrorFingerprints,
+    error_fingerprint,
+    set_error_fingerprints,
+)
+from span_tree.rich_rendering import _default_node_adder
+
+
+@pytest.fixture()
+def fingerprints():
+    fingerprints = ErrorFingerprints(window_seconds=10)
+    old = set_error_fingerprints(fingerprints)
+    yield fingerprints
+    set_error_fingerprints(old)
+
+
+def fail(value: str):
+    raise ConnectionError(f"host down: {value}")
+
+
+def extract(value: str, formatted: bool = False):
+    try:
+        fail(value)
+    except ConnectionError:
+        if formatted:
+            return "".join(traceback.format_exception(*sys.exc_info()))
+        return Traceback.extract(*sys.exc_info(), show_locals=True)
+
+
+def test_fingerprint_should_ignore_message_and_locals():
+    first, exc_type = error_fingerprint(extract("a"))
+    assert exc_type == "ConnectionError"
+    assert error_fingerprint(extract("b")) == (first, exc_type)
+    try:
+        fail("c")
+    except ConnectionError:
+        other = Traceback.extract(*sys.exc_info())
+    assert error_fingerprint(other)[0] != first
+
+
+def test_fingerprint_from_formatted_traceback():
+    fingerprint, exc_type = error_fingerprint(extract("a", formatted=True))
+    assert exc_type == "ConnectionError"
+    assert error_fingerprint(extract("b", formatted=True))[0] == fingerprint
+
+
+def test_repeated_errors_collapse_to_one_line(fingerprints):
+    with freeze_time("2020-01-01") as frozen:
+        nodes = [
+            _default_node_adder(Tree("root"), "exit_error", extract(str(i)))
+            for i in range(3)
+        ]
+        frozen.tick(11)
+        after_window = _default_node_adder(Tree("root"), "exit_error", extract("x"))
+    assert len(nodes[0].children) == 1
+    assert not nodes[1].children and not nodes[2].children
+    assert "seen ×3 in window, ×3 total" in str(nodes[2].label)
+    assert len(after_window.children) == 1
+    [counts] = fingerprints.counts()
+    assert (counts.exc_type, counts.count, counts.window_count) == (
+        "ConnectionError",
+        4,
+        1,
+    )
+
+
+def test_rendering_an_error_again_should_not_count_it_again(fingerprints):
+    error = extract("retried")
+    nodes = [_default_node_adder(Tree("root"), "except_error", error) for _ in "ab"]
+    assert [len(node.children) for node in nodes] == [1, 1]
+    [counts] = fingerprints.counts()
+    assert counts.count == 1
@@ -0,0 +1,95 @@
+import pytest
+
+from span_tree import get_logger
+from span_tree.extras import (
+    ExtrasBudget,
+    ExtrasPolicy,
+    LazyRepr,
+    capture_extra,
+    set_extras_policy,
+)
+
+logger = get_logger(__name__)
+
+
+@pytest.fixture()
+def small_policy():
+    policy = ExtrasPolicy(max_repr_length=20, max_extra_bytes=2_000)
+    old = set_extras_policy(policy)
+    yield policy
+    set_extras_policy(old)
+
+
+def test_mutating_after_log_extra_should_not_change_the_span():
+    items = [1, 2]
+    with logger("mutate") as span:
+        logger.log_extra(items=items)
+        items.append(3)
+    [(_, extra)] = span.events
+    assert extra == {"items": [1, 2]}
+
+
+def test_long_strings_are_truncated(small_policy):
+    captured = capture_extra({"body": "x" * 100})
+    assert captured["body"] == f"{'x' * 20}...<80 more chars>"
+
+
+def test_values_over_extra_limit_are_dropped(small_policy):
+    captured = capture_extra({"ok": 1, "big": list(range(1_000))})
+    assert captured["ok"] == 1
+    assert captured["big"].startswith("<dropped:")
+
+
+def test_trace_budget_should_drop_values_after_limit():
+    policy = ExtrasPolicy(max_trace_bytes=1_000)
+    budget = ExtrasBudget()
+    for _ in range(3):
+        captured = capture_extra({"values": list(range(10))}, budget, policy)
+    assert captured["values"].startswith("<dropped:")
+    assert budget.dropped == 1
+    assert budget.used_bytes <= policy.max_trace_bytes
+
+
+class Payload:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def __repr__(self) -> str:
+        self.calls += 1
+        return "Payload" + "!" * 50
+
+
+def test_lazy_repr_should_cache_and_release_value():
+    payload = Payload()
+    [lazy] = capture_extra({"payload": payload}, policy=ExtrasPolicy()).values()
+    assert isinstance(lazy, LazyRepr)
+    assert repr(lazy) == repr(lazy) == "Payload" + "!" * 50
+    assert payload.calls == 1
+    assert lazy.value is None
+
+
+def test_eager_repr_should_not_keep_references():
+    captured = capture_extra(
+        {"payload": Payload(), "items": [1]}, policy=ExtrasPolicy(eager_repr=True)
+    )
+    assert captured == {"payload": "Payload" + "!" * 50, "items": "[1]"}
+
+
+def test_nested_payload_should_count_contained_bytes():
+    budget = ExtrasBudget()
+    captured = capture_extra(
+        {"payload": {"body": b"x" * 1_000_000}, "rows": [b"y" * 100_000], "ok": [1]},
+        budget,
+        ExtrasPolicy(),
+    )
+    assert captured["payload"].startswith("<dropped:")
+    assert captured["rows"].startswith("<dropped:")
+    assert captured["ok"] == [1]
+    assert budget.dropped == 2
+    assert budget.used_bytes < 1_000
+
+
+def test_values_with_too_many_items_are_dropped():
+    policy = ExtrasPolicy(max_extra_bytes=1_000_000, max_size_items=10)
+    captured = capture_extra({"rows": [[i] for i in range(20)]}, policy=policy)
+    assert captured["rows"].startswith("<dropped:")
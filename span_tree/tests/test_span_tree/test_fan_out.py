@@ -0,0 +1,109 @@
+from threading import Event
+from time import monotonic, sleep
+
+from span_tree import get_logger, lifecycle
+from span_tree.fan_out import FanOut, fan_out_publisher
+from span_tree.log_trace import LogTrace, temp_publisher
+from span_tree.sqlite_store import SqliteTraces, sqlite_publisher
+
+logger = get_logger(__name__)
+
+
+class _SinkError(Exception):
+    pass
+
+
+def failing_sink(trace: LogTrace) -> None:
+    raise _SinkError(trace.trace_id)
+
+
+def test_fan_out_should_isolate_failing_sink():
+    first: list[LogTrace] = []
+    second: list[LogTrace] = []
+    fan_out = FanOut(
+        {"first": first.append, "fails": failing_sink, "second": second.append}
+    )
+    with temp_publisher(fan_out.publish):
+        for i in range(5):
+            with logger(f"fan_out_{i}"):
+                pass
+    assert fan_out.stop(timeout=5)
+    assert [trace.root_span.name for trace in first] == [
+        f"fan_out_{i}" for i in range(5)
+    ]
+    assert second == first
+    stats = {stat.name: stat for stat in fan_out.stats()}
+    assert stats["fails"].errors == 5
+    assert stats["first"].handled == 5
+    assert stats["first"].errors == 0
+
+
+class _BatchSink:
+    def __init__(self):
+        self.batches: list[list[LogTrace]] = []
+
+    def __call__(self, trace: LogTrace) -> None:
+        raise AssertionError("batch sinks are never called per trace")
+
+    def handle_batch(self, traces: list[LogTrace]) -> None:
+        self.batches.append(traces)
+
+
+def test_batch_sink_should_get_whole_batches():
+    sink = _BatchSink()
+    fan_out = FanOut({"batch": sink}, max_batch_size=100)
+    with temp_publisher(fan_out.publish):
+        for _ in range(5):
+            with logger("fan_out_batch"):
+                pass
+    assert fan_out.stop(timeout=5)
+    assert sum(len(batch) for batch in sink.batches) == 5
+    (stats,) = fan_out.stats()
+    assert stats.handled == 5
+    assert stats.errors == 0
+
+
+def test_slow_sink_should_only_drop_its_own_traces():
+    unblock = Event()
+    fast: list[LogTrace] = []
+
+    def blocked_sink(trace: LogTrace) -> None:
+        unblock.wait()
+
+    fan_out = FanOut(
+        {"blocked": blocked_sink, "fast": fast.append},
+        max_queue_size=5,
+        max_batch_size=1,
+    )
+    with temp_publisher(fan_out.publish):
+        for i in range(20):
+            with logger("fan_out_slow"):
+                pass
+            wait_until = monotonic() + 5
+            while len(fast) <= i and monotonic() < wait_until:
+                sleep(0.001)
+    assert not fan_out.stop(timeout=0.2)
+    assert len(fast) == 20
+    stats = {stat.name: stat for stat in fan_out.stats()}
+    # at most one trace in the blocked call and a full queue
+    assert stats["blocked"].dropped >= 20 - 1 - 5
+    assert stats["fast"].dropped == 0
+    unblock.set()
+
+
+def test_shutdown_should_drain_fan_out_before_its_sinks(monkeypatch, tmp_path):
+    monkeypatch.setattr(lifecycle, "_shutdown_stats", None)
+    monkeypatch.setattr(lifecycle, "_sinks", {})
+    path = tmp_path / "traces.db"
+    sqlite_publish, _ = sqlite_publisher(path)
+    publish, _ = fan_out_publisher({"sqlite": sqlite_publish})
+    with temp_publisher(publish):
+        for _ in range(500):
+            with logger("fan_out_shutdown"):
+                pass
+    stats = lifecycle.shutdown(deadline_seconds=10)
+    assert stats.flushed_sinks == ["fan_out", "sqlite"]
+    assert stats.dropped_traces == 0
+    store = SqliteTraces(path)
+    assert len(store.spans(name="fan_out_shutdown", limit=1000)) == 500
+    store.close()
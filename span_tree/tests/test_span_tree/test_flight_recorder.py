@@ -0,0 +1,101 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from span_tree import get_logger
+from span_tree.flight_recorder import (
+    in_flight,
+    main,
+    previous_path,
+    read_flight_records,
+    start_flight_recorder,
+    stop_flight_recorder,
+)
+
+logger = get_logger(__name__)
+
+
+@pytest.fixture()
+def recorder(tmp_path):
+    recorder = start_flight_recorder(tmp_path / "flight.bin", slot_count=8)
+    yield recorder
+    stop_flight_recorder(recorder)
+
+
+def test_records_should_wrap_around_oldest_first(recorder):
+    for i in range(3):
+        with logger(f"flight_{i}"):
+            with logger("flight_child"):
+                pass
+    pid, records = read_flight_records(recorder.path)
+    assert pid == os.getpid()
+    # 3 traces * (2 starts + 2 ends + 1 done) = 15 records in 8 slots
+    assert [record.seq for record in records] == list(range(8, 16))
+    assert [(record.kind, record.name) for record in records[-5:]] == [
+        ("start", "flight_2"),
+        ("start", "flight_child"),
+        ("end", "flight_child"),
+        ("end", "flight_2"),
+        ("done", "flight_2"),
+    ]
+    assert records[-4].span_path == "0/0"
+    assert all(record.ok for record in records if record.kind != "start")
+    assert in_flight(records) == []
+
+
+def test_reader_should_show_spans_of_a_killed_process(tmp_path):
+    path = tmp_path / "killed.bin"
+    script = textwrap.dedent(
+        f"""
+        import os, signal
+        from span_tree import get_logger
+        from span_tree.flight_recorder import start_flight_recorder
+
+        start_flight_recorder({str(path)!r})
+        logger = get_logger("killed")
+        with logger("request"):
+            with logger("done_step"):
+                pass
+            with logger("stuck_step"):
+                os.kill(os.getpid(), signal.SIGKILL)
+        """
+    )
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    result = subprocess.run([sys.executable, "-c", script], env=env)
+    assert result.returncode == -9
+    _, records = read_flight_records(path)
+    assert [record.name for record in in_flight(records)] == ["request", "stuck_step"]
+
+
+def test_main_should_print_records(recorder, capsys):
+    with logger("flight_main"):
+        assert main([str(recorder.path), "10"]) == 0
+    output = capsys.readouterr().out
+    assert "in-flight spans:" in output
+    assert output.rstrip().endswith("flight_main")
+
+
+def test_restart_should_keep_the_previous_buffer(tmp_path):
+    path = tmp_path / "restart.bin"
+    first = start_flight_recorder(path, slot_count=8)
+    with logger("flight_before_restart"):
+        pass
+    stop_flight_recorder(first)
+    assert first.previous is None
+    second = start_flight_recorder(path, slot_count=8)
+    stop_flight_recorder(second)
+    assert second.previous == previous_path(path)
+    _, records = read_flight_records(second.previous)
+    assert records[0].name == "flight_before_restart"
+    assert read_flight_records(path)[1] == []
+
+
+def test_recorder_should_not_overwrite_other_files(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("not a flight recorder")
+    with pytest.raises(ValueError):
+        start_flight_recorder(path)
+    assert path.read_text() == "not a flight recorder"
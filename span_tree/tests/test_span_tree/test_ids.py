@@ -0,0 +1,67 @@
+import os
+import time
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+from os import getenv
+
+import pytest
+from zero_3rdparty.id_creator import uuid4_hex
+
+from span_tree import ids
+from span_tree.ids import KSUID_LENGTH, KsuidIds, ProcessCounterIds, base62
+
+
+def test_base62():
+    assert base62(0, 3) == "000"
+    assert base62(61) == "z"
+    assert base62(62 * 62) == "100"
+
+
+@pytest.mark.parametrize("generator_cls", [ProcessCounterIds, KsuidIds])
+def test_ids_unique_across_threads(generator_cls):
+    generator = generator_cls()
+
+    def create_ids(_) -> list[str]:
+        return [generator() for _ in range(1000)]
+
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        ids = [id for ids in pool.map(create_ids, range(20)) for id in ids]
+    assert len(set(ids)) == len(ids)
+
+
+def test_ksuid_ids_are_time_sortable(monkeypatch):
+    generator = KsuidIds()
+    now = time.time()
+    seconds = iter([now, now, now + 1, now + 1, now + 100])
+    monkeypatch.setattr(ids, "time", lambda: next(seconds))
+    created = [generator() for _ in range(5)]
+    assert all(len(id) == KSUID_LENGTH for id in created)
+    assert sorted(created) == created
+    assert created[0][:6] != created[-1][:6]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+def test_ids_differ_after_fork():
+    generator = ProcessCounterIds()
+    read_fd, write_fd = os.pipe()
+    if pid := os.fork():
+        os.close(write_fd)
+        with os.fdopen(read_fd) as f:
+            child_id = f.read()
+        os.waitpid(pid, 0)
+        assert child_id != generator()
+    else:  # pragma: no cover
+        os.write(write_fd, generator().encode())
+        os._exit(0)
+
+
+@pytest.mark.skipif(getenv("RUN_SLOW", "") == "", reason="RUN_SLOW must exist in env")
+def test_benchmark_against_uuid4_hex():
+    number = 100_000
+    uuid_seconds = timeit.timeit(uuid4_hex, number=number)
+    counter_seconds = timeit.timeit(ProcessCounterIds(), number=number)
+    ksuid_seconds = timeit.timeit(KsuidIds(), number=number)
+    print(  # noqa: T201
+        f"uuid4_hex={uuid_seconds:.3f}s process_counter={counter_seconds:.3f}s ksuid={ksuid_seconds:.3f}s"
+    )
+    assert counter_seconds < uuid_seconds
@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+CORE_MODULES = [
+    "span_tree",
+    "span_tree.api",
+    "span_tree.handler",
+    "span_tree.log_span",
+    "span_tree.log_trace",
+]
+
+
+def import_times(modules: list[str]) -> dict[str, int]:
+    """module -> cumulative import time in us using `python -X importtime`"""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("module", CORE_MODULES)
+def test_core_import_does_not_import_rich(module):
+    times = import_times([module])
+    assert module in times
+    rich_modules = [name for name in times if name.split(".")[0] == "rich"]
+    assert not rich_modules
+
+
+def test_rich_rendering_imports_rich():
+    times = import_times(["span_tree.rich_rendering"])
+    assert "rich.tree" in times
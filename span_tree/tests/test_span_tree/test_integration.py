@@ -16,13 +16,13 @@ def test_a_slow_loop(all_traces):
                 logger.info(f"loop @ {i}/{LOOP_COUNT}")
                 logger.log_extra(name="espen")
     assert all_traces
-    assert all_traces[0].root_span.duration_ms < 10
+    assert all_traces[0].root_span.duration_ms < 10_000
 
 
 def test_simple_math(all_traces):
     with logger.new_span("simple_math"):
         assert 2 + 2 == 4
-    assert all_traces[0].root_span.duration_ms < 1
+    assert all_traces[0].root_span.duration_ms < 1_000
 
 
 @pytest.mark.skipif(getenv("RUN_SLOW", "") == "", reason="RUN_SLOW must exist in env")
@@ -0,0 +1,147 @@
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+
+import pytest
+
+from span_tree import get_logger, lifecycle, profiling
+from span_tree.constants import STATUS_INTERRUPTED
+from span_tree.log_trace import LogTrace, state, temp_publisher
+from span_tree.sink_worker import SinkWorker
+from span_tree.sqlite_store import SqliteTraces
+
+logger = get_logger(__name__)
+
+
+@pytest.fixture()
+def fresh_lifecycle(monkeypatch):
+    monkeypatch.setattr(lifecycle, "_shutdown_stats", None)
+    monkeypatch.setattr(lifecycle, "_sinks", {})
+
+
+def test_shutdown_should_publish_running_traces_and_stop_sinks(fresh_lifecycle):
+    handled: list[LogTrace] = []
+    worker = SinkWorker("test-sink", handled.extend)
+    assert lifecycle.active_sinks() == [worker]
+    with temp_publisher(worker.put):
+        trace = LogTrace("running_on_shutdown")
+        trace.__enter__()
+        with logger("running_child"):
+            stats = lifecycle.shutdown(deadline_seconds=1)
+    assert stats.interrupted_traces == 1
+    assert stats.flushed_sinks == ["test-sink"]
+    assert lifecycle.active_sinks() == []
+    assert handled == [trace]
+    assert [span.status for span in trace.spans.values()] == [STATUS_INTERRUPTED] * 2
+    assert lifecycle.shutdown() is stats
+
+
+def slow_batch(traces: list[LogTrace]) -> None:
+    time.sleep(0.5)
+
+
+def test_shutdown_should_report_dropped_traces(fresh_lifecycle):
+    worker = SinkWorker("slow-sink", slow_batch, max_batch_size=1)
+    with temp_publisher(worker.put):
+        for _ in range(3):
+            with logger("dropped"):
+                pass
+    stats = lifecycle.shutdown(deadline_seconds=0.1)
+    assert stats.timed_out_sinks == ["slow-sink"]
+    assert stats.dropped_traces >= 1
+    assert stats.seconds < 0.5
+
+
+def test_sigterm_should_flush_sqlite_sink(tmp_path):
+    path = tmp_path / "traces.db"
+    script = textwrap.dedent(
+        f"""
+        import os, signal
+        from span_tree import get_logger
+        from span_tree.handler import configure
+        from span_tree.log_trace import set_trace_publisher
+        from span_tree.sqlite_store import sqlite_publisher
+
+        configure(shutdown_deadline_seconds=5)
+        publish, _ = sqlite_publisher({str(path)!r})
+        set_trace_publisher(publish)
+        logger = get_logger("sigterm")
+        with logger("finished"):
+            pass
+        with logger("request"):
+            os.kill(os.getpid(), signal.SIGTERM)
+        """
+    )
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    result = subprocess.run([sys.executable, "-c", script], env=env)
+    assert result.returncode == -15
+    store = SqliteTraces(path)
+    assert {(row.name, row.status) for row in store.dashboard()} == {
+        ("finished", "succeeded"),
+        ("request", STATUS_INTERRUPTED),
+    }
+    store.close()
+
+
+def test_signal_should_not_hang_while_main_thread_holds_a_lock(
+    fresh_lifecycle, monkeypatch
+):
+    monkeypatch.setattr(lifecycle, "_deadline_seconds", 0.2)
+    signals: list[int] = []
+    monkeypatch.setitem(
+        lifecycle._previous_handlers,
+        signal.SIGTERM,
+        lambda signum, _: signals.append(signum),
+    )
+    state._lock_all()
+    try:
+        start = time.monotonic()
+        lifecycle._on_signal(signal.SIGTERM, None)
+        assert time.monotonic() - start < 1
+    finally:
+        state._unlock_all()
+    assert signals == [signal.SIGTERM]
+    [flush] = [t for t in threading.enumerate() if t.name == "span-tree-shutdown"]
+    flush.join(5)
+    assert lifecycle.shutdown_stats() is not None
+
+
+def test_ignored_signal_should_not_stop_sinks(fresh_lifecycle, monkeypatch):
+    monkeypatch.setitem(lifecycle._previous_handlers, signal.SIGTERM, signal.SIG_IGN)
+    lifecycle._on_signal(signal.SIGTERM, None)
+    monkeypatch.setitem(lifecycle._previous_handlers, signal.SIGCHLD, signal.SIG_DFL)
+    lifecycle._on_signal(signal.SIGCHLD, None)
+    assert lifecycle.shutdown_stats() is None
+
+
+def test_signal_should_log_when_flush_misses_deadline(
+    fresh_lifecycle, monkeypatch, caplog
+):
+    monkeypatch.setattr(lifecycle, "_deadline_seconds", 0.05)
+    monkeypatch.setitem(
+        lifecycle._previous_handlers, signal.SIGTERM, lambda signum, _: None
+    )
+    state._lock_all()
+    try:
+        lifecycle._on_signal(signal.SIGTERM, None)
+    finally:
+        state._unlock_all()
+    assert "shutdown flush still running after 0.05s" in caplog.text
+    [flush] = [t for t in threading.enumerate() if t.name == "span-tree-shutdown"]
+    flush.join(5)
+
+
+def test_interrupted_span_should_stop_its_profiler_on_exit(fresh_lifecycle):
+    published: list[LogTrace] = []
+    with temp_publisher(published.append):
+        with logger("profiled_on_shutdown", profile=True):
+            lifecycle.shutdown(deadline_seconds=1)
+            assert threading.get_ident() in profiling._active
+    assert threading.get_ident() not in profiling._active
+    [trace] = published
+    assert trace.root_span.status == STATUS_INTERRUPTED
+    assert not trace.root_span.events
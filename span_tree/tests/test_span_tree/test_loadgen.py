@@ -0,0 +1,45 @@
+import logging
+
+from span_tree.loadgen import LoadSettings, create_publisher, main, run_load
+from span_tree.sqlite_store import SqliteTraces
+
+
+def test_run_load_should_report_rate_and_sink_latency(tmp_path):
+    settings = LoadSettings(
+        depth=1,
+        fan_out=2,
+        error_rate=0.5,
+        threads=2,
+        pool_items=2,
+        async_tasks=1,
+        target_rate=200,
+        duration_seconds=0.3,
+    )
+    publish, stop_publishing = create_publisher(["null"], tmp_path)
+    report = run_load(settings, publish, stop_publishing)
+    assert report.drained
+    assert 0 < report.root_traces <= 200 * 0.3 + settings.threads
+    # the pool items and tasks are child traces
+    assert report.sink_traces["null"] >= report.root_traces
+    assert report.sink_latency_ms["null"].max > 0
+    assert report.publish_us.p50 > 0
+    assert "sink null:" in report.format()
+
+
+def test_main_should_fan_out_to_sinks(tmp_path, capsys, monkeypatch):
+    # main installs its own MyHandler
+    root_logger = logging.getLogger()
+    monkeypatch.setattr(root_logger, "handlers", [])
+    monkeypatch.setattr(root_logger, "level", logging.WARNING)
+    argv = ["--sink", "sqlite", "--sink", "otlp", "--duration", "0.2", "--depth", "1"]
+    assert main([*argv, "--out", str(tmp_path)]) == 0
+    output = capsys.readouterr().out
+    assert "sink sqlite:" in output
+    assert "sink otlp_json:" in output
+    assert "fan-out to sqlite:" in output
+    assert (tmp_path / "traces.db").exists()
+    assert (tmp_path / "traces.otlp.jsonl").stat().st_size > 0
+    store = SqliteTraces(tmp_path / "traces.db")
+    root = store.spans(name="loadgen_root", limit=1)[0]
+    assert ("extra", "{'event': 0, 'depth': 0}") in store.events(root.trace_id)
+    store.close()
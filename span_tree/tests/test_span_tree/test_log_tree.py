@@ -1,5 +1,10 @@
-from span_tree import get_logger
+from threading import Thread
+
+import pytest
+
+from span_tree import get_logger, log_span
 from span_tree.log_trace import LogTrace, get_trace_state
+from span_tree.rich_rendering import convert_tree
 from test_span_tree.conftest import trace_by_name
 
 logger = get_logger(__name__)
@@ -77,3 +82,48 @@ def test_ref_dest(all_traces):
         logger.log_extra(ref_dest="some-ref")
     trace = trace_by_name(all_traces, "root")
     assert list(trace.root_span.refs_dest) == ["some-ref"]
+
+
+def test_span_durations_should_ignore_wall_clock_adjustments(monkeypatch, all_traces):
+    walls = iter([1000.0, 10.0])  # NTP moves the wall clock backwards
+    monkeypatch.setattr(log_span, "time", lambda: next(walls))
+    with logger("timed_root"):
+        with logger("timed_child"):
+            sum(range(1000))
+    spans = list(all_traces[0].spans.values())
+    for span in spans:
+        assert isinstance(span.duration_ns, int)
+        assert span.duration_ns > 0
+        assert span.timestamp_end >= span.timestamp
+        assert span.duration_ms == span.duration_ns / 1e6
+        assert span.duration_us == span.duration_ns / 1e3
+    root, child = spans
+    assert root.timestamp == pytest.approx(1000.0, abs=1)
+    assert root.start_ns < child.start_ns < child.end_ns < root.end_ns
+
+
+def test_child_trace_should_share_clock_of_parent(all_traces):
+    with logger("clock_parent"):
+        thread = Thread(target=lambda: logger.info("child"))
+        thread.start()
+        thread.join()
+    parent = trace_by_name(all_traces, "clock_parent")
+    (child,) = (trace for trace in all_traces if trace is not parent)
+    assert child.parent_trace is parent
+    assert child.clock is parent.clock
+
+
+def test_grand_child_should_render_under_its_parent(all_traces):
+    with logger("render_root"):
+        with logger("render_first"):
+            pass
+        with logger("render_second"):
+            with logger("render_grand_child"):
+                pass
+    tree = convert_tree(all_traces[0], render_call_locations=False)
+    (root_node,) = tree.children
+    first, second = root_node.children
+    assert "render_first" in str(first.label)
+    assert not first.children
+    (grand_child,) = second.children
+    assert "render_grand_child" in str(grand_child.label)
@@ -0,0 +1,65 @@
+import stat
+
+import pytest
+
+from span_tree import get_logger, metrics_exporter
+from span_tree.log_trace import temp_publisher
+from span_tree.metrics_exporter import SpanMetrics, metrics_file_publisher
+
+logger = get_logger(__name__)
+
+
+class _Error(Exception):
+    pass
+
+
+def test_span_metrics_counts_and_histogram(all_traces):
+    with logger("metrics_root"):
+        with logger("metrics_child"):
+            pass
+    with pytest.raises(_Error):
+        with logger("metrics_root"):
+            raise _Error()
+    metrics = SpanMetrics(buckets=(0.5, 1))
+    for trace in all_traces:
+        metrics.add_trace(trace)
+    assert metrics.counts == {
+        ("metrics_root", "succeeded"): 1,
+        ("metrics_root", "failed"): 1,
+        ("metrics_child", "succeeded"): 1,
+    }
+    text = metrics.dump()
+    assert 'span_tree_spans_total{span_name="metrics_root",status="failed"} 1' in text
+    assert (
+        'span_tree_span_duration_seconds_bucket{span_name="metrics_root",le="0.5"} 2'
+        in text
+    )
+    assert (
+        'span_tree_span_duration_seconds_bucket{span_name="metrics_root",le="+Inf"} 2'
+        in text
+    )
+    assert 'span_tree_span_duration_seconds_count{span_name="metrics_child"} 1' in text
+
+
+def test_metrics_file_publisher_writes_on_stop(tmp_path):
+    path = tmp_path / "span_tree.prom"
+    publish, stop = metrics_file_publisher(path, write_interval_seconds=60)
+    with temp_publisher(publish):
+        with logger('quoted"name'):
+            pass
+    stop()
+    text = path.read_text()
+    assert (
+        'span_tree_spans_total{span_name="quoted\\"name",status="succeeded"} 1' in text
+    )
+    assert [p.name for p in tmp_path.iterdir()] == ["span_tree.prom"]
+
+
+def test_write_atomic_should_create_readable_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics_exporter, "_UMASK", 0o022)
+    path = tmp_path / "span_tree.prom"
+    metrics_exporter.write_atomic(path, "metrics\n")
+    assert stat.S_IMODE(path.stat().st_mode) == 0o644
+    monkeypatch.setattr(metrics_exporter, "_UMASK", 0o077)
+    metrics_exporter.write_atomic(path, "metrics\n")
+    assert stat.S_IMODE(path.stat().st_mode) == 0o600
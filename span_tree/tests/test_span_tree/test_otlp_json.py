@@ -0,0 +1,161 @@
+import json
+from threading import Thread
+
+import pytest
+
+from span_tree import get_logger
+from span_tree.log_trace import LogTrace, temp_publisher
+from span_tree.otlp_json import (
+    STATUS_CODE_ERROR,
+    STATUS_CODE_OK,
+    RotatingFile,
+    encode_request,
+    export_request,
+    otlp_file_publisher,
+    otlp_span_id,
+    otlp_trace_id,
+)
+from test_span_tree.conftest import trace_by_name
+
+logger = get_logger(__name__)
+
+
+class _ExportError(Exception):
+    pass
+
+
+def export_spans(traces: list[LogTrace]) -> dict[str, dict]:
+    request = export_request(traces, {"service.name": "test"})
+    (resource_spans,) = request["resourceSpans"]
+    (scope_spans,) = resource_spans["scopeSpans"]
+    return {span["name"]: span for span in scope_spans["spans"]}
+
+
+def attribute_values(attributes: list[dict]) -> dict:
+    return {
+        attribute["key"]: next(iter(attribute["value"].values()))
+        for attribute in attributes
+    }
+
+
+def test_export_should_map_spans_events_and_errors(all_traces):
+    with pytest.raises(_ExportError):
+        with logger("otlp_root"):
+            logger.info("started")
+            with logger("otlp_child"):
+                logger.log_extra(user="u1", attempt=2, ok=True)
+            raise _ExportError("boom")
+    trace = trace_by_name(all_traces, "otlp_root")
+    spans = export_spans([trace])
+    root, child = spans["otlp_root"], spans["otlp_child"]
+    assert root["traceId"] == child["traceId"] == otlp_trace_id(trace.trace_id)
+    assert len(root["traceId"]) == 32
+    assert len(root["spanId"]) == 16
+    assert root["spanId"] == otlp_span_id(trace.trace_id, "0")
+    assert root["parentSpanId"] == ""
+    assert child["parentSpanId"] == root["spanId"]
+    assert int(root["startTimeUnixNano"]) <= int(child["startTimeUnixNano"])
+    assert int(child["endTimeUnixNano"]) <= int(root["endTimeUnixNano"])
+    assert root["status"] == {"code": STATUS_CODE_ERROR}
+    assert child["status"] == {"code": STATUS_CODE_OK}
+
+    (extra,) = child["events"]
+    assert extra["name"] == "extra"
+    assert attribute_values(extra["attributes"]) == {
+        "user": "u1",
+        "attempt": "2",
+        "ok": True,
+    }
+    log, exception = root["events"]
+    assert attribute_values(log["attributes"])["log.severity"] == "INFO"
+    assert exception["name"] == "exception"
+    exception_attributes = attribute_values(exception["attributes"])
+    assert exception_attributes["exception.type"] == "_ExportError"
+    assert exception_attributes["exception.message"] == "boom"
+    stacktrace = exception_attributes["exception.stacktrace"]
+    assert "in test_export_should_map_spans_events_and_errors" in stacktrace
+    assert stacktrace.endswith("_ExportError: boom")
+    assert exception_attributes["exception.escaped"] is True
+
+
+def test_export_should_link_child_traces(all_traces):
+    with logger("otlp_parent"):
+        with logger("otlp_spawner"):
+            thread = Thread(target=lambda: logger.info("in thread"))
+            thread.start()
+            thread.join()
+    parent = trace_by_name(all_traces, "otlp_parent")
+    (child,) = (trace for trace in all_traces if trace is not parent)
+    spans = export_spans([parent, child])
+    (link_to_child,) = spans["otlp_spawner"]["links"]
+    assert link_to_child["traceId"] == otlp_trace_id(child.trace_id)
+    assert link_to_child["spanId"] == otlp_span_id(child.trace_id, "0")
+    (child_span,) = (span for name, span in spans.items() if name.endswith("<lambda>"))
+    (link_to_parent,) = child_span["links"]
+    assert link_to_parent["spanId"] == spans["otlp_spawner"]["spanId"]
+
+
+def test_file_publisher_should_write_and_rotate(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    publish, stop_publishing = otlp_file_publisher(
+        path, max_bytes=2_000, backup_count=2, max_batch_size=1
+    )
+    with temp_publisher(publish):
+        for i in range(20):
+            with logger(f"otlp_file_{i}"):
+                logger.info("some message to fill the file")
+    assert stop_publishing(timeout=5)
+    files = sorted(tmp_path.iterdir())
+    assert [file.name for file in files] == [
+        "traces.jsonl",
+        "traces.jsonl.1",
+        "traces.jsonl.2",
+    ]
+    requests = [
+        json.loads(line)
+        for line in path.with_name("traces.jsonl.1").read_text().splitlines()
+    ]
+    assert requests
+    (resource_spans,) = requests[0]["resourceSpans"]
+    resource = attribute_values(resource_spans["resource"]["attributes"])
+    assert resource["service.name"] == "span_tree"
+
+
+def test_encode_request_should_match_export_request(all_traces):
+    for i in range(3):
+        with logger(f"otlp_encode_{i}"):
+            logger.log_extra(i=i)
+    resource = {"service.name": "test"}
+    encoded = "".join(encode_request(all_traces, resource))
+    assert json.loads(encoded) == export_request(all_traces, resource)
+
+
+def test_non_finite_floats_should_be_valid_json(all_traces):
+    with logger("otlp_nan"):
+        logger.log_extra(ratio=float("nan"), limit=float("-inf"), value=0.5)
+    trace = trace_by_name(all_traces, "otlp_nan")
+    line = "".join(encode_request([trace], {}))
+    request = json.loads(line, parse_constant=pytest.fail)
+    [span] = request["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    [event] = span["events"]
+    assert attribute_values(event["attributes"]) == {
+        "ratio": "nan",
+        "limit": "-inf",
+        "value": 0.5,
+    }
+
+
+def test_failed_line_should_not_leave_a_partial_line(tmp_path):
+    path = tmp_path / "traces.otlp.jsonl"
+    file = RotatingFile(path, max_bytes=1_000_000, backup_count=1)
+
+    def failing_chunks():
+        yield '{"partial":'
+        raise _ExportError("encode failed")
+
+    file.write_line(['{"first":1}'])
+    with pytest.raises(_ExportError):
+        file.write_line(failing_chunks())
+    file.write_line(['{"second":2}'])
+    file.close()
+    assert path.read_text().splitlines() == ['{"first":1}', '{"second":2}']
@@ -0,0 +1,87 @@
+from threading import Thread
+
+import pytest
+
+from span_tree import get_logger, profiling
+from span_tree.log_span import NODE_TYPE_PROFILE
+from span_tree.profiling import ProfileSettings, SpanProfile, set_profile_settings
+from test_span_tree.conftest import trace_by_name
+
+logger = get_logger(__name__)
+
+
+def busy_function(count: int) -> int:
+    return sum(i * i for i in range(count))
+
+
+def span_profiles(trace) -> dict[str, SpanProfile]:
+    return {
+        span.name: profile
+        for span in trace.spans.values()
+        for profile in span.events_filter(NODE_TYPE_PROFILE, SpanProfile)
+    }
+
+
+@pytest.fixture()
+def profile_settings():
+    def set_settings(settings: ProfileSettings) -> None:
+        olds.append(set_profile_settings(settings))
+
+    olds: list[ProfileSettings] = []
+    yield set_settings
+    for old in reversed(olds):
+        set_profile_settings(old)
+
+
+def test_profile_kwarg_should_attach_top_functions(all_traces):
+    with logger("profile_root"):
+        with logger("profiled_child", profile=True):
+            busy_function(10_000)
+        busy_function(10)
+    trace = trace_by_name(all_traces, "profile_root")
+    profiles = span_profiles(trace)
+    assert list(profiles) == ["profiled_child"]
+    profile = profiles["profiled_child"]
+    assert profile.total_calls > 0
+    functions = [row.function for row in profile.rows]
+    assert any("busy_function" in function for function in functions)
+    assert all("disable" not in function for function in functions)
+    assert "by tottime" in repr(profile)
+
+
+def test_profile_settings_by_name_should_only_profile_outermost_span(
+    all_traces, profile_settings
+):
+    profile_settings(
+        ProfileSettings(frozenset({"by_name", "nested"}), top_n=3, sort_by="cumtime")
+    )
+    with logger("by_name"):
+        with logger("nested"):
+            busy_function(1000)
+    profiles = span_profiles(trace_by_name(all_traces, "by_name"))
+    assert list(profiles) == ["by_name"]
+    rows = profiles["by_name"].rows
+    assert len(rows) == 3
+    assert rows == sorted(rows, key=lambda row: row.cumtime, reverse=True)
+
+
+def test_sample_rate_should_profile_all_spans(all_traces, profile_settings):
+    profile_settings(ProfileSettings(sample_rate=1))
+    with logger("sampled"):
+        pass
+    assert list(span_profiles(trace_by_name(all_traces, "sampled"))) == ["sampled"]
+
+
+def test_one_profiler_at_a_time_when_monitoring_is_process_wide(monkeypatch):
+    monkeypatch.setattr(profiling, "_ONE_PROFILER", True)
+    profiler = profiling.start_profiler()
+    assert profiler is not None
+    try:
+        other: list = []
+        thread = Thread(target=lambda: other.append(profiling.start_profiler()))
+        thread.start()
+        thread.join()
+        assert other == [None]
+    finally:
+        profiling.stop_profiler(profiler)
+    assert profiling._active == {}
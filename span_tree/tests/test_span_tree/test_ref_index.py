@@ -0,0 +1,88 @@
+import time
+from unittest.mock import MagicMock
+
+from freezegun import freeze_time
+
+from span_tree import get_logger
+from span_tree.log_trace import LogTrace, temp_publisher
+from span_tree.log_trace_publisher import trace_publisher
+from span_tree.ref_index import RefEnd, RefIndex
+from span_tree.rich_rendering import _ref_label, create_rich_trace
+
+logger = get_logger(__name__)
+
+
+def producer_consumer() -> tuple[str, LogTrace, LogTrace]:
+    traces: list[LogTrace] = []
+    with temp_publisher(traces.append):
+        with logger("producer"):
+            ref = logger.log_extra(ref_src=True)
+        with logger("consumer"):
+            with logger("consume_item"):
+                logger.log_extra(ref_dest=ref)
+    producer, consumer = traces
+    return ref, producer, consumer
+
+
+def test_ref_index_should_link_both_sides():
+    ref, producer, consumer = producer_consumer()
+    refs = RefIndex()
+    refs.add_trace(consumer)
+    link = refs.get(ref)
+    assert link and not link.is_matched
+    refs.add_trace(producer)
+    refs.add_trace(consumer)
+    assert link.src == RefEnd(producer.trace_id, "0")
+    assert link.dests == [RefEnd(consumer.trace_id, "0/0")]
+    assert link.is_matched
+    assert _ref_label("ref_src", link).endswith(f"{consumer.trace_id}[0/0][/]")
+    assert _ref_label("ref_dest", link).endswith(f"{producer.trace_id}[0][/]")
+
+
+def test_unmatched_refs_should_expire():
+    ref, producer, consumer = producer_consumer()
+    refs = RefIndex(ttl_seconds=10)
+    with freeze_time("2020-01-01") as frozen:
+        refs.add_trace(producer)
+        frozen.tick(11)
+        refs.expire()
+    assert refs.get(ref) is None
+
+
+def test_matched_refs_should_be_bounded():
+    refs = RefIndex(max_refs=1)
+    first_ref, *first = producer_consumer()
+    second_ref, *second = producer_consumer()
+    for trace in [*first, *second]:
+        refs.add_trace(trace)
+    assert len(refs) == 1
+    assert refs.get(first_ref) is None
+    assert refs.get(second_ref)
+
+
+def test_rendered_ref_should_show_the_other_side():
+    ref, producer, consumer = producer_consumer()
+    refs = RefIndex()
+    refs.add_trace(producer)
+    refs.add_trace(consumer)
+    tree, _ = create_rich_trace(consumer, {}.get, refs=refs)
+    labels = [str(child.label) for child in tree.children[0].children[1].children]
+    assert f"[blue]ref_dest[/]={ref} ← [cyan]{producer.trace_id}[0][/]" in labels
+
+
+def test_trace_publisher_should_index_refs():
+    refs = RefIndex()
+    printed = []
+    publish, stop_publishing = trace_publisher(
+        console=MagicMock(print=printed.append), flush_interval_seconds=0.01, refs=refs
+    )
+    ref, producer, consumer = producer_consumer()
+    publish(producer)
+    publish(consumer)
+    stop_publishing()
+    for _ in range(100):
+        if len(printed) == 2:
+            break
+        time.sleep(0.01)
+    link = refs.get(ref)
+    assert link and link.is_matched
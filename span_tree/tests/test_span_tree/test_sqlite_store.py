@@ -0,0 +1,81 @@
+from os import getenv
+from time import perf_counter
+
+import pytest
+
+from span_tree import get_logger
+from span_tree.constants import STATUS_FAILED
+from span_tree.log_trace import LogTrace, temp_publisher
+from span_tree.sqlite_store import SqliteTraces, sqlite_publisher
+
+logger = get_logger(__name__)
+
+
+def test_sqlite_publisher_should_store_spans_and_events(tmp_path):
+    path = tmp_path / "traces.db"
+    publish, stop_publishing = sqlite_publisher(path)
+    with temp_publisher(publish):
+        with logger("sqlite_root") as root_span:
+            logger.info("hello")
+            with logger("sqlite_child"):
+                logger.log_extra(rows=3)
+        with pytest.raises(ValueError):
+            with logger("sqlite_root"):
+                raise ValueError("boom")
+    stop_publishing()
+
+    store = SqliteTraces(path)
+    dashboard = store.dashboard()
+    assert [(row.name, row.status, row.count) for row in dashboard] == [
+        ("sqlite_child", "succeeded", 1),
+        ("sqlite_root", "failed", 1),
+        ("sqlite_root", "succeeded", 1),
+    ]
+    [failed] = store.spans(status=STATUS_FAILED)
+    assert failed.error_type == "ValueError"
+    [ok_root] = store.spans(name="sqlite_root", status="succeeded")
+    assert ok_root.ts_start == root_span.timestamp
+    assert [span.name for span in store.trace(ok_root.trace_id)] == [
+        "sqlite_root",
+        "sqlite_child",
+    ]
+    [(level, message)] = store.events(ok_root.trace_id)
+    assert level == "INFO" and message.endswith("hello")
+    assert store.events(ok_root.trace_id, "0/0") == [("extra", "{'rows': 3}")]
+    store.close()
+
+
+def test_inserting_a_trace_again_should_replace_rows(tmp_path):
+    store = SqliteTraces(tmp_path / "traces.db")
+    [trace] = make_traces(1, 2)
+    store.insert([trace])
+    store.insert([trace])
+    assert len(store.trace(trace.trace_id)) == 2
+    assert len(store.events(trace.trace_id, "0/0")) == 1
+    store.close()
+
+
+def make_traces(count: int, spans_per_trace: int) -> list[LogTrace]:
+    traces = []
+    with temp_publisher(traces.append):
+        for i in range(count):
+            with logger(f"bench_{i % 10}"):
+                for _ in range(spans_per_trace - 1):
+                    with logger("bench_child"):
+                        logger.info("event")
+    return traces
+
+
+@pytest.mark.skipif(getenv("RUN_SLOW", "") == "", reason="RUN_SLOW must exist in env")
+def test_sqlite_ingest_rate(tmp_path):
+    traces = make_traces(2_000, 10)
+    store = SqliteTraces(tmp_path / "bench.db")
+    start = perf_counter()
+    for i in range(0, len(traces), 1000):
+        store.insert(traces[i : i + 1000])
+    elapsed = perf_counter() - start
+    spans_per_second = 20_000 / elapsed
+    message = f"sqlite ingest: {spans_per_second:.0f} spans/s"
+    print(message)  # noqa: T201
+    assert spans_per_second > 10_000
+    store.close()
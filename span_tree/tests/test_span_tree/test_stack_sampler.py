@@ -0,0 +1,89 @@
+from threading import Event, Thread
+from time import monotonic
+
+import pytest
+
+from span_tree import get_logger
+from span_tree.log_span import NODE_TYPE_STACK_SAMPLES
+from span_tree.stack_sampler import (
+    SamplerSettings,
+    StackSampler,
+    StackSamples,
+    start_stack_sampler,
+    stop_stack_sampler,
+)
+from test_span_tree.conftest import trace_by_name
+
+logger = get_logger(__name__)
+
+
+def spin(seconds: float) -> None:
+    end = monotonic() + seconds
+    while monotonic() < end:
+        pass
+
+
+def stack_samples(trace) -> dict[str, StackSamples]:
+    return {
+        span.name: samples
+        for span in trace.spans.values()
+        for samples in span.events_filter(NODE_TYPE_STACK_SAMPLES, StackSamples)
+    }
+
+
+@pytest.fixture()
+def sampler_settings():
+    settings = SamplerSettings(interval_seconds=0.005, min_samples=3)
+    sampler = start_stack_sampler(settings)
+    yield settings
+    stop_stack_sampler(sampler)
+
+
+def test_long_span_should_get_collapsed_stacks(all_traces, sampler_settings):
+    with logger("sampled_root"):
+        spin(0.001)
+        with logger("sampled_slow"):
+            spin(0.3)
+    samples = stack_samples(trace_by_name(all_traces, "sampled_root"))
+    assert list(samples) == ["sampled_slow"]
+    slow = samples["sampled_slow"]
+    assert slow.sample_count >= sampler_settings.min_samples
+    top_stack, _ = slow.stacks[0]
+    assert top_stack.endswith(":spin")
+    assert "test_long_span_should_get_collapsed_stacks" in top_stack
+    assert f"{top_stack} " in slow.collapsed()
+    assert "spin" in repr(slow)
+
+
+def test_samples_should_be_capped_per_span(all_traces, sampler_settings):
+    sampler_settings.max_samples_per_span = 3
+    with logger("sampled_capped"):
+        spin(0.2)
+    samples = stack_samples(trace_by_name(all_traces, "sampled_capped"))
+    capped = samples["sampled_capped"]
+    assert capped.sample_count == 3
+    assert capped.dropped > 0
+
+
+def open_spans(stop: Event) -> None:
+    while not stop.is_set():
+        with logger("sampled_busy"):
+            for _ in range(200):
+                with logger("sampled_child"):
+                    pass
+
+
+def test_sample_should_not_fail_while_spans_are_created():
+    sampler = StackSampler(SamplerSettings(min_samples=1))
+    stop = Event()
+    threads = [Thread(target=open_spans, args=(stop,)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    try:
+        end = monotonic() + 0.5
+        while monotonic() < end:
+            sampler.sample()
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
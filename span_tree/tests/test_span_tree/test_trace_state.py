@@ -0,0 +1,73 @@
+from threading import Barrier, Event, Thread
+
+import pytest
+
+from span_tree import get_logger
+from span_tree.log_trace import LogTrace, get_trace_state
+from span_tree.trace_state import TraceRegistry
+
+logger = get_logger(__name__)
+THREAD_COUNT = 300
+SPANS_PER_THREAD = 20
+
+
+def test_registry_operations():
+    registry: TraceRegistry[int] = TraceRegistry(shard_count=4)
+    registry["a"] = 1
+    registry["b"] = 2
+    assert "a" in registry
+    assert registry["a"] == 1
+    assert registry.get("c") is None
+    assert len(registry) == 2
+    assert registry.snapshot() == {"a": 1, "b": 2}
+    assert registry.pop("a") == 1
+    assert registry.pop("a", None) is None
+    with pytest.raises(KeyError):
+        registry.pop("a")
+    registry.clear()
+    assert len(registry) == 0
+
+
+def test_registry_shard_count_power_of_2():
+    with pytest.raises(AssertionError):
+        TraceRegistry(shard_count=3)
+
+
+def test_stress_many_threads_creating_spans(all_traces):
+    """Also meant to run on free-threaded builds (python3.13t -X gil=0)"""
+    barrier = Barrier(THREAD_COUNT + 1)
+    done = Event()
+    snapshot_errors: list[BaseException] = []
+
+    def create_spans(thread_nr: int):
+        barrier.wait()
+        for span_nr in range(SPANS_PER_THREAD):
+            with logger(f"stress-{thread_nr}-{span_nr}"):
+                logger.log_extra(thread_nr=thread_nr, span_nr=span_nr)
+
+    def snapshot_while_running():
+        try:
+            while not done.is_set():
+                for trace_id, trace in get_trace_state().items():
+                    assert isinstance(trace, LogTrace)
+                    assert trace.trace_id == trace_id
+        except BaseException as e:
+            snapshot_errors.append(e)
+
+    threads = [Thread(target=create_spans, args=(i,)) for i in range(THREAD_COUNT)]
+    snapshotter = Thread(target=snapshot_while_running)
+    snapshotter.start()
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+    done.set()
+    snapshotter.join()
+    assert not snapshot_errors
+    assert len(get_trace_state()) == 0
+    stress_traces = [t for t in all_traces if t.root_span.name.endswith("create_spans")]
+    assert len(stress_traces) == THREAD_COUNT
+    assert len({t.trace_id for t in stress_traces}) == THREAD_COUNT
+    for trace in stress_traces:
+        assert len(trace.spans) == SPANS_PER_THREAD + 1
@@ -0,0 +1,113 @@
+from threading import Thread
+from time import perf_counter_ns
+
+import pytest
+
+from span_tree import get_logger
+from span_tree.constants import STATUS_FAILED, STATUS_SUCCEEDED
+from span_tree.log_trace import LogTrace
+from span_tree.trace_store import SPAN_OVERHEAD_BYTES, TraceStore, error_type
+
+logger = get_logger(__name__)
+
+
+class _Failed(Exception):
+    pass
+
+
+def finished_trace(name: str, ms: float, failed: bool = False) -> LogTrace:
+    trace = LogTrace(name)
+    try:
+        with trace:
+            # started ms ago, ends now
+            trace.root_span.set_start_ns(perf_counter_ns() - int(ms * 1_000_000))
+            if failed:
+                raise _Failed(name)
+    except _Failed:
+        pass
+    return trace
+
+
+def test_query_failed_spans_by_name_and_duration():
+    store = TraceStore()
+    traces = [
+        finished_trace("x", 100, failed=True),
+        finished_trace("x", 300, failed=True),
+        finished_trace("x", 500),
+        finished_trace("y", 400, failed=True),
+    ]
+    for trace in traces:
+        store.add(trace)
+    found = store.spans("x", STATUS_FAILED, min_ms=200)
+    assert [trace for trace, _ in found] == [traces[1]]
+    assert store.traces(min_ms=350, max_ms=450) == [traces[3]]
+    assert len(store.spans(status=STATUS_SUCCEEDED)) == 1
+    assert store.spans("missing") == []
+
+
+def test_oldest_traces_are_evicted():
+    store = TraceStore(max_spans=3)
+    traces = [finished_trace(f"t{i}", i) for i in range(5)]
+    for trace in traces:
+        store.add(trace)
+    assert len(store) == 3
+    assert traces[0].trace_id not in store
+    assert [trace for trace, _ in store.spans(min_ms=0)] == traces[2:]
+    assert store.spans("t0") == []
+
+
+def test_traces_over_max_bytes_are_evicted():
+    store = TraceStore(max_bytes=12_000)
+    traces = [finished_trace(f"t{i}", i) for i in range(4)]
+    for trace in traces:
+        trace.extras_budget.used_bytes = 5_000
+        store.add(trace)
+    assert [trace.trace_id in store for trace in traces] == [False, False, True, True]
+    assert store.size_bytes == 2 * (5_000 + SPAN_OVERHEAD_BYTES)
+    store.clear()
+    assert store.size_bytes == 0
+
+
+def test_errors_refs_and_links_are_indexed(trace_store):
+    with logger("store_root"):
+        ref = logger.log_extra(ref_src=True)
+        thread = Thread(target=logger.info, args=("in thread",))
+        thread.start()
+        thread.join()
+        try:
+            raise KeyError("missing")
+        except KeyError:
+            logger.exception("handled")
+    with pytest.raises(ValueError):
+        with logger("store_failing"):
+            raise ValueError("boom")
+    [(root_trace, root_span)] = trace_store.spans("store_root")
+    assert trace_store.traces_by_ref(ref) == [root_trace]
+    assert trace_store.traces(error_type="KeyError") == [root_trace]
+    [(failing, _)] = trace_store.spans(error_type="ValueError")
+    assert failing.root_span.name == "store_failing"
+    [child_id] = trace_store.children(root_trace.trace_id)
+    assert trace_store.parent(child_id) == root_trace.trace_id
+
+
+def test_evicted_parent_should_not_be_linked(all_traces):
+    with logger("evicted_parent"):
+        thread = Thread(target=logger.info, args=("in thread",))
+        thread.start()
+        thread.join()
+    child, parent = all_traces
+    assert parent.root_span.name == "evicted_parent"
+    store = TraceStore(max_spans=2)
+    store.add(parent)
+    store.add(child)
+    assert store.parent(child.trace_id) == parent.trace_id
+    store.add(finished_trace("newer", 1))
+    assert parent.trace_id not in store
+    assert child.trace_id in store
+    assert store.parent(child.trace_id) is None
+    assert store.children(parent.trace_id) == []
+
+
+def test_error_type_from_formatted_traceback():
+    text = "Traceback (most recent call last):\n  ...\nValueError: boom\n"
+    assert error_type(text) == "ValueError"